@@ -33,12 +33,14 @@ from core.chatbot_chromadb import (
     call_api_detailed,
     format_response,
     can_make_request,
-    check_and_reload_manual,
     PRINTER_METADATA,
     normalize_text,
     find_similar_printers,
-    check_printer_context
+    check_printer_context,
+    resolve_printer_from_description,
+    cross_model_search_chromadb
 )
+from model_ranking import confident_model
 
 # Configuração da API Gemini
 # Tenta pegar do secrets, se não existir usa a key padrão
@@ -64,6 +66,8 @@ if 'response_mode' not in st.session_state:
     st.session_state.response_mode = 'detalhado'
 if 'last_update_check' not in st.session_state:
     st.session_state.last_update_check = datetime.now()
+if 'index_version' not in st.session_state:
+    st.session_state.index_version = None
 if 'question_count' not in st.session_state:
     st.session_state.question_count = 0
 if 'funnel_active' not in st.session_state:
@@ -80,10 +84,12 @@ def init_system():
     if not st.session_state.chromadb_initialized:
         with st.spinner('🚀 Inicializando sistema ChromaDB...'):
             try:
-                # Inicializa ChromaDB
-                from core.chatbot_chromadb import chromadb_search, using_chromadb
+                # ChromaDB: uma instância por processo, compartilhada entre as sessões
                 init_chromadb()
+                from core.chatbot_chromadb import chromadb_search
                 st.session_state.chromadb_search = chromadb_search
+                if chromadb_search:
+                    st.session_state.index_version = chromadb_search.index_version
                 
                 # Sincroniza metadados
                 sync_printer_metadata_from_chromadb()
@@ -103,17 +109,24 @@ def init_system():
                 return False
     return True
 
-def check_for_updates():
-    """Verifica atualizações na base de conhecimento"""
+def check_for_updates(force=False):
+    """
+    Reflete na sessão a versão do índice. O ChromaDBSearch observa a versão e
+    recarrega coleção, catálogo e metadados em segundo plano; aqui só se
+    compara um inteiro em memória (force=True verifica o arquivo na hora).
+    """
     try:
-        is_updated, status = check_and_reload_manual()
-        if is_updated:
-            st.info(f"🔄 {status}")
-            # Re-sincroniza se houver atualizações
-            sync_printer_metadata_from_chromadb()
-            if st.session_state.chromadb_search:
-                st.session_state.available_models = st.session_state.chromadb_search.get_available_printer_models()
-        return is_updated, status
+        search = st.session_state.chromadb_search
+        if search is None:
+            return False, "ChromaDB não inicializado"
+        if force:
+            search.check_index_version()
+        if search.index_version == st.session_state.index_version:
+            return False, "ChromaDB está atualizado"
+        
+        st.session_state.index_version = search.index_version
+        st.session_state.available_models = search.get_available_printer_models()
+        return True, f"Base atualizada (versão {search.index_version})"
     except Exception as e:
         return False, f"Erro ao verificar atualizações: {e}"
 
@@ -137,14 +150,20 @@ def detect_printer_from_query(query):
     if similar:
         return similar[0][0]  # Retorna o primeiro match
     
+    # Tenta resolver pela descrição (ex: "a que tem fax e imprime A3")
+    described = resolve_printer_from_description(query, st.session_state.available_models or None)
+    if described:
+        return described
+    
     return None
 
-def process_user_query(query, printer_model, mode='detalhado'):
-    """Processa a pergunta do usuário"""
+def process_user_query(query, printer_model, mode='detalhado', manual_sections=None):
+    """Processa a pergunta do usuário (reaproveita seções já buscadas, se fornecidas)"""
     try:
         # Busca semântica no ChromaDB
-        with st.spinner('🔍 Buscando informações relevantes...'):
-            manual_sections = enhanced_search_chromadb(query, printer_model)
+        if manual_sections is None:
+            with st.spinner('🔍 Buscando informações relevantes...'):
+                manual_sections = enhanced_search_chromadb(query, printer_model)
         
         if not manual_sections:
             return None, "Nenhuma informação relevante encontrada no manual."
@@ -342,6 +361,11 @@ def main():
     if not init_system():
         st.stop()
     
+    # Versão do índice em memória (atualizações entram em uso sem depender de perguntas)
+    updated, msg = check_for_updates()
+    if updated:
+        st.info(f"🔄 {msg}")
+    
     # Header principal
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -435,7 +459,7 @@ def main():
         with col1:
             if st.button("🔄 Atualizar", use_container_width=True):
                 with st.spinner("Verificando..."):
-                    updated, msg = check_for_updates()
+                    updated, msg = check_for_updates(force=True)
                     if updated:
                         st.success("Base atualizada!")
                     else:
@@ -488,10 +512,6 @@ def main():
     
     # Área principal do chat
     
-    # Verifica atualizações a cada 10 perguntas
-    if st.session_state.question_count > 0 and st.session_state.question_count % 10 == 0:
-        check_for_updates()
-    
     # Mensagem de boas-vindas
     if len(st.session_state.messages) == 0:
         with st.chat_message("assistant"):
@@ -663,6 +683,7 @@ Sou um assistente especializado em **impressoras Epson**. Posso ajudar com:
         # Se é relacionado a impressoras, continua o fluxo normal
         # Detecta ou usa impressora selecionada
         printer_model = st.session_state.selected_printer
+        prefetched_sections = None
         
         if not printer_model:
             # Tenta detectar da query
@@ -673,10 +694,34 @@ Sou um assistente especializado em **impressoras Epson**. Posso ajudar com:
                 with st.chat_message("assistant"):
                     st.info(f"🔍 Impressora detectada: **{printer_name}**")
             else:
-                # Inicia processo de afunilamento
-                st.session_state.pending_question = prompt
-                start_funnel()
-                st.rerun()
+                # Busca única entre todos os modelos antes de recorrer ao afunilamento
+                with st.spinner('🔍 Buscando em todos os manuais...'):
+                    cross = cross_model_search_chromadb(prompt, per_model_k=5)
+                ranking = cross['model_ranking']
+                leader = confident_model(cross)
+                
+                if leader:
+                    # Um modelo domina os resultados (probabilidade e distância para o 2º) - responde direto com as seções dele
+                    printer_model = leader
+                    prefetched_sections = cross['sections_by_model'][printer_model]
+                    printer_name = PRINTER_METADATA.get(printer_model, {}).get('full_name', printer_model)
+                    with st.chat_message("assistant"):
+                        st.info(f"🔍 Modelo mais provável: **{printer_name}** ({ranking[0][1]:.0%}). "
+                                "Se não for o seu, selecione o modelo na barra lateral.")
+                else:
+                    # Inicia processo de afunilamento, sugerindo os modelos mais prováveis
+                    st.session_state.pending_question = prompt
+                    if ranking:
+                        likely = ", ".join(
+                            PRINTER_METADATA.get(m, {}).get('full_name', m) for m, _ in ranking[:3]
+                        )
+                        st.session_state.messages.append({
+                            "role": "assistant",
+                            "content": f"💡 Modelos mais prováveis para sua pergunta: **{likely}**\n\n"
+                                       "Selecione na barra lateral ou responda às perguntas abaixo."
+                        })
+                    start_funnel()
+                    st.rerun()
         
         # Se chegou aqui, tem modelo de impressora
         if printer_model:
@@ -687,7 +732,8 @@ Sou um assistente especializado em **impressoras Epson**. Posso ajudar com:
             response, source = process_user_query(
                 prompt, 
                 printer_model,
-                st.session_state.response_mode
+                st.session_state.response_mode,
+                manual_sections=prefetched_sections
             )
             
             # Exibe resposta
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Log de atividades append-only (JSONL) dos webhooks
+=================================================
+
+Os servidores de webhook liam o JSON inteiro, acrescentavam um evento,
+cortavam em 100 e regravavam o arquivo a cada evento: O(n) por evento e duas
+requisições simultâneas podiam corromper o arquivo. O chatbot relia o arquivo
+inteiro só para achar a última atualização.
+
+`ActivityLog` grava um evento por linha:
+
+- Acréscimo atômico: cada evento é UM write em um arquivo aberto com O_APPEND
+  (sem ler nem regravar nada), seguro entre threads e processos
+- Rotação por tamanho: acima de `max_bytes`, o arquivo vira `.1` (até
+  `backups` arquivos antigos), sob trava de arquivo
+- Índice do último evento de cada tipo em `<log>.latest.json` (troca atômica
+  com os.replace): `latest('update_success')` é O(1), sem ler o log
+
+Logs JSON antigos (lista de eventos) são importados uma vez na primeira
+abertura e renomeados para `.json.migrated`.
+
+Uso:
+    log = ActivityLog(WEBHOOK_ACTIVITY_LOG)
+    log.append("update_success", {"stdout": "..."})
+    log.latest("update_success")   # {'timestamp': ..., 'event_type': ..., 'details': ...}
+    log.recent(10)
+"""
+
+import json
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: só a trava entre threads
+    fcntl = None
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DATA_DIR = PROJECT_ROOT / "data"
+WEBHOOK_ACTIVITY_LOG = DATA_DIR / "webhook_activity.jsonl"
+CHROMADB_WEBHOOK_ACTIVITY_LOG = DATA_DIR / "chromadb_webhook_activity.jsonl"
+
+MAX_BYTES = int(os.environ.get("ACTIVITY_LOG_MAX_BYTES", 1024 * 1024))
+BACKUPS = int(os.environ.get("ACTIVITY_LOG_BACKUPS", 3))
+ANY_EVENT = "*"  # chave do índice para o último evento de qualquer tipo
+
+
+class ActivityLog:
+    """Log de eventos em JSONL com acréscimo atômico, rotação e índice do último evento por tipo"""
+
+    def __init__(self, path, max_bytes: int = MAX_BYTES, backups: int = BACKUPS):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.index_path = self.path.with_suffix(".latest.json")
+        self.lock_path = self.path.with_suffix(".lock")
+        self._thread_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._import_legacy(self.path.with_suffix(".json"))
+
+    @contextmanager
+    def _locked(self):
+        """Trava entre threads e processos (rotação e índice; os acréscimos não precisam)"""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, event_type: str, details: Optional[Dict] = None) -> Dict:
+        """Acrescenta um evento (um write com O_APPEND) e atualiza o índice"""
+        event = {
+            "timestamp": datetime.now().isoformat(),
+            "event_type": event_type,
+            "details": details or {},
+        }
+        self._write_events([event])
+        return event
+
+    def _write_events(self, events: List[Dict]):
+        size = self._append_lines(events)
+        with self._locked():
+            self._update_index(events)
+            if size > self.max_bytes:
+                self._rotate()
+
+    def _append_lines(self, events: List[Dict]) -> int:
+        """Um único write com O_APPEND (atômico entre escritores); retorna o tamanho do arquivo"""
+        data = "".join(json.dumps(e, ensure_ascii=False, default=str) + "\n" for e in events).encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            return os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+
+    def _read_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _update_index(self, events: List[Dict]):
+        index = self._read_index()
+        for event in events:
+            # Escritores concorrentes podem chegar aqui fora de ordem: vale o mais recente
+            for key in (event["event_type"], ANY_EVENT):
+                if key not in index or index[key].get("timestamp", "") <= event["timestamp"]:
+                    index[key] = event
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.index_path)
+
+    def _rotate(self):
+        """log → log.1 → log.2 ... (chamado sob a trava; outro processo pode já ter rotacionado)"""
+        try:
+            if self.path.stat().st_size <= self.max_bytes:
+                return
+        except FileNotFoundError:
+            return
+        for i in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+    def latest(self, event_type: str = ANY_EVENT) -> Optional[Dict]:
+        """Último evento do tipo (ou de qualquer tipo), pelo índice"""
+        return self._read_index().get(event_type)
+
+    def _files_newest_first(self) -> List[Path]:
+        rotated = [self.path.with_name(f"{self.path.name}.{i}") for i in range(1, self.backups + 1)]
+        return [p for p in [self.path] + rotated if p.exists()]
+
+    def recent(self, limit: int = 100, event_types: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Últimos `limit` eventos (opcionalmente só dos tipos dados), do mais antigo ao mais novo"""
+        event_types = set(event_types) if event_types else None
+        found = deque()
+        for path in self._files_newest_first():
+            window = deque(maxlen=limit)
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # linha cortada por falta de espaço/queda: ignora
+                    if event_types is None or event.get("event_type") in event_types:
+                        window.append(event)
+            found.extendleft(reversed(window))
+            if len(found) >= limit:
+                break
+        return list(found)[-limit:]
+
+    def _import_legacy(self, legacy_path: Path):
+        """Importa o log JSON antigo (lista de eventos) uma única vez"""
+        if not legacy_path.exists() or self.path.exists():
+            return
+        try:
+            with self._locked():
+                # Outro processo pode ter importado enquanto esperávamos a trava
+                if not legacy_path.exists() or self.path.exists():
+                    return
+                with open(legacy_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                events = data if isinstance(data, list) else data.get("activities", [data])
+                events = [e for e in events if isinstance(e, dict)]
+                for event in events:
+                    event.setdefault("event_type", event.get("type", "unknown"))
+                    event.setdefault("timestamp", "")
+                self._append_lines(events)
+                self._update_index(events)
+                os.replace(legacy_path, legacy_path.with_suffix(".json.migrated"))
+            print(f"📦 {len(events)} eventos importados de {legacy_path.name} para {self.path.name}")
+        except Exception as e:
+            print(f"⚠️  Não foi possível importar {legacy_path.name}: {e}")
+
+
+def latest_update_time(path=WEBHOOK_ACTIVITY_LOG) -> Optional[str]:
+    """Timestamp da última atualização bem-sucedida registrada no log (None se nunca houve)"""
+    event = ActivityLog(path).latest("update_success")
+    return event.get("timestamp") if event else None
@@ -758,30 +758,9 @@ def check_and_reload_manual():
     Verifica se o manual foi atualizado recentemente e recarrega se necessário
     """
     try:
-        # Verifica se existe arquivo de atividade do webhook
-        webhook_activity_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'webhook_activity.json')
-        if not os.path.exists(webhook_activity_path):
-            return False, "Nenhuma atividade de webhook encontrada"
-        
-        # Carrega atividades do webhook
-        with open(webhook_activity_path, 'r', encoding='utf-8') as f:
-            activities = json.load(f)
-
-        # Garante lista e tolera formatos inesperados
-        if isinstance(activities, dict):
-            activities = [activities]
-        elif not isinstance(activities, list):
-            return False, "Formato inesperado do arquivo de atividades do webhook"
-
-        # Procura pela última atualização bem-sucedida (compatível com 'type' ou 'event_type')
-        last_update = None
-        for activity in reversed(activities):
-            if not isinstance(activity, dict):
-                continue
-            event_type = activity.get('type') or activity.get('event_type')
-            if event_type == 'update_success':
-                last_update = activity.get('timestamp')
-                break
+        # Última atualização bem-sucedida (índice do log de atividades, sem ler o histórico)
+        from activity_log import latest_update_time
+        last_update = latest_update_time()
         
         if not last_update:
             return False, "Nenhuma atualização encontrada nos logs do webhook"
@@ -815,7 +794,7 @@ def check_webhook_status():
     """Check if webhook system is active and show status"""
     try:
         # Check if webhook files exist
-        webhook_files = ['webhook_channels.json', 'webhook_activity.json']
+        webhook_files = ['webhook_channels.json', 'webhook_activity.jsonl']
         webhook_active = any(os.path.exists(f) for f in webhook_files)
         
         if not webhook_active:
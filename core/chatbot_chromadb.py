@@ -26,8 +26,9 @@ import google.generativeai as genai
 # Carrega variáveis de ambiente
 load_dotenv()
 
-# Adiciona path para importar ChromaDB integration e sync
+# Adiciona path para importar ChromaDB integration e sync (e os módulos de core/ quando importado como pacote)
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Configurações da API Gemini
 # Chave da API Gemini (hardcoded para facilitar uso)
@@ -41,6 +42,11 @@ MIN_REQUEST_INTERVAL = 4
 request_times = []
 MAX_REQUESTS_PER_MINUTE = 8
 
+# Diversificação MMR das seções do prompt: opcional, desligada por padrão.
+# Ative com CHATBOT_MMR_LAMBDA=0.7 depois de conferir o ganho com scripts/mmr.py
+_mmr_env = os.environ.get('CHATBOT_MMR_LAMBDA', '').strip().lower()
+MMR_LAMBDA = None if _mmr_env in ('', 'off', 'none') else float(_mmr_env)
+
 knowledge_base = []
 
 # Base de dados de metadados das impressoras (mantida do original)
@@ -123,6 +129,18 @@ PRINTER_METADATA = {
 chromadb_search = None
 using_chromadb = False
 
+# Resolvedor de impressoras por descrição (embeddings dos perfis calculados uma vez)
+printer_resolver = None
+
+# Reindexação em segundo plano (no máximo uma por vez)
+reindex_process = None
+
+# Mudança já enviada ao worker residente (a sincronização incremental não grava migration_log.json)
+worker_sync_requested_for = None
+
+# Última versão do índice já refletida na interface (ver reload_knowledge_base_if_updated)
+index_version_seen = None
+
 def sync_printer_metadata_from_chromadb():
     """
     Sincroniza PRINTER_METADATA com TODOS os modelos disponíveis no ChromaDB.
@@ -150,13 +168,28 @@ def sync_printer_metadata_from_chromadb():
         # Continua com metadados estáticos se falhar
         return False
 
+def on_index_updated(entry):
+    """
+    Nova versão do índice (thread do observador do ChromaDBSearch, que já
+    reabriu a coleção): atualiza os metadados das impressoras em segundo plano.
+    """
+    print(f"\n🔄 Base de conhecimento atualizada (versão {entry['version']})")
+    sync_printer_metadata_from_chromadb()
+
 def init_chromadb():
     """Inicializa ChromaDB - OBRIGATÓRIO (sem fallback)"""
-    global chromadb_search, using_chromadb
+    global chromadb_search, using_chromadb, index_version_seen
+    
+    # Uma instância por processo: cada sessão do Streamlit chama init_chromadb,
+    # e cada ChromaDBSearch mantém encoder, cliente e observador do índice
+    if chromadb_search is not None:
+        return True
     
     try:
         from chromadb_integration_example import ChromaDBSearch
         chromadb_search = ChromaDBSearch()
+        chromadb_search.add_index_listener(on_index_updated)
+        index_version_seen = chromadb_search.index_version
         using_chromadb = True
         print("✅ ChromaDB carregado - sistema de busca semântica ativo!")
         return True
@@ -217,7 +250,8 @@ def enhanced_search_chromadb(query, printer_model=None):
             query=expanded_query,
             printer_model=printer_model,
             n_results=15,
-            min_similarity=0.2
+            min_similarity=0.2,
+            mmr_lambda=MMR_LAMBDA
         )
 
         if results:
@@ -232,6 +266,84 @@ def enhanced_search_chromadb(query, printer_model=None):
         print("💡 Verifique se o ChromaDB está funcionando corretamente")
         sys.exit(1)
 
+def cross_model_search_chromadb(query, per_model_k=3):
+    """
+    Busca semântica em todos os modelos (sem impressora identificada).
+    Retorna dict com 'model_ranking', 'sections_by_model' e 'sections'.
+    """
+    if not (using_chromadb and chromadb_search):
+        print("❌ ERRO CRÍTICO: ChromaDB não inicializado")
+        sys.exit(1)
+
+    print("🔍 Executando busca entre todos os modelos...")
+    results = chromadb_search.cross_model_search(
+        query=expand_ink_query(query),
+        n_results=40,
+        per_model_k=per_model_k,
+        min_similarity=0.2
+    )
+
+    if results['model_ranking']:
+        top_model, probability = results['model_ranking'][0]
+        print(f"   ✅ {len(results['sections_by_model'])} modelos com resultados (mais provável: {top_model}, {probability:.0%})")
+    else:
+        print("   ⚠️  Nenhum resultado encontrado")
+
+    return results
+
+def get_printer_resolver(available_models=None):
+    """
+    Retorna o resolvedor de impressoras por descrição, reutilizando o encoder
+    já carregado pelo ChromaDBSearch. Reconstrói apenas se o catálogo mudou.
+    """
+    global printer_resolver
+
+    if not (using_chromadb and chromadb_search):
+        return None
+
+    catalog = set(available_models or PRINTER_METADATA.keys())
+    if printer_resolver is not None and set(printer_resolver.printer_ids) == catalog:
+        return printer_resolver
+
+    try:
+        from printer_resolver import PrinterResolver
+        printer_resolver = PrinterResolver(
+            chromadb_search.model,
+            PRINTER_METADATA,
+            model_name=chromadb_search.model_name,
+            available_models=available_models
+        )
+        return printer_resolver
+    except Exception as e:
+        print(f"   ⚠️ Resolvedor de impressoras indisponível: {e}")
+        return None
+
+def resolve_printer_from_description(query, available_models=None):
+    """
+    Tenta identificar a impressora pela descrição livre do usuário
+    (ex: "a que tem fax e imprime A3"). Retorna o printer_id apenas
+    quando a resolução é confiável; caso contrário, None.
+
+    Só consulta o resolvedor quando o texto descreve a impressora pelas
+    características (`describes_printer`).
+    """
+    try:
+        from printer_resolver import describes_printer
+    except ImportError:
+        return None
+    if not describes_printer(query):
+        return None
+
+    resolver = get_printer_resolver(available_models)
+    if not resolver:
+        return None
+
+    try:
+        return resolver.resolve(query)
+    except Exception as e:
+        print(f"   ⚠️ Erro ao resolver impressora pela descrição: {e}")
+        return None
+
 # FUNÇÕES UTILITÁRIAS (mantidas para detecção de impressoras)
 
 def normalize_text(text):
@@ -454,74 +566,94 @@ def check_question_relevance(query):
         return True  # Em caso de erro, assume que é relevante para não bloquear
 
 def reload_knowledge_base_if_updated():
-    """Recarrega a base de conhecimento se detectar que foi atualizada"""
+    """
+    Informa se a base mudou desde a última chamada.
+    
+    O ChromaDBSearch observa a versão do índice e recarrega coleção e catálogo
+    em segundo plano; aqui só se compara um inteiro em memória (sem ler
+    arquivos), então pode ser chamado a cada pergunta.
+    """
+    global index_version_seen
+    
     try:
-        is_updated, status = check_and_reload_manual()
+        if chromadb_search is None:
+            return False, "ChromaDB não inicializado"
         
-        if is_updated:
-            print("\n🔄 Detectada atualização na base de conhecimento!")
-            # Atualiza modelos diretamente do ChromaDB (modo somente ChromaDB)
-            try:
-                available_models = chromadb_search.get_available_printer_models()
-            except Exception:
-                available_models = []
-            print(f"   📱 Modelos disponíveis: {len(available_models)}")
-            
-            return True, "Base de conhecimento atualizada com sucesso"
+        version = chromadb_search.index_version
+        if version == index_version_seen:
+            return False, "ChromaDB está atualizado"
+        
+        index_version_seen = version
+        print(f"\n🔄 Base de conhecimento na versão {version}")
+        try:
+            available_models = chromadb_search.get_available_printer_models()
+        except Exception:
+            available_models = []
+        print(f"   📱 Modelos disponíveis: {len(available_models)}")
         
-        return False, status
+        return True, "Base de conhecimento atualizada com sucesso"
         
     except Exception as e:
         return False, f"Erro ao recarregar base: {e}"
 
 def auto_update_chromadb_if_needed():
-    """Atualiza ChromaDB automaticamente se detectar mudanças na base de conhecimento"""
-    global chromadb_search
+    """
+    Dispara a reindexação do ChromaDB em segundo plano se detectar mudanças.
+    
+    Com o worker residente (scripts/sync_worker.py) rodando, só envia o pedido
+    de sincronização incremental: sem abrir outro Python nem recarregar o modelo.
+    Sem ele, a migração constrói uma nova versão da coleção ao lado da ativa e
+    troca o ponteiro ao terminar; o ChromaDBSearch muda de versão sozinho na
+    próxima busca, então o chatbot continua respondendo durante todo o processo.
+    """
+    global reindex_process, worker_sync_requested_for
     
     try:
+        if reindex_process is not None and reindex_process.poll() is None:
+            return False, "Reindexação em andamento em segundo plano"
+        
         # Verifica se há atualizações pendentes
         is_updated, status = check_and_reload_manual()
         
+        if is_updated and status == worker_sync_requested_for:
+            return False, "Sincronização já enviada ao worker residente"
+        
         if is_updated:
             print("\nATUALIZAÇÃO AUTOMÁTICA INICIADA")
             print("=" * 50)
             print("Detectadas mudanças na base de conhecimento!")
-            print("Atualizando ChromaDB automaticamente...")
-            print("(Isso pode demorar alguns minutos)")
+            
+            # Worker quente: o pedido retorna na hora e a sincronização roda nele
+            from sync_worker import SyncWorkerUnavailable, submit_job
+            try:
+                worker = submit_job("sync", wait=False)
+                worker_sync_requested_for = status
+                state = "em andamento" if worker.get("running") else "agendada"
+                print(f"Sincronização enviada ao worker residente ({state})")
+                return True, "Sincronização enviada ao worker residente; as mudanças entram em uso ao concluir"
+            except SyncWorkerUnavailable as e:
+                print(f"Worker de sincronização indisponível ({e})")
+            
+            print("Reindexando ChromaDB em segundo plano (nova versão da coleção)...")
             print("")
             
-            # Importa e executa a migração
             import subprocess
-            import sys
             
             # Caminho para o script de migração direta (sem JSON)
             migrate_script = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'migrate_from_drive_to_chromadb.py')
+            log_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'reindex.log')
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
             
-            print("Executando migração para ChromaDB...")
-            print("Por favor, aguarde...")
-            
-            # Executa o script de migração
-            result = subprocess.run([
-                sys.executable, migrate_script
-            ], capture_output=True, text=True, cwd=os.path.dirname(migrate_script))
+            # Executa a migração sem bloquear o chatbot
+            with open(log_path, 'a', encoding='utf-8') as log_file:
+                reindex_process = subprocess.Popen(
+                    [sys.executable, migrate_script],
+                    stdout=log_file, stderr=subprocess.STDOUT,
+                    cwd=os.path.dirname(migrate_script)
+                )
             
-            if result.returncode == 0:
-                print("\nATUALIZAÇÃO CONCLUÍDA COM SUCESSO!")
-                print("=" * 50)
-                print("ChromaDB foi atualizado com os novos dados.")
-                print("Reinicializando sistema ChromaDB...")
-                
-                # Reinicializa o ChromaDB
-                init_chromadb()
-                
-                return True, "ChromaDB atualizado automaticamente"
-            else:
-                print(f"\nERRO na atualização automática:")
-                print(f"Código de erro: {result.returncode}")
-                if result.stderr:
-                    print(f"Erro: {result.stderr}")
-                print("\nContinuando com a base atual...")
-                return False, "Erro na atualização automática do ChromaDB"
+            print(f"Reindexação iniciada (PID {reindex_process.pid}) - log em data/reindex.log")
+            return True, "Reindexação iniciada em segundo plano; a nova versão entra em uso ao concluir"
         
         return False, "Nenhuma atualização necessária"
         
@@ -533,40 +665,13 @@ def auto_update_chromadb_if_needed():
 def check_and_reload_manual():
     """Verifica se o manual foi atualizado recentemente"""
     try:
-        webhook_activity_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'webhook_activity.json')
+        from activity_log import latest_update_time
         chroma_log_path = os.path.join(os.path.dirname(__file__), '..', 'chromadb_storage', 'migration_log.json')
         
-        if not os.path.exists(webhook_activity_path):
-            return False, "Atividade de webhook não encontrada"
-        
-        # Verifica timestamp do webhook
-        with open(webhook_activity_path, 'r', encoding='utf-8') as f:
-            webhook_data = json.load(f)
-
-        # Normaliza o formato: aceita tanto lista quanto dict com chave 'activities'
-        if isinstance(webhook_data, dict):
-            activities = webhook_data.get('activities', [])
-            # Se não houver chave 'activities' mas o dict se parecer com uma activity única
-            if not activities:
-                activities = [webhook_data]
-        elif isinstance(webhook_data, list):
-            activities = webhook_data
-        else:
-            return False, "Formato inesperado de webhook_activity.json"
-
-        # Filtra somente dicts válidos
-        activities = [a for a in activities if isinstance(a, dict)]
-        if not activities:
-            return False, "Nenhuma atividade de webhook encontrada"
-
-        # Busca a última activity com timestamp; preferir update_success quando existir
-        def is_update_success(act):
-            et = act.get('type') or act.get('event_type')
-            return et == 'update_success'
-
-        # Ordena por timestamp na cauda (mantém ordem original, mas tentamos priorizar update_success)
-        last_activity = next((a for a in reversed(activities) if is_update_success(a)), activities[-1])
-        last_update_time = last_activity.get('timestamp', '')
+        # Última atualização registrada pelos webhooks (índice do log, sem ler o histórico)
+        last_update_time = latest_update_time()
+        if not last_update_time:
+            return False, "Nenhuma atualização encontrada nos logs do webhook"
         
         # Pega timestamp do último ingestion/migration do ChromaDB
         migration_dt = None
@@ -1011,7 +1116,14 @@ def smart_printer_detection(query, available_models, max_attempts=3):
                     print(f"Impressora identificada: {result_metadata['full_name']}")
                     return result
         
-        # 3. Se não encontrou nada similar, usar sistema de filtragem com todas as impressoras
+        # 3. Busca por descrição (embeddings) - evita o afunilamento quando confiável
+        described = resolve_printer_from_description(user_input, available_models)
+        if described:
+            metadata = get_printer_metadata_dynamic(described, None)
+            print(f"Impressora identificada pela descrição: {metadata['full_name']}")
+            return described
+        
+        # 4. Se não encontrou nada similar, usar sistema de filtragem com todas as impressoras
         if attempt == 0:  # Só faz isso na primeira tentativa
             print("Não consegui identificar a impressora pela sua pergunta.")
             print("\nVocê sabe o modelo da sua impressora?")
@@ -1142,9 +1254,10 @@ def call_api_detailed(query, manual_sections, mode='detalhado', printer_model=No
     global last_request_time, request_times
     
     try:
-        # Prepara contexto dos manuais
+        # Prepara contexto dos manuais (top 5 seções; top 3 se reordenadas pelo cross-encoder)
+        from reranker import prompt_section_count
         context_parts = []
-        for section, score in manual_sections[:5]:  # Usa top 5 seções
+        for section, score in manual_sections[:prompt_section_count(manual_sections)]:
             context_parts.append(f"SEÇÃO (Score: {score}):\nTÍTULO: {section['title']}\nCONTEÚDO: {section['content'][:1000]}...")
         
         context = "\n\n---\n\n".join(context_parts)
@@ -1253,7 +1366,7 @@ def main():
     update_result, update_message = auto_update_chromadb_if_needed()
     
     if update_result:
-        print("   ✅ Sistema atualizado e pronto!")
+        print(f"   ✅ {update_message}")
     else:
         if "Nenhuma atualização necessária" not in update_message:
             print(f"   ⚠️  {update_message}")
@@ -1305,19 +1418,15 @@ def main():
     print("• 'sair' - Encerra o programa")
     print("=" * 50)
     
-    question_count = 0
-    
     while True:
         try:
-            # Verifica atualizações a cada 5 perguntas
-            if question_count > 0 and question_count % 5 == 0:
-                print("\n🔍 Verificando atualizações automáticas...")
-                reload_success, reload_msg = reload_knowledge_base_if_updated()
-                if reload_success:
-                    try:
-                        available_models = chromadb_search.get_available_printer_models()
-                    except Exception:
-                        available_models = []
+            # Versão do índice em memória: o observador já recarregou a base se ela mudou
+            reload_success, reload_msg = reload_knowledge_base_if_updated()
+            if reload_success:
+                try:
+                    available_models = chromadb_search.get_available_printer_models()
+                except Exception:
+                    available_models = []
             
             query = input("\nSua pergunta: ").strip()
             
@@ -1335,6 +1444,7 @@ def main():
                 continue
             elif query.lower() == 'reload':
                 print("🔄 Verificando atualizações...")
+                chromadb_search.check_index_version()
                 upd_success, upd_msg = auto_update_chromadb_if_needed()
                 print(f"   {upd_msg}")
                 try:
@@ -1391,8 +1501,6 @@ def main():
                 print("   • Use termos mais específicos")
                 print("   • Verifique se o modelo da impressora está correto")
             
-            question_count += 1
-            
         except KeyboardInterrupt:
             print("\n\n👋 Encerrando chatbot...")
             break
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Chunker estruturado para os manuais
+===================================
+
+Substitui a janela fixa de 600 caracteres de `extract_meaningful_chunks`:
+
+- Linear: buffer de linhas + tamanho acumulado, sem concatenar string por linha
+- Quebra em títulos detectados ("Solução de problemas", "3.2 Limpeza do cabeçote")
+  e no início de procedimentos numerados ("1. Abra a tampa...")
+- Quando o limite estoura no meio de um procedimento, corta no último passo
+  numerado do buffer, para não separar um passo ao meio
+- Nenhum chunk passa de `chunk_size` (linhas longas são quebradas em espaços)
+  nem fica abaixo de `min_chunk` (trechos curtos seguem no chunk seguinte)
+- Sobreposição configurável (últimas linhas do chunk anterior) em cortes por tamanho
+- Cada chunk carrega o título vigente, as páginas e os offsets de caractere
+  no fluxo de linhas do PDF (linhas não vazias unidas por '\n')
+
+Entrada: iterável de (número_da_página, linha), como `iter_page_lines`.
+"""
+
+import re
+
+# Título: linha curta, sem pontuação final, numerada ("3.2 Limpeza") ou em caixa alta/título
+NUMBERED_HEADING_RE = re.compile(r'^\d{1,2}(?:(?:\.\d{1,2}){1,3}\.?)?\s+(?=[A-ZÁÉÍÓÚÂÊÔÃÕÇ])')
+STEP_RE = re.compile(r'^(\d{1,2})[.)]\s+\S|^(?:Passo|Etapa)\s+(\d{1,2})\b', re.IGNORECASE)
+MAX_HEADING_LENGTH = 80
+MAX_SENTENCE_CASE_WORDS = 5
+
+# Instruções curtas do corpo ("Pressione o botão", "Carregue papel") começam com
+# verbo no imperativo; títulos em caixa de frase começam com substantivo ou infinitivo
+IMPERATIVE_VERBS = {
+    'abaixe', 'abra', 'acesse', 'aguarde', 'ajuste', 'alinhe', 'aperte', 'coloque', 'conecte',
+    'confirme', 'desconecte', 'desligue', 'deslize', 'digite', 'empurre', 'encaixe', 'entre',
+    'escolha', 'evite', 'feche', 'gire', 'imprima', 'insira', 'instale', 'levante', 'ligue',
+    'limpe', 'mantenha', 'mova', 'não', 'nunca', 'pressione', 'prenda', 'puxe', 'recoloque',
+    'remova', 'repita', 'retire', 'segure', 'selecione', 'sempre', 'siga', 'solte', 'substitua',
+    'toque', 'use', 'utilize', 'verifique', 'carregue', 'encha', 'agite', 'espere', 'clique',
+}
+CLITIC_IMPERATIVE_RE = re.compile(r'^[^\W\d_]+-se\b', re.IGNORECASE)  # "Certifique-se", "Assegure-se"
+MINOR_WORDS = {'de', 'da', 'do', 'das', 'dos', 'e', 'em', 'na', 'no', 'nas', 'nos', 'a', 'o', 'as', 'os',
+               'para', 'por', 'com', 'sem', 'ou', 'ao', 'aos', 'à', 'às', 'um', 'uma'}
+
+# Versão da lógica de corte: mudar as regras abaixo invalida os chunks no cache de extração
+CHUNKER_VERSION = 3
+
+
+def step_number(line):
+    """Número do passo se a linha inicia um passo numerado ("1. ", "2) ", "Passo 3"), senão None"""
+    match = STEP_RE.match(line)
+    if not match:
+        return None
+    return int(match.group(1) or match.group(2))
+
+
+def is_instruction(line):
+    """True se a linha começa como instrução ("Pressione o botão", "Certifique-se de...")"""
+    first = re.match(r'[^\W\d_]+(?:-se)?', line)
+    return bool(first) and (first.group(0).lower() in IMPERATIVE_VERBS or bool(CLITIC_IMPERATIVE_RE.match(line)))
+
+
+def is_heading(line):
+    """
+    Heurística de título para o texto extraído dos manuais Epson. Sinais aceitos:
+
+    - Numeração de seção ("4 Solução de problemas", "3.2 Limpeza do cabeçote")
+    - Caixa alta ("SOLUÇÃO DE PROBLEMAS")
+    - Caixa de título ("Solução de Problemas": todas as palavras maiores
+      capitalizadas) ou caixa de frase curta que não começa com verbo no
+      imperativo ("Limpeza do cabeçote" sim, "Carregue papel" não)
+    """
+    if len(line) > MAX_HEADING_LENGTH or len(line) < 4 or line[-1] in '.,;:!?':
+        return False
+    numbered = NUMBERED_HEADING_RE.match(line)
+    if numbered:
+        return not is_instruction(line[numbered.end():])
+    if step_number(line) is not None or not line[0].isupper():
+        return False
+
+    words = re.findall(r'[^\W\d_]+', line)
+    significant = [w for w in words if len(w) > 2]
+    if not significant or len(words) > 10:
+        return False
+    if all(w.isupper() for w in significant) and len(''.join(significant)) >= 4:
+        return True
+    if is_instruction(line):
+        return False
+
+    content_words = [w for w in words if w.lower() not in MINOR_WORDS]
+    if len(content_words) >= 2 and all(w[0].isupper() for w in content_words):
+        return True
+    # Caixa de frase: poucas palavras, sem dígitos soltos (valores, códigos de erro)
+    return len(words) <= MAX_SENTENCE_CASE_WORDS and not re.search(r'\d', line)
+
+
+def split_long_line(line, limit):
+    """Gera (posição, trecho) com trechos de até `limit` caracteres, quebrando em espaços"""
+    if len(line) <= limit:
+        yield 0, line
+        return
+    start = 0
+    while start < len(line):
+        if len(line) - start <= limit:
+            yield start, line[start:]
+            return
+        end = line.rfind(' ', start + 1, start + limit + 1)
+        if end == -1:
+            end = start + limit  # palavra maior que o limite: corte seco
+        yield start, line[start:end].rstrip()
+        start = end
+        while start < len(line) and line[start] == ' ':
+            start += 1
+
+
+def iter_structured_chunks(lines, chunk_size=800, overlap=120, min_chunk=50):
+    """
+    Gera chunks estruturados a partir de (página, linha).
+
+    Returns (por chunk):
+        {'text', 'heading', 'page_start', 'page_end', 'char_start', 'char_end'}
+    """
+    # Linhas longas (páginas inteiras em uma linha, comum no pypdf) são quebradas antes:
+    # com trechos deste tamanho, um buffer abaixo de min_chunk mais um trecho cabem em chunk_size
+    max_line = max(chunk_size - min_chunk - 1, chunk_size // 2)
+    buffer = []          # [(página, linha, offset_início)]
+    length = 0           # tamanho de " ".join(linhas do buffer)
+    step_at = None       # índice no buffer do último passo numerado (ponto de corte preferido)
+    heading = None
+    offset = 0           # offset da próxima linha no fluxo de linhas
+
+    def emit(items, chunk_heading):
+        text = " ".join(line for _, line, _ in items)
+        return {
+            'text': text,
+            'heading': chunk_heading,
+            'page_start': items[0][0],
+            'page_end': items[-1][0],
+            'char_start': items[0][2],
+            'char_end': items[-1][2] + len(items[-1][1]),
+        }
+
+    def tail_for_overlap(items):
+        """Últimas linhas que cabem na sobreposição (percorre só o final do buffer)"""
+        if overlap <= 0:
+            return []
+        kept, size = [], 0
+        for item in reversed(items):
+            if size + len(item[1]) > overlap:
+                break
+            kept.append(item)
+            size += len(item[1]) + 1
+        kept.reverse()
+        # Sobreposição não pode ser o buffer inteiro
+        return kept if len(kept) < len(items) else []
+
+    for page, full_line in lines:
+        line_offset = offset
+        offset += len(full_line) + 1
+
+        for position, line in split_long_line(full_line, max_line):
+            item = (page, line, line_offset + position)
+            # Título e passo só valem para o início da linha original
+            step = step_number(full_line) if position == 0 else None
+            heading_line = position == 0 and is_heading(full_line)
+            if heading_line and line == heading:
+                # Cabeçalho de página repetido: não reinicia o chunk a cada página
+                continue
+
+            # Títulos e o primeiro passo de um procedimento abrem um chunk novo (sem sobreposição)
+            if heading_line or step == 1:
+                if length >= min_chunk:
+                    yield emit(buffer, heading)
+                    buffer, length = [], 0
+                if step != 1:
+                    heading = line
+                step_at = None
+
+            # Buffer abaixo de min_chunk (ex.: só o título) não vira chunk: segue junto com a linha
+            elif buffer and length + 1 + len(line) > chunk_size and length >= min_chunk:
+                # Se a linha atual não inicia um passo, prefere cortar no último passo do buffer
+                # (desde que o chunk não fique pequeno demais), mantendo o passo inteiro
+                cut = len(buffer)
+                if step is None and step_at and sum(len(l) + 1 for _, l, _ in buffer[:step_at]) >= chunk_size // 2:
+                    cut = step_at
+                head, rest = buffer[:cut], buffer[cut:]
+                yield emit(head, heading)
+
+                # Sobreposição só em cortes no meio do texto; em limites de passo o passo segue inteiro
+                if rest or step is not None:
+                    buffer = rest
+                else:
+                    buffer = tail_for_overlap(head)
+                length = sum(len(l) for _, l, _ in buffer) + max(len(buffer) - 1, 0)
+
+                if buffer and length + 1 + len(line) > chunk_size:
+                    # O que sobrou não cabe com a linha: emite o resto do passo ou descarta a sobreposição
+                    if rest and length >= min_chunk:
+                        yield emit(buffer, heading)
+                        buffer = []
+                    elif not rest:
+                        buffer = []
+                    length = sum(len(l) for _, l, _ in buffer) + max(len(buffer) - 1, 0)
+                step_at = None
+
+            if step is not None and buffer:
+                step_at = len(buffer)
+            buffer.append(item)
+            length += len(line) + (1 if length else 0)
+
+    if length >= min_chunk:
+        yield emit(buffer, heading)
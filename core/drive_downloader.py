@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Gerenciador de downloads do Google Drive
+========================================
+
+Baixa vários PDFs em paralelo (pool limitado de threads), gravando cada um em
+streaming direto para um arquivo temporário `<destino>.part`, com o MD5
+calculado durante a transferência (sem reler o arquivo nem manter o PDF
+inteiro em memória).
+
+- Retomada: se a conexão cair, a próxima tentativa pede só o restante
+  (`Range: bytes=<offset>-`); um `.part` deixado por uma execução anterior
+  também é retomado (os bytes já gravados entram no MD5 antes de continuar)
+- Retry com backoff exponencial em erros de rede e HTTP 429/5xx
+- Verificação do MD5 e do tamanho informados pelo Drive (`md5Checksum`, `size`)
+  antes de mover o `.part` para o destino final (os.replace)
+
+Usa só a biblioteca padrão para o HTTP (`/drive/v3/files/<id>?alt=media`).
+`base_url` é configurável, então o gerenciador pode ser exercitado contra um
+servidor local que imite o endpoint de mídia do Drive:
+
+    downloader = DriveDownloader(base_url="http://127.0.0.1:8765/drive/v3/files",
+                                 auth_headers=None)
+"""
+
+import hashlib
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+
+DOWNLOAD_WORKERS = int(os.environ.get("DRIVE_DOWNLOAD_WORKERS", 4))
+CHUNK_SIZE = 1024 * 1024
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+TIMEOUT_SECONDS = 60
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+PART_SUFFIX = ".part"
+
+
+class DownloadError(Exception):
+    """Falha definitiva de download (tentativas esgotadas ou checksum divergente)"""
+
+
+@dataclass
+class DownloadResult:
+    file_id: str
+    path: str
+    md5: str
+    size: int
+    seconds: float
+    attempts: int
+    resumed_bytes: int = 0
+    name: str = ""
+
+
+def service_account_headers(credentials_file: str) -> Callable[[], Dict[str, str]]:
+    """
+    Cabeçalhos de autorização a partir de uma conta de serviço. O token é
+    renovado (uma thread por vez) quando expira.
+    """
+    import httplib2
+    from google.oauth2 import service_account
+    from google_auth_httplib2 import Request
+
+    credentials = service_account.Credentials.from_service_account_file(credentials_file, scopes=DRIVE_SCOPES)
+    lock = threading.Lock()
+
+    def headers():
+        with lock:
+            if not credentials.valid:
+                credentials.refresh(Request(httplib2.Http()))
+            return {'Authorization': f'Bearer {credentials.token}'}
+
+    return headers
+
+
+def _hash_existing(path: str, md5) -> int:
+    """Alimenta o MD5 com os bytes já baixados de um `.part` e devolve o tamanho"""
+    size = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            md5.update(block)
+            size += len(block)
+    return size
+
+
+class DriveDownloader:
+    """Downloads paralelos em streaming com MD5 incremental, retomada e retry"""
+
+    def __init__(self, auth_headers: Optional[Callable[[], Dict[str, str]]] = None,
+                 base_url: str = DRIVE_FILES_URL, workers: int = DOWNLOAD_WORKERS,
+                 chunk_size: int = CHUNK_SIZE, max_retries: int = MAX_RETRIES,
+                 backoff: float = BACKOFF_SECONDS, timeout: float = TIMEOUT_SECONDS):
+        self.auth_headers = auth_headers
+        self.base_url = base_url.rstrip('/')
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    @classmethod
+    def from_service_account(cls, credentials_file: str, **kwargs) -> "DriveDownloader":
+        return cls(auth_headers=service_account_headers(str(credentials_file)), **kwargs)
+
+    def _open(self, file_id: str, offset: int):
+        request = urllib.request.Request(f"{self.base_url}/{file_id}?alt=media")
+        if self.auth_headers:
+            for key, value in self.auth_headers().items():
+                request.add_header(key, value)
+        if offset:
+            request.add_header('Range', f'bytes={offset}-')
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def download(self, file_id: str, dest_path: str, expected_md5: Optional[str] = None,
+                 expected_size: Optional[int] = None, name: str = "") -> DownloadResult:
+        """Baixa um arquivo para `dest_path` (via `.part`), verificando MD5/tamanho se informados"""
+        dest_path = str(dest_path)
+        part_path = dest_path + PART_SUFFIX
+        os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+        if expected_size is not None:
+            expected_size = int(expected_size)
+
+        start = time.perf_counter()
+        md5 = hashlib.md5()
+        offset = _hash_existing(part_path, md5) if os.path.exists(part_path) else 0
+        if expected_size is not None and offset > expected_size:
+            md5, offset = hashlib.md5(), 0
+        resumed_bytes = offset
+
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                if offset and offset == expected_size:
+                    break
+                with self._open(file_id, offset) as response:
+                    if offset and response.status != 206:
+                        # Servidor ignorou o Range: recomeça do zero
+                        md5, offset, resumed_bytes = hashlib.md5(), 0, 0
+                    length = response.headers.get('Content-Length')
+                    end = offset + int(length) if length else None
+                    with open(part_path, 'r+b' if offset else 'wb') as f:
+                        f.seek(offset)
+                        f.truncate()
+                        for block in iter(lambda: response.read(self.chunk_size), b''):
+                            f.write(block)
+                            md5.update(block)
+                            offset += len(block)
+                if end is not None and offset < end:
+                    # Conexão encerrada antes do fim: a próxima tentativa retoma do offset atual
+                    raise ConnectionError(f"transferência interrompida em {offset}/{end} bytes")
+                break
+            except urllib.error.HTTPError as e:
+                if e.code == 416 and offset:
+                    # Range além do fim: o `.part` já está completo (ou é de outra versão; o MD5 decide)
+                    break
+                if e.code not in RETRY_STATUS or attempts > self.max_retries:
+                    raise DownloadError(f"{name or file_id}: HTTP {e.code} após {attempts} tentativa(s)") from e
+            except (urllib.error.URLError, ConnectionError, TimeoutError, OSError) as e:
+                if attempts > self.max_retries:
+                    raise DownloadError(f"{name or file_id}: {e} após {attempts} tentativa(s)") from e
+            time.sleep(self.backoff * 2 ** (attempts - 1))
+
+        digest = md5.hexdigest()
+        if (expected_md5 and digest != expected_md5) or (expected_size is not None and offset != expected_size):
+            os.unlink(part_path)
+            raise DownloadError(
+                f"{name or file_id}: checksum divergente (md5 {digest[:8]}..., {offset} bytes; "
+                f"esperado {str(expected_md5)[:8]}..., {expected_size} bytes)"
+            )
+
+        os.replace(part_path, dest_path)
+        return DownloadResult(
+            file_id=file_id,
+            path=dest_path,
+            md5=digest,
+            size=offset,
+            seconds=time.perf_counter() - start,
+            attempts=attempts,
+            resumed_bytes=resumed_bytes,
+            name=name,
+        )
+
+    def download_many(self, files: Iterable[Dict], dest_dir: str,
+                      filename: Callable[[Dict], str] = lambda f: f['name']) -> Iterator:
+        """
+        Baixa em paralelo os arquivos listados pelo Drive (dicts com id, name e,
+        opcionalmente, md5Checksum/size), entregando cada resultado assim que termina.
+
+        Yields:
+            (file_info, DownloadResult) ou (file_info, DownloadError) em caso de falha
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {
+                pool.submit(
+                    self.download,
+                    info['id'],
+                    os.path.join(str(dest_dir), filename(info)),
+                    expected_md5=info.get('md5Checksum'),
+                    expected_size=info.get('size'),
+                    name=info.get('name', ''),
+                ): info
+                for info in files
+            }
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except DownloadError as e:
+                    yield futures[future], e
+
+
+def print_download_summary(results, seconds: float):
+    """Resumo de throughput de um lote de downloads"""
+    results = [r for r in results if isinstance(r, DownloadResult)]
+    total_bytes = sum(r.size for r in results)
+    if not results or seconds <= 0:
+        return
+    print(f"⬇️  {len(results)} downloads, {total_bytes / 1024 / 1024:.1f} MB em {seconds:.1f}s "
+          f"({total_bytes / 1024 / 1024 / seconds:.1f} MB/s)")
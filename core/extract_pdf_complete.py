@@ -3,34 +3,98 @@
 Extrator PDF Completo - Para manual de 200 páginas
 """
 
-import PyPDF2
 import json
 import re
 import time
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
 import hashlib
+import math
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-def extract_pdf_text(pdf_path):
-    """Extrai texto completo do PDF"""
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from chunker import CHUNKER_VERSION, iter_structured_chunks
+from extraction_cache import get_extraction_cache
+from pdf_extractors import get_extractor
+
+# Workers da extração paralela (1 = serial). PDF_EXTRACT_WORKERS sobrescreve o padrão.
+PDF_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', 1))
+
+# Chunker da ingestão: "structured" (títulos, passos, sobreposição) ou "legacy" (janela de 600)
+PDF_CHUNKER = os.environ.get('PDF_CHUNKER', 'structured')
+CHUNK_SIZE = int(os.environ.get('PDF_CHUNK_SIZE', 800))
+CHUNK_OVERLAP = int(os.environ.get('PDF_CHUNK_OVERLAP', 120))
+
+# Páginas mínimas por tarefa: cada tarefa reabre o PDF, então faixas pequenas não compensam
+MIN_PAGES_PER_TASK = 8
+
+def _extract_page_range(task):
+    """Extrai uma faixa de páginas [start, end) - executa dentro do processo worker"""
+    pdf_path, start, end, extractor = task
+    return list(get_extractor(extractor).iter_pages(pdf_path, start, end))
+
+def _page_ranges(total_pages, workers):
+    """Divide as páginas em faixas contíguas (~4 por worker para balancear páginas lentas)"""
+    per_task = max(MIN_PAGES_PER_TASK, math.ceil(total_pages / (workers * 4)))
+    return [(start, min(start + per_task, total_pages)) for start in range(0, total_pages, per_task)]
+
+def iter_pdf_pages(pdf_path, workers=None, extractor=None):
+    """
+    Gera (número_da_página, texto, segundos) em ordem, sem acumular o PDF inteiro.
+    Páginas com erro têm texto None. Com workers > 1 as faixas de páginas são
+    extraídas em paralelo e entregues na ordem assim que cada faixa termina.
+    `extractor` escolhe o backend (pdf_extractors; padrão PDF_EXTRACTOR).
+    """
+    workers = workers or PDF_WORKERS
+    backend = get_extractor(extractor)
+    total_pages = backend.count_pages(pdf_path)
+    print(f"📄 Total de páginas: {total_pages} (extrator: {backend.name})")
+    
+    if workers <= 1 or total_pages < 2 * MIN_PAGES_PER_TASK:
+        yield from backend.iter_pages(pdf_path, 0, total_pages)
+        return
+    
+    tasks = [(pdf_path, start, end, backend.name) for start, end in _page_ranges(total_pages, workers)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map preserva a ordem das faixas, então as páginas saem ordenadas
+        for part in executor.map(_extract_page_range, tasks):
+            yield from part
+
+def extract_pdf_pages(pdf_path, workers=None, extractor=None):
+    """
+    Extrai as páginas do PDF em ordem, opcionalmente em paralelo.
+    Retorna [(número_da_página, texto, segundos)]; páginas com erro têm texto None.
+    """
+    return list(iter_pdf_pages(pdf_path, workers, extractor))
+
+def report_page_timing(pages, elapsed):
+    """Resumo do tempo por página (média, p95 e páginas mais lentas)"""
+    if not pages:
+        return
+    timings = sorted(seconds for _, _, seconds in pages)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    slowest = sorted(pages, key=lambda p: p[2], reverse=True)[:3]
+    print(f"⏱️  {len(pages)} páginas em {elapsed:.1f}s ({len(pages) / max(elapsed, 1e-9):.1f} pág/s) | "
+          f"média {sum(timings) / len(timings) * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms por página")
+    print("   Mais lentas: " + ", ".join(f"p.{number} ({seconds * 1000:.0f}ms)" for number, _, seconds in slowest))
+
+def extract_pdf_text(pdf_path, workers=None, extractor=None):
+    """Extrai texto completo do PDF (páginas em paralelo quando workers > 1)"""
     print(f"📖 Extraindo texto de {pdf_path}...")
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            total_pages = len(reader.pages)
-            print(f"📄 Total de páginas: {total_pages}")
-            
-            text = ""
-            for i, page in enumerate(reader.pages, 1):
-                if i % 20 == 0:
-                    print(f"   Processando página {i}/{total_pages}...")
-                try:
-                    page_text = page.extract_text()
-                    text += f"\n--- PÁGINA {i} ---\n{page_text}\n"
-                except:
-                    print(f"    Erro na página {i}, pulando...")
-                    
-            return text
+        start = time.perf_counter()
+        pages = extract_pdf_pages(pdf_path, workers, extractor)
+        report_page_timing(pages, time.perf_counter() - start)
+        
+        parts = []
+        for number, page_text, _ in pages:
+            if page_text is None:
+                print(f"    Erro na página {number}, pulando...")
+                continue
+            parts.append(f"\n--- PÁGINA {number} ---\n{page_text}\n")
+        
+        return "".join(parts)
     except Exception as e:
         print(f"Erro ao ler PDF: {e}")
         return None
@@ -39,7 +103,6 @@ def clean_text(text):
     """Limpa texto"""
     text = re.sub(r'\n\s*\n', '\n', text)
     text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
     return text.strip()
 
 def identify_section_type(text):
@@ -59,37 +122,60 @@ def identify_section_type(text):
     else:
         return 'geral'
 
-def extract_meaningful_chunks(text, chunk_size=600):
-    """Divide em chunks"""
-    pages = text.split('--- PÁGINA')
-    chunks = []
-    current_chunk = ""
-    
-    for page_content in pages[1:]:
-        lines = page_content.split('\n')[1:]  # Pula número da página
-        
-        for line in lines:
+def iter_page_lines(pages, timing=None):
+    """
+    Gera (número_da_página, linha) com as linhas não vazias das páginas.
+    `timing`, se informado, recebe os (número, texto, segundos) para o relatório por página.
+    """
+    for number, page_text, seconds in pages:
+        if timing is not None:
+            timing.append((number, None, seconds))
+        if page_text is None:
+            print(f"    Erro na página {number}, pulando...")
+            continue
+        for line in page_text.split('\n'):
             line = line.strip()
-            if not line:
-                continue
-                
-            if len(current_chunk + line) > chunk_size:
-                if len(current_chunk) > 50:
-                    chunks.append({
-                        'content': clean_text(current_chunk),
-                        'type': identify_section_type(current_chunk)
-                    })
-                current_chunk = line + " "
-            else:
-                current_chunk += line + " "
+            if line:
+                yield number, line
+
+def _iter_text_lines(text):
+    """Linhas (página, linha) de um texto já extraído com marcadores '--- PÁGINA n ---'"""
+    for page_content in text.split('--- PÁGINA')[1:]:
+        header, _, body = page_content.partition('\n')  # Pula número da página
+        number = int(re.sub(r'\D', '', header) or 0)
+        for line in body.split('\n'):
+            line = line.strip()
+            if line:
+                yield number, line
+
+def iter_chunks(lines, chunk_size=600):
+    """
+    Agrupa as linhas em chunks de até `chunk_size` caracteres, em streaming.
+    Mantém um buffer de linhas e o tamanho acumulado (sem concatenar string a cada linha).
+    """
+    buffer = []
+    length = 0  # tamanho de " ".join(buffer) + " ", como o chunk original
+    
+    def flush():
+        text = " ".join(buffer) + " "
+        return {'content': clean_text(text), 'type': identify_section_type(text)}
     
-    if len(current_chunk) > 50:
-        chunks.append({
-            'content': clean_text(current_chunk),
-            'type': identify_section_type(current_chunk)
-        })
+    for _, line in lines:
+        if length + len(line) > chunk_size:
+            if length > 50:
+                yield flush()
+            buffer = [line]
+            length = len(line) + 1
+        else:
+            buffer.append(line)
+            length += len(line) + 1
     
-    return chunks
+    if length > 50:
+        yield flush()
+
+def extract_meaningful_chunks(text, chunk_size=600):
+    """Divide em chunks"""
+    return list(iter_chunks(_iter_text_lines(text), chunk_size))
 
 def extract_keywords(text):
     """Extrai keywords"""
@@ -177,27 +263,172 @@ def get_pdf_hash(pdf_path):
             hash_md5.update(chunk)
     return hash_md5.hexdigest()
 
-def process_pdf_to_sections(pdf_path, printer_model=None):
+def chunker_signature(chunker=None):
+    """Identifica a configuração de chunking (chave dos chunks no cache de extração)"""
+    chunker = chunker or PDF_CHUNKER
+    if chunker == 'legacy':
+        return 'legacy-600'
+    return f'{chunker}-{CHUNK_SIZE}-{CHUNK_OVERLAP}-v{CHUNKER_VERSION}'
+
+def _recording(items, recorded):
+    """Repassa os itens de um gerador guardando cada um em `recorded`"""
+    for item in items:
+        recorded.append(item)
+        yield item
+
+def iter_section_chunks(lines, chunker=None):
+    """Chunks {'content', 'type', ...} das linhas, com o chunker configurado"""
+    if (chunker or PDF_CHUNKER) == 'legacy':
+        yield from iter_chunks(lines)
+        return
+    
+    for chunk in iter_structured_chunks(lines, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+        text = chunk.pop('text')
+        chunk['content'] = clean_text(text)
+        chunk['type'] = identify_section_type(text)
+        yield chunk
+
+def section_text(title, content):
+    """Texto gravado como documento e codificado no embedding (título + conteúdo)"""
+    return f"{title} {content}"
+
+def stable_chunk_id(prefix, text, occurrence=0):
+    """
+    ID derivado do texto codificado da seção (título + conteúdo): inserir um
+    parágrafo não desloca os IDs dos demais, e mudar só o título gera outro ID
+    (o embedding muda junto). `occurrence` diferencia textos idênticos
+    repetidos no mesmo manual.
+    """
+    digest = hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+    return f'{prefix}_{digest}' if not occurrence else f'{prefix}_{digest}_{occurrence}'
+
+def chunk_to_section(chunk, printer_model, pdf_path, pdf_hash, occurrence=0):
+    """Converte um chunk na seção com metadados usada pela ingestão"""
+    section_type = chunk['type']
+    title = chunk.get('heading') or create_title(chunk['content'], section_type)
+    # Chunks estruturados já respeitam CHUNK_SIZE; o corte em 800 vale para o legado
+    content = chunk['content'] if 'page_start' in chunk else chunk['content'][:800]
+    section = {
+        'id': stable_chunk_id(printer_model or section_type, section_text(title, content), occurrence),
+        'title': title,
+        'content': content,
+        'type': section_type,
+        'keywords': extract_keywords(chunk['content']),
+        'printer_model': printer_model or pdf_path,
+        'pdf_hash': pdf_hash
+    }
+    # Offsets e páginas do chunk (somente no chunker estruturado)
+    for field in ('heading', 'page_start', 'page_end', 'char_start', 'char_end'):
+        if chunk.get(field) is not None:
+            section[field] = chunk[field]
+    return section
+
+def iter_pdf_sections(pdf_path, printer_model=None, workers=None, chunker=None, pdf_hash=None, extractor=None):
+    """
+    Pipeline em streaming: páginas → linhas → chunks → seções.
+    A memória fica limitada a um chunk (ou a uma faixa de páginas por worker),
+    e as primeiras seções saem antes de o PDF terminar de ser lido.
+    `pdf_hash` evita reler o arquivo quando o MD5 já é conhecido (calculado no download).
+    
+    Páginas e chunks ficam no cache de extração (md5 + versão do extrator): com o
+    mesmo PDF, o extrator não é chamado de novo, nem quando só o chunking muda.
+    Com o cache ativo, o texto do PDF é mantido até o fim para ser gravado.
+    """
+    pdf_hash = pdf_hash or get_pdf_hash(pdf_path)
+    cache = get_extraction_cache()
+    chunker_key = chunker_signature(chunker)
+    extractor_version = get_extractor(extractor).version
+    timing = []
+    start = time.perf_counter()
+    new_pages = new_chunks = None
+    extracted = False
+    
+    # Chunks prontos para este PDF e configuração de chunker: não abre o PDF
+    chunks = cache.load_chunks(pdf_hash, extractor_version, chunker_key) if cache else None
+    if chunks is not None:
+        print(f"💾 Cache de extração: {len(chunks)} chunks de {pdf_path} (PDF não relido)")
+    else:
+        # Páginas em cache: só refaz o chunking
+        pages = cache.load_pages(pdf_hash, extractor_version) if cache else None
+        if pages is not None:
+            print(f"💾 Cache de extração: {len(pages)} páginas de {pdf_path} (PDF não relido)")
+            page_source = ((number, page_text, 0.0) for number, page_text in pages)
+        else:
+            print(f"📖 Extraindo texto de {pdf_path}...")
+            extracted = True
+            page_source = iter_pdf_pages(pdf_path, workers, extractor)
+            if cache:
+                new_pages = []
+                page_source = _recording(page_source, new_pages)
+        chunks = iter_section_chunks(iter_page_lines(page_source, timing), chunker)
+        if cache:
+            new_chunks = []
+            chunks = _recording(chunks, new_chunks)
+    
+    occurrences = Counter()  # seções com texto idêntico no mesmo PDF (pelo ID, que já é o digest)
+    for chunk in chunks:
+        section = chunk_to_section(chunk, printer_model, pdf_path, pdf_hash)
+        base_id = section['id']
+        if occurrences[base_id]:
+            section['id'] = f"{base_id}_{occurrences[base_id]}"  # mesmo formato de stable_chunk_id
+        occurrences[base_id] += 1
+        yield section
+    
+    if extracted:
+        report_page_timing(timing, time.perf_counter() - start)
+    
+    # Só grava após o PDF inteiro ter sido consumido
+    if new_chunks is not None:
+        try:
+            if new_pages is not None:
+                cache.save_pages(pdf_hash, extractor_version, [(number, page_text) for number, page_text, _ in new_pages])
+            cache.save_chunks(pdf_hash, extractor_version, chunker_key, new_chunks)
+        except OSError as e:
+            print(f"⚠️  Não foi possível gravar o cache de extração: {e}")
+
+def process_pdf_to_sections(pdf_path, printer_model=None, workers=None, pdf_hash=None):
     """Processa um PDF e retorna as seções extraídas, incluindo printer_model e pdf_hash"""
-    raw_text = extract_pdf_text(pdf_path)
-    if not raw_text:
+    try:
+        return list(iter_pdf_sections(pdf_path, printer_model, workers, pdf_hash=pdf_hash))
+    except Exception as e:
+        print(f"Erro ao ler PDF: {e}")
         return []
-    chunks = extract_meaningful_chunks(raw_text)
-    pdf_hash = get_pdf_hash(pdf_path)
-    sections = []
-    for i, chunk in enumerate(chunks):
-        section_type = chunk['type']
-        section = {
-            'id': f'{printer_model or section_type}_{i}',
-            'title': create_title(chunk['content'], section_type),
-            'content': chunk['content'][:800],
-            'type': section_type,
-            'keywords': extract_keywords(chunk['content']),
-            'printer_model': printer_model or pdf_path,
-            'pdf_hash': pdf_hash
-        }
-        sections.append(section)
-    return sections
+
+def _process_pdf_job(job):
+    """
+    Processa um PDF inteiro dentro do processo worker (extração serial de páginas).
+    job: (pdf_path, printer_model) ou (pdf_path, printer_model, pdf_hash)
+    """
+    pdf_path, printer_model, *known_hash = job
+    return process_pdf_to_sections(pdf_path, printer_model=printer_model, workers=1,
+                                   pdf_hash=known_hash[0] if known_hash else None)
+
+def iter_pdfs_sections(jobs, workers=None):
+    """
+    Gera as listas de seções de vários PDFs [(pdf_path, printer_model)] na ordem dos jobs.
+    
+    Com PDFs suficientes para ocupar os workers, cada worker processa PDFs inteiros
+    (no máximo 2 por worker em andamento, para limitar a memória);
+    caso contrário os PDFs seguem um a um com as páginas divididas entre os workers.
+    """
+    workers = workers or PDF_WORKERS
+    if workers <= 1 or len(jobs) < workers:
+        for path, model in jobs:
+            yield process_pdf_to_sections(path, printer_model=model, workers=workers)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for job in jobs:
+            pending.append(executor.submit(_process_pdf_job, job))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def process_pdfs_to_sections(jobs, workers=None):
+    """Processa vários PDFs [(pdf_path, printer_model)] e retorna as listas de seções na mesma ordem"""
+    return list(iter_pdfs_sections(jobs, workers))
 
 def main():
     pdf_path = "impressora.pdf"
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Cache persistente da extração de PDFs
+=====================================
+
+Extrair o texto (PyPDF2 ou outro backend de pdf_extractors) é a etapa mais
+cara da ingestão e o resultado só depende dos bytes do PDF e do extrator. O cache guarda, por (md5 do PDF,
+versão do extrator):
+
+- pages.json.gz: texto de cada página, [[número, texto], ...]
+- chunks-<chunker>.json.gz: chunks gerados por uma configuração de chunker
+
+Assim, re-chunking (PDF_CHUNK_SIZE/OVERLAP, PDF_CHUNKER) parte das páginas em
+cache, e re-embeddings com outro preset de RECOMMENDED_MODELS ou rebuilds de
+coleção partem dos chunks prontos: nenhum dos dois abre o PDF.
+
+Estrutura (em chromadb_storage/extraction_cache/ por padrão):
+
+    <md5[:2]>/<md5>/<versão_extrator>/pages.json.gz
+    <md5[:2]>/<md5>/<versão_extrator>/chunks-structured-800-120-v1.json.gz
+
+Gravações são atômicas (arquivo temporário + os.replace), então vários
+processos de extração podem compartilhar o cache. EXTRACTION_CACHE=off desativa.
+A versão do extrator inclui o backend, então cada extrator tem suas próprias entradas.
+"""
+
+import gzip
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DEFAULT_CACHE_DIR = Path(os.environ.get("EXTRACTION_CACHE_DIR", PROJECT_ROOT / "chromadb_storage" / "extraction_cache"))
+CACHE_ENABLED = os.environ.get("EXTRACTION_CACHE", "on").lower() not in ("off", "0", "false")
+
+
+def _slug(value: str) -> str:
+    return re.sub(r'[^a-zA-Z0-9._-]', '_', value)
+
+
+class ExtractionCache:
+    """Páginas e chunks extraídos, indexados pelo md5 do PDF e versão do extrator"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_dir(self, pdf_hash: str, extractor: str) -> Path:
+        return self.cache_dir / pdf_hash[:2] / pdf_hash / _slug(extractor)
+
+    def _read(self, path: Path):
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            # Entrada corrompida (ex.: disco cheio na gravação): ignora e regrava depois
+            print(f"⚠️  Cache de extração inválido em {path}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def _write(self, path: Path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def load_pages(self, pdf_hash: str, extractor: str) -> Optional[List]:
+        """[(número_da_página, texto)] em cache (texto None para páginas com erro)"""
+        pages = self._read(self._entry_dir(pdf_hash, extractor) / "pages.json.gz")
+        return [tuple(page) for page in pages] if pages is not None else None
+
+    def save_pages(self, pdf_hash: str, extractor: str, pages):
+        self._write(self._entry_dir(pdf_hash, extractor) / "pages.json.gz", [list(page) for page in pages])
+
+    def load_chunks(self, pdf_hash: str, extractor: str, chunker: str) -> Optional[List[Dict]]:
+        return self._read(self._entry_dir(pdf_hash, extractor) / f"chunks-{_slug(chunker)}.json.gz")
+
+    def save_chunks(self, pdf_hash: str, extractor: str, chunker: str, chunks: List[Dict]):
+        self._write(self._entry_dir(pdf_hash, extractor) / f"chunks-{_slug(chunker)}.json.gz", chunks)
+
+    def stats(self):
+        """PDFs em cache, bytes ocupados e acertos/faltas desde a abertura"""
+        files = [p for p in self.cache_dir.rglob("*.json.gz")] if self.cache_dir.exists() else []
+        pdfs = {p.parent.parent.name for p in files}
+        return {"pdfs": len(pdfs), "bytes": sum(p.stat().st_size for p in files),
+                "hits": self.hits, "misses": self.misses}
+
+
+_default_cache = None
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Cache compartilhado do processo (None se desativado)"""
+    global _default_cache
+    if not CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        _default_cache = ExtractionCache()
+    return _default_cache
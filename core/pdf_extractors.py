@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Backends de extração de texto dos PDFs
+======================================
+
+Interface comum para trocar o extrator por execução (PDF_EXTRACTOR ou
+`--extractor`) sem mexer no restante da ingestão:
+
+- pypdf2  (padrão): PyPDF2, puro Python; o texto sai com palavras coladas
+  ("impressoraEpson"), reparadas aqui mesmo
+- pymupdf: PyMuPDF (`pip install pymupdf`), MuPDF em C, texto em ordem de leitura
+- pdfminer: pdfminer.six (`pip install pdfminer.six`), análise de layout, mais lento
+
+Backends cujas dependências não estão instaladas aparecem em `EXTRACTORS`, mas
+não em `available_extractors()`; pedir um deles gera ImportError com a instrução
+de instalação. Compare os backends com `scripts/benchmark_extractors.py`.
+
+Cada backend tem uma `version` que entra na chave do cache de extração, então
+trocar de extrator (ou de versão da biblioteca) nunca reaproveita texto do outro.
+"""
+
+import os
+import re
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_EXTRACTOR = os.environ.get('PDF_EXTRACTOR', 'pypdf2')
+
+# (número_da_página, texto ou None, segundos)
+PageResult = Tuple[int, Optional[str], float]
+
+
+class PdfExtractor:
+    """Extrai o texto de faixas de páginas de um PDF"""
+
+    name = ''
+    package = ''
+
+    @property
+    def version(self) -> str:
+        raise NotImplementedError
+
+    def count_pages(self, pdf_path: str) -> int:
+        raise NotImplementedError
+
+    def iter_pages(self, pdf_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[PageResult]:
+        """Páginas [start, end) em ordem; páginas com erro têm texto None"""
+        raise NotImplementedError
+
+
+class PyPDF2Extractor(PdfExtractor):
+    name = 'pypdf2'
+    package = 'PyPDF2'
+
+    # PyPDF2 perde espaços entre palavras em trechos formatados ("impressoraEpson")
+    GLUED_WORDS_RE = re.compile(r'([a-z])([A-Z])')
+
+    def __init__(self):
+        import PyPDF2
+        self._pypdf2 = PyPDF2
+
+    @property
+    def version(self) -> str:
+        return f"pypdf2-{self._pypdf2.__version__}-2"
+
+    def count_pages(self, pdf_path):
+        with open(pdf_path, 'rb') as file:
+            return len(self._pypdf2.PdfReader(file).pages)
+
+    def iter_pages(self, pdf_path, start=0, end=None):
+        with open(pdf_path, 'rb') as file:
+            reader = self._pypdf2.PdfReader(file)
+            end = len(reader.pages) if end is None else end
+            for index in range(start, end):
+                page_start = time.perf_counter()
+                try:
+                    page_text = self.GLUED_WORDS_RE.sub(r'\1 \2', reader.pages[index].extract_text())
+                except Exception:
+                    page_text = None
+                yield index + 1, page_text, time.perf_counter() - page_start
+
+
+class PyMuPDFExtractor(PdfExtractor):
+    name = 'pymupdf'
+    package = 'pymupdf'
+
+    def __init__(self):
+        import fitz
+        self._fitz = fitz
+
+    @property
+    def version(self) -> str:
+        return f"pymupdf-{self._fitz.VersionBind}-1"
+
+    def count_pages(self, pdf_path):
+        with self._fitz.open(pdf_path) as document:
+            return document.page_count
+
+    def iter_pages(self, pdf_path, start=0, end=None):
+        with self._fitz.open(pdf_path) as document:
+            end = document.page_count if end is None else end
+            for index in range(start, end):
+                page_start = time.perf_counter()
+                try:
+                    page_text = document[index].get_text("text", sort=True)
+                except Exception:
+                    page_text = None
+                yield index + 1, page_text, time.perf_counter() - page_start
+
+
+class PdfminerExtractor(PdfExtractor):
+    name = 'pdfminer'
+    package = 'pdfminer.six'
+
+    def __init__(self):
+        import pdfminer
+        from pdfminer.high_level import extract_text
+        from pdfminer.pdfpage import PDFPage
+        self._version = pdfminer.__version__
+        self._extract_text = extract_text
+        self._pdfpage = PDFPage
+
+    @property
+    def version(self) -> str:
+        return f"pdfminer-{self._version}-1"
+
+    def count_pages(self, pdf_path):
+        with open(pdf_path, 'rb') as file:
+            return sum(1 for _ in self._pdfpage.get_pages(file))
+
+    def iter_pages(self, pdf_path, start=0, end=None):
+        end = self.count_pages(pdf_path) if end is None else end
+        for index in range(start, end):
+            page_start = time.perf_counter()
+            try:
+                page_text = self._extract_text(pdf_path, page_numbers=[index])
+            except Exception:
+                page_text = None
+            yield index + 1, page_text, time.perf_counter() - page_start
+
+
+EXTRACTORS = {
+    extractor.name: extractor
+    for extractor in (PyPDF2Extractor, PyMuPDFExtractor, PdfminerExtractor)
+}
+
+_instances: Dict[str, PdfExtractor] = {}
+
+
+def get_extractor(name: Optional[str] = None) -> PdfExtractor:
+    """Instância (reaproveitada no processo) do backend pedido ou do padrão"""
+    # O ambiente é a fonte da escolha: vale também para módulos importados por
+    # outro caminho (core.pdf_extractors × pdf_extractors) e processos filhos
+    name = (name or os.environ.get('PDF_EXTRACTOR') or DEFAULT_EXTRACTOR).lower()
+    if name not in EXTRACTORS:
+        raise ValueError(f"Extrator desconhecido: {name} (opções: {', '.join(EXTRACTORS)})")
+    if name not in _instances:
+        try:
+            _instances[name] = EXTRACTORS[name]()
+        except ImportError as e:
+            raise ImportError(f"Extrator '{name}' requer: pip install {EXTRACTORS[name].package}") from e
+    return _instances[name]
+
+
+def set_default_extractor(name: str):
+    """Define o backend da execução (ex.: `--extractor`), inclusive nos processos de extração"""
+    get_extractor(name)  # valida o nome e falha cedo se a dependência faltar
+    os.environ['PDF_EXTRACTOR'] = name.lower()
+
+
+def available_extractors() -> List[str]:
+    """Backends com as dependências instaladas"""
+    available = []
+    for name in EXTRACTORS:
+        try:
+            get_extractor(name)
+            available.append(name)
+        except ImportError:
+            pass
+    return available
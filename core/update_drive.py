@@ -10,9 +10,8 @@ import json
 import re
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-import io
-from extract_pdf_complete import process_pdf_to_sections, get_pdf_hash
+from extract_pdf_complete import process_pdf_to_sections
+from drive_downloader import DriveDownloader, DownloadError
 
 # CONFIGURAÇÕES
 
@@ -35,19 +34,22 @@ def get_drive_service():
 def list_pdfs_in_folder(service, folder_id):
     results = service.files().list(
         q=f"'{folder_id}' in parents and mimeType='application/pdf' and trashed=false",
-        fields="files(id, name, modifiedTime)",
+        fields="files(id, name, modifiedTime, md5Checksum, size)",
         pageSize=100
     ).execute()
     return results.get('files', [])
 
-def download_pdf(service, file_id, filename):
-    request = service.files().get_media(fileId=file_id)
-    fh = io.FileIO(filename, 'wb')
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
-    fh.close()
+def download_pdfs(pdf_files):
+    """Baixa os PDFs em paralelo (streaming para disco, MD5 calculado no download)"""
+    downloader = DriveDownloader.from_service_account(CREDENTIALS_FILE)
+    hashes = {}
+    for pdf, result in downloader.download_many(pdf_files, DOWNLOAD_DIR,
+                                                filename=lambda f: sanitize_filename(f['name'])):
+        if isinstance(result, DownloadError):
+            print(f"Erro ao baixar {pdf['name']}: {result}")
+            continue
+        hashes[pdf['id']] = result.md5
+    return hashes
 
 def extract_model_from_filename(filename):
     # Exemplo: impressora2.pdf -> impressora2
@@ -82,18 +84,22 @@ def main():
     new_sections = []
     updated_models = set()
 
+    # Downloads em paralelo antes do processamento
+    pdf_hashes = download_pdfs(pdf_files)
+
     for pdf in pdf_files:
         pdf_name = pdf['name']
         pdf_id = pdf['id']
         safe_pdf_name = sanitize_filename(pdf_name)
         local_path = os.path.join(DOWNLOAD_DIR, safe_pdf_name)
         print(f"\nProcessando: {pdf_name}")
-        # Baixar PDF
-        download_pdf(service, pdf_id, local_path)
+        if pdf_id not in pdf_hashes:
+            print("  - Download falhou, PDF ignorado.")
+            continue
         # Extrair modelo
         model = extract_model_from_filename(safe_pdf_name)
-        # Calcular hash
-        pdf_hash = get_pdf_hash(local_path)
+        # Hash calculado durante o download
+        pdf_hash = pdf_hashes[pdf_id]
         # Verificar se já existe e se mudou
         if model in existing_hashes and existing_hashes[model] == pdf_hash:
             print(f"  - PDF não mudou, mantendo seções existentes.")
@@ -101,7 +107,7 @@ def main():
             new_sections.extend([s for s in existing_sections if s.get('printer_model') == model])
         else:
             print(f"  - PDF novo ou alterado, processando...")
-            sections = process_pdf_to_sections(local_path, printer_model=model)
+            sections = process_pdf_to_sections(local_path, printer_model=model, pdf_hash=pdf_hash)
             new_sections.extend(sections)
             updated_models.add(model)
 
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark do encoder: batches fixos × batches por orçamento de tokens
+====================================================================
+
+Codifica os mesmos textos da base (title + content, com o prefixo do modelo)
+de duas formas e compara textos/s:
+
+- fixo:    fatias de `--batch` documentos na ordem da base, cada uma em um
+           `model.encode` (como a inserção fazia antes do encode_scheduler)
+- buckets: encode_bucketed, ordenado por tokens e com batches por orçamento
+
+Também confere que os embeddings são os mesmos (diferença máxima entre vetores),
+já que só a composição dos batches muda.
+
+Uso:
+    python scripts/benchmark_encoding.py
+    python scripts/benchmark_encoding.py --model-preset multilingual-e5-small --limit 2000
+    python scripts/benchmark_encoding.py --token-budget 8192 16384 32768 --threads 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from migrate_to_chromadb import (
+    RECOMMENDED_MODELS, apply_document_prefix, get_model_type, iter_processed_items, load_knowledge_base
+)
+from encode_scheduler import MAX_BATCH, TOKEN_BUDGET, encode_bucketed, plan_batches, token_lengths
+
+
+def encode_fixed(model, texts, batch_size):
+    """Fatias fixas na ordem original (comportamento anterior)"""
+    parts = [
+        np.asarray(model.encode(texts[i:i + batch_size], normalize_embeddings=True, show_progress_bar=False),
+                   dtype=np.float32)
+        for i in range(0, len(texts), batch_size)
+    ]
+    return np.vstack(parts)
+
+
+def fixed_padding(lengths, batch_size, inner_batch=32):
+    """Fração de padding das fatias fixas (o encode ordena por tamanho dentro de cada fatia)"""
+    padded = 0
+    for i in range(0, len(lengths), batch_size):
+        chunk = sorted(lengths[i:i + batch_size], reverse=True)
+        for j in range(0, len(chunk), inner_batch):
+            padded += len(chunk[j:j + inner_batch]) * chunk[j]
+    return 1 - sum(lengths) / padded if padded else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compara textos/s do encoder com batches fixos e por orçamento de tokens",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--json", default="data/manual_complete.json", help="Base de conhecimento")
+    parser.add_argument("--model-preset", choices=list(RECOMMENDED_MODELS.keys()), default="multilingual-e5-base")
+    parser.add_argument("--model", help="Modelo customizado (substitui o preset)")
+    parser.add_argument("--batch", type=int, help="Tamanho das fatias fixas (padrão: batch do preset)")
+    parser.add_argument("--token-budget", type=int, nargs="+", default=[TOKEN_BUDGET],
+                        help=f"Orçamentos de tokens a testar (padrão: {TOKEN_BUDGET})")
+    parser.add_argument("--limit", type=int, help="Usa só os N primeiros textos")
+    parser.add_argument("--threads", type=int, help="Threads do PyTorch (torch.set_num_threads)")
+    parser.add_argument("--output", help="Salva os resultados em JSON")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    preset = RECOMMENDED_MODELS[args.model_preset]
+    model_name = args.model or preset["name"]
+    batch_size = args.batch or preset["batch_size"]
+    model_type = get_model_type(model_name)
+
+    print("📊 BENCHMARK DO ENCODER")
+    print("=" * 60)
+    texts = [item["text"] for item in iter_processed_items(load_knowledge_base(args.json))]
+    if args.limit:
+        texts = texts[:args.limit]
+    if not texts:
+        print("❌ Nenhum texto para codificar")
+        sys.exit(1)
+    texts = apply_document_prefix(texts, model_type)
+
+    print(f"🤖 Carregando modelo {model_name}...")
+    model = SentenceTransformer(model_name)
+    lengths = token_lengths(model, texts)
+    print(f"📚 {len(texts)} textos | tokens: média {np.mean(lengths):.0f}, máx {max(lengths)}\n")
+
+    # Aquecimento (primeira chamada inclui alocações e inicialização de kernels)
+    model.encode(texts[:8], show_progress_bar=False)
+
+    results = []
+    start = time.perf_counter()
+    baseline = encode_fixed(model, texts, batch_size)
+    seconds = time.perf_counter() - start
+    results.append({"mode": f"fixo ({batch_size})", "seconds": round(seconds, 2),
+                    "texts_per_second": round(len(texts) / seconds, 1),
+                    "padding": round(fixed_padding(lengths, batch_size), 4), "max_diff": 0.0})
+
+    for budget in args.token_budget:
+        stats = {}
+        start = time.perf_counter()
+        embeddings = encode_bucketed(model, texts, token_budget=budget, max_batch=MAX_BATCH,
+                                     stats=stats, normalize_embeddings=True)
+        seconds = time.perf_counter() - start
+        results.append({"mode": f"buckets ({budget})", "seconds": round(seconds, 2),
+                        "texts_per_second": round(len(texts) / seconds, 1),
+                        "batches": len(plan_batches(lengths, budget, MAX_BATCH)),
+                        "padding": round(1 - stats["tokens"] / stats["padded_tokens"], 4),
+                        "max_diff": float(np.abs(embeddings - baseline).max())})
+
+    print(f"{'modo':<18}{'segundos':>10}{'textos/s':>11}{'padding':>10}{'dif. máx':>11}")
+    print("-" * 60)
+    for row in results:
+        print(f"{row['mode']:<18}{row['seconds']:>10.1f}{row['texts_per_second']:>11.1f}"
+              f"{row['padding']:>10.1%}{row['max_diff']:>11.1e}")
+
+    best = max(results[1:], key=lambda r: r["texts_per_second"])
+    print(f"\n⚡ Ganho: {best['texts_per_second'] / results[0]['texts_per_second']:.2f}x ({best['mode']})")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"date": datetime.now().isoformat(), "model": model_name, "texts": len(texts),
+                       "results": results}, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados salvos em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos backends de extração de texto dos PDFs
+===================================================
+
+Roda cada extrator de core/pdf_extractors.py sobre os PDFs de pdfs_downloaded/
+e compara:
+
+- páginas/s (tempo só da extração, sem chunking nem embeddings)
+- pico de memória (RSS máximo): cada backend roda em um processo novo, então o
+  pico não é contaminado pelos outros
+- qualidade do texto (proxy, de 0 a 1): fração de tokens que parecem palavras,
+  descontando palavras coladas ("impressoraEpson", tokens enormes) e letras
+  soltas ("i m p r e s s o r a"), os defeitos típicos da extração dos manuais
+
+Uso:
+    python scripts/benchmark_extractors.py
+    python scripts/benchmark_extractors.py --extractors pypdf2 pymupdf --max-pages 40
+    python scripts/benchmark_extractors.py --output data/extractor_benchmark.json
+
+O escolhido é usado com PDF_EXTRACTOR=<nome> ou
+    python scripts/migrate_from_drive_to_chromadb.py --extractor <nome>
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(PROJECT_ROOT, 'core'))
+from pdf_extractors import EXTRACTORS, available_extractors, get_extractor
+
+TOKEN_RE = re.compile(r'\S+')
+WORD_RE = re.compile(r"[(\"'«]?[^\W\d_]+(?:-[^\W\d_]+)*[.,;:!?)\"'»]*")
+GLUED_RE = re.compile(r'[a-zà-ÿ][A-ZÀ-Þ]')
+MAX_WORD_LENGTH = 20
+SINGLE_LETTER_WORDS = {'a', 'e', 'o', 'é', 'à', 'y'}
+
+
+def text_quality(text):
+    """Métricas de qualidade de um texto extraído (proxy sem referência)"""
+    tokens = TOKEN_RE.findall(text)
+    if not tokens:
+        return {'tokens': 0, 'word_ratio': 0.0, 'glued_ratio': 0.0, 'broken_ratio': 0.0, 'quality': 0.0}
+
+    words = [t for t in tokens if WORD_RE.fullmatch(t)]
+    glued = sum(1 for t in words if GLUED_RE.search(t) or len(t) > MAX_WORD_LENGTH)
+    broken = sum(1 for t in words if len(t.strip('.,;:!?()"\'«»')) == 1
+                 and t.strip('.,;:!?()"\'«»').lower() not in SINGLE_LETTER_WORDS)
+
+    word_ratio = len(words) / len(tokens)
+    glued_ratio = glued / len(tokens)
+    broken_ratio = broken / len(tokens)
+    return {
+        'tokens': len(tokens),
+        'word_ratio': round(word_ratio, 4),
+        'glued_ratio': round(glued_ratio, 4),
+        'broken_ratio': round(broken_ratio, 4),
+        'quality': round(max(0.0, word_ratio - glued_ratio - broken_ratio), 4),
+    }
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_backend(name, pdf_paths, max_pages=None):
+    """Extrai os PDFs com um backend (executa em processo próprio)"""
+    extractor = get_extractor(name)
+    pages = failed = chars = 0
+    seconds = 0.0
+    texts = []
+
+    for pdf_path in pdf_paths:
+        start = time.perf_counter()
+        total = extractor.count_pages(pdf_path)
+        end = min(total, max_pages) if max_pages else total
+        for _, page_text, _ in extractor.iter_pages(pdf_path, 0, end):
+            pages += 1
+            if page_text is None:
+                failed += 1
+                continue
+            chars += len(page_text)
+            texts.append(page_text)
+        seconds += time.perf_counter() - start
+
+    return {
+        'extractor': name,
+        'version': extractor.version,
+        'pdfs': len(pdf_paths),
+        'pages': pages,
+        'failed_pages': failed,
+        'seconds': round(seconds, 2),
+        'pages_per_second': round(pages / seconds, 2) if seconds else 0.0,
+        'chars_per_page': round(chars / max(pages - failed, 1)),
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        **text_quality("\n".join(texts)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compara velocidade, memória e qualidade dos extratores de PDF",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--pdfs-dir", default=os.path.join(PROJECT_ROOT, 'pdfs_downloaded'),
+                        help="Diretório com os PDFs")
+    parser.add_argument("--extractors", nargs="+", choices=list(EXTRACTORS),
+                        help="Backends a comparar (padrão: todos os instalados)")
+    parser.add_argument("--max-pages", type=int, help="Limita as páginas por PDF (execuções rápidas)")
+    parser.add_argument("--output", help="Salva os resultados em JSON")
+    args = parser.parse_args()
+
+    print("📊 BENCHMARK DE EXTRATORES DE PDF")
+    print("=" * 60)
+
+    pdf_paths = sorted(glob.glob(os.path.join(args.pdfs_dir, '*.pdf')))
+    if not pdf_paths:
+        print(f"❌ Nenhum PDF em {args.pdfs_dir}")
+        sys.exit(1)
+
+    extractors = args.extractors or available_extractors()
+    missing = [name for name in extractors if name not in available_extractors()]
+    for name in missing:
+        print(f"⚠️  {name} não instalado (pip install {EXTRACTORS[name].package}) - ignorado")
+    extractors = [name for name in extractors if name not in missing]
+    if not extractors:
+        print("❌ Nenhum extrator disponível")
+        sys.exit(1)
+
+    print(f"📚 {len(pdf_paths)} PDFs | extratores: {', '.join(extractors)}\n")
+    print(f"{'extrator':<10}{'páginas':>9}{'pág/s':>9}{'RSS MB':>9}{'falhas':>8}{'car/pág':>9}"
+          f"{'palavras':>10}{'coladas':>9}{'soltas':>8}{'qualidade':>11}")
+    print("-" * 92)
+
+    results = []
+    spawn = multiprocessing.get_context('spawn')
+    for name in extractors:
+        # Processo novo por backend: RSS de pico isolado e sem cache de import compartilhado
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            try:
+                row = executor.submit(run_backend, name, pdf_paths, args.max_pages).result()
+            except Exception as e:
+                print(f"{name:<10} ❌ {e}")
+                continue
+        results.append(row)
+        print(f"{name:<10}{row['pages']:>9}{row['pages_per_second']:>9.1f}{row['peak_rss_mb']:>9.0f}"
+              f"{row['failed_pages']:>8}{row['chars_per_page']:>9}{row['word_ratio']:>10.3f}"
+              f"{row['glued_ratio']:>9.3f}{row['broken_ratio']:>8.3f}{row['quality']:>11.3f}")
+
+    if results:
+        fastest = max(results, key=lambda r: r['pages_per_second'])
+        best = max(results, key=lambda r: r['quality'])
+        print(f"\n⚡ Mais rápido: {fastest['extractor']} ({fastest['pages_per_second']:.1f} pág/s)")
+        print(f"🎯 Melhor qualidade: {best['extractor']} ({best['quality']:.3f})")
+
+    if args.output:
+        report = {
+            "date": datetime.now().isoformat(),
+            "pdfs_dir": args.pdfs_dir,
+            "max_pages": args.max_pages,
+            "results": results,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados salvos em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark do encoder de consultas: PyTorch fp32 × ONNX Runtime int8
+==================================================================
+
+Mede, para cada backend, o que o chatbot sente a cada pergunta:
+
+- latência por consulta (uma pergunta por vez, p50/p95/média em ms)
+- tempo de carregamento do encoder
+- memória: RSS após carregar e pico de RSS. Cada backend roda em um processo
+  novo, então o PyTorch não é contado no ONNX
+
+Uso:
+    python scripts/benchmark_query_encoder.py
+    python scripts/benchmark_query_encoder.py --repeats 20 --threads 1
+    python scripts/benchmark_query_encoder.py --output data/query_encoder_benchmark.json
+
+Paridade dos vetores: scripts/test_onnx_encoder.py
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from onnx_query_encoder import ONNX_THREADS, OnnxQueryEncoder, default_onnx_dir, load_query_encoder
+
+BACKENDS = ("torch", "onnx")
+
+
+def _rss_mb():
+    """RSS atual (Linux, /proc) ou pico, se /proc não existir"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_backend(backend, model_name, onnx_dir, texts, repeats, threads=None):
+    """Carrega o encoder e mede a latência por consulta (executa em processo próprio)"""
+    start = time.perf_counter()
+    if backend == "onnx":
+        # Direto, sem o fallback para PyTorch de load_query_encoder
+        encoder = OnnxQueryEncoder(onnx_dir, threads=threads or ONNX_THREADS)
+    else:
+        encoder = load_query_encoder(model_name, "torch")
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+    load_seconds = time.perf_counter() - start
+    loaded_rss = _rss_mb()
+
+    encoder.encode(texts[:2], normalize_embeddings=True)  # aquecimento
+    latencies = []
+    for _ in range(repeats):
+        for text in texts:
+            start = time.perf_counter()
+            encoder.encode([text], normalize_embeddings=True)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "queries": len(latencies),
+        "load_seconds": round(load_seconds, 2),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2),
+        "rss_loaded_mb": round(loaded_rss, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compara latência e memória do encoder de consultas PyTorch × ONNX int8",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--model", default="intfloat/multilingual-e5-base", help="Modelo de embeddings")
+    parser.add_argument("--onnx-dir", help="Modelo exportado (padrão: chromadb_storage/onnx_models/<modelo>-int8)")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--repeats", type=int, default=10, help="Repetições do conjunto de consultas")
+    parser.add_argument("--threads", type=int, help="Threads por encoder (padrão: da biblioteca)")
+    parser.add_argument("--queries-file", help="Arquivo com uma consulta por linha")
+    parser.add_argument("--output", help="Salva os resultados em JSON")
+    args = parser.parse_args()
+
+    # Imports pesados só no processo principal (os filhos reimportam este módulo)
+    from hnsw_sweep import load_queries
+    from model_prefixes import apply_query_prefix, get_model_type
+
+    model_type = get_model_type(args.model)
+    texts = [apply_query_prefix(query, model_type) for query in load_queries(args.queries_file)]
+    onnx_dir = str(args.onnx_dir or default_onnx_dir(args.model))
+
+    print("📊 BENCHMARK DO ENCODER DE CONSULTAS")
+    print("=" * 60)
+    print(f"🤖 {args.model} | {len(texts)} consultas × {args.repeats} repetições\n")
+    print(f"{'backend':<9}{'carga s':>9}{'p50 ms':>9}{'p95 ms':>9}{'média ms':>10}{'RSS MB':>9}{'pico MB':>9}")
+    print("-" * 64)
+
+    results = []
+    spawn = multiprocessing.get_context("spawn")
+    for backend in args.backends:
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            try:
+                row = executor.submit(run_backend, backend, args.model, onnx_dir, texts,
+                                      args.repeats, args.threads).result()
+            except Exception as e:
+                print(f"{backend:<9} ❌ {e}")
+                continue
+        results.append(row)
+        print(f"{backend:<9}{row['load_seconds']:>9.1f}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+              f"{row['mean_ms']:>10.1f}{row['rss_loaded_mb']:>9.0f}{row['peak_rss_mb']:>9.0f}")
+
+    by_backend = {row["backend"]: row for row in results}
+    if "torch" in by_backend and "onnx" in by_backend:
+        torch_row, onnx_row = by_backend["torch"], by_backend["onnx"]
+        print(f"\n⚡ Latência p50: {torch_row['p50_ms'] / onnx_row['p50_ms']:.1f}x menor com ONNX")
+        print(f"💾 RSS: {torch_row['rss_loaded_mb'] / onnx_row['rss_loaded_mb']:.1f}x menor com ONNX")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"date": datetime.now().isoformat(), "model": args.model, "onnx_dir": onnx_dir,
+                       "repeats": args.repeats, "threads": args.threads, "results": results},
+                      f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados salvos em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,47 +7,266 @@ Este é um exemplo de como adaptar o chatbot.py atual para usar ChromaDB
 """
 
 import chromadb
-from sentence_transformers import SentenceTransformer
 import os
+import threading
 
-def apply_query_prefix(query, model_type):
-    """Aplica prefixos apropriados para consultas baseado no tipo de modelo"""
-    if model_type in ["e5", "bge"]:
-        return f"query: {query}"
-    else:
-        return query  # Modelos padrão não precisam de prefixo
+from chromadb_sharding import open_collection
+from chunk_dedup import membership_filter, record_models
+from collection_versions import pointer_mtime, resolve_live_collection, version_label
+from index_version import INDEX_WATCH, IndexVersionWatcher, read_index_version
+from hnsw_config import describe_hnsw, distance_to_similarity
+from mmr import PROMPT_SECTIONS, mmr_report, mmr_select
+from model_ranking import CROSS_MODEL_TEMPERATURE, rank_models
+from onnx_query_encoder import load_query_encoder
+from reranker import RERANK, CrossEncoderReranker
+from pca_index import TWO_STAGE, PcaProjection, find_pca_collection, projection_path, two_stage_query
+from model_prefixes import apply_query_prefix
 
 class ChromaDBSearch:
     """Classe para gerenciar busca semântica com ChromaDB"""
     
     def __init__(self, db_path="./chromadb_storage", collection_name="epson_manuals", 
-                 model_name="intfloat/multilingual-e5-base"):
+                 model_name="intfloat/multilingual-e5-base", layout=None, encoder=None, two_stage=None,
+                 rerank=None, watch=None):
         self.db_path = db_path
         self.collection_name = collection_name
         self.model_name = model_name
+        self.layout = layout  # None = detecta (coleção única ou shards por modelo/série)
+        self.encoder = encoder  # torch | onnx (None = QUERY_ENCODER)
+        self.two_stage = TWO_STAGE if two_stage is None else two_stage  # índice PCA + rescoring
+        self.pca_collection = None
+        self.projection = None
+        self.rerank = RERANK if rerank is None else rerank  # cross-encoder após a busca semântica
+        self.reranker = None
         self.model = None
         self.collection = None
+        self.space = None
+        self.live_collection = None  # versão física em uso (blue/green)
+        self._pointer_mtime = None
+        self.watch = INDEX_WATCH if watch is None else watch  # recarrega ao mudar a versão do índice
+        self.index_version = 0
+        self._watcher = None
+        self._index_listeners = []
+        self._open_lock = threading.Lock()
+        self._models_cache = None  # catálogo de modelos da versão aberta
+        self._model_type = None    # prefixo de consulta da versão aberta
         self._load_resources()
     
+    def _open_live_collection(self):
+        """Abre a versão ativa da coleção indicada pelo ponteiro"""
+        with self._open_lock:
+            self._open_live_collection_locked()
+    
+    def _open_live_collection_locked(self):
+        self._pointer_mtime = pointer_mtime(self.db_path)
+        live_name = resolve_live_collection(self.db_path, self.collection_name)
+        client = chromadb.PersistentClient(path=self.db_path)
+        collection = open_collection(client, live_name, layout=self.layout)
+        
+        # Espaço de distância do índice (define a conversão distância → similaridade)
+        hnsw = describe_hnsw(collection.metadata)
+        pca_collection, projection = None, None
+        if self.two_stage:
+            pca_collection, projection = self._open_pca_index(client, live_name, collection)
+        self.collection, self.space, self.live_collection = collection, hnsw['space'], live_name
+        self.pca_collection, self.projection = pca_collection, projection
+        self._models_cache, self._model_type = None, None
+    
+    def _open_pca_index(self, client, live_name, collection):
+        """Índice PCA da versão ativa para a busca em dois estágios (None se ausente ou defasado)"""
+        pca_name = find_pca_collection(client, live_name)
+        if pca_name is None:
+            print(f"⚠️  Versão {version_label(live_name)} sem índice PCA - busca em um estágio "
+                  f"(construa com migrate_to_chromadb.py --pca-dims)")
+            return None, None
+        pca_collection = client.get_collection(name=pca_name)
+        if pca_collection.count() != collection.count():
+            print(f"⚠️  Índice PCA '{pca_name}' defasado ({pca_collection.count()} × {collection.count()}) "
+                  f"- busca em um estágio")
+            return None, None
+        projection = PcaProjection.load(projection_path(self.db_path, pca_name))
+        print(f"📉 Busca em dois estágios: PCA {projection.dims} dimensões "
+              f"({projection.explained_variance:.1%} da variância) + rescoring completo")
+        return pca_collection, projection
+    
+    def _query(self, query_embedding, n_results, where=None, include=None):
+        """collection.query de uma consulta, em dois estágios quando o índice PCA está ativo"""
+        if self.pca_collection is not None:
+            return two_stage_query(self.collection, self.pca_collection, self.projection, query_embedding,
+                                   n_results=n_results, where=where, include=include, space=self.space)
+        kwargs = {'include': include} if include is not None else {}
+        return self.collection.query(query_embeddings=[query_embedding], n_results=n_results, where=where, **kwargs)
+    
     def _load_resources(self):
         """Carrega ChromaDB e modelo de embeddings"""
         try:
             # Carrega ChromaDB
-            client = chromadb.PersistentClient(path=self.db_path)
-            self.collection = client.get_collection(name=self.collection_name)
+            self.index_version = int(read_index_version(self.db_path).get('version', 0))
+            self._open_live_collection()
             
-            # Carrega modelo de embeddings
+            # Carrega modelo de embeddings (PyTorch ou ONNX int8, mesmos vetores)
             print(f"🤖 Carregando modelo {self.model_name}...")
-            self.model = SentenceTransformer(self.model_name)
+            self.model = load_query_encoder(self.model_name, self.encoder)
+            
+            # Cross-encoder opcional (carregado aqui para a 1ª consulta caber no orçamento)
+            if self.rerank:
+                try:
+                    self.reranker = CrossEncoderReranker()
+                except Exception as e:
+                    print(f"⚠️  Cross-encoder indisponível ({e}) - ordem do bi-encoder")
             
-            print(f"✅ ChromaDB carregado: {self.collection.count()} documentos")
+            print(f"✅ ChromaDB carregado: {self.collection.count()} documentos "
+                  f"(versão: {version_label(self.live_collection)}, espaço: {self.space})")
+            
+            # Observa a versão do índice: atualizações entram em uso sem esperar perguntas
+            if self.watch:
+                self._watcher = IndexVersionWatcher(self.db_path, self._on_index_version).start()
             
         except Exception as e:
             print(f"❌ Erro ao carregar ChromaDB: {e}")
             print("💡 Execute: python scripts/migrate_to_chromadb.py")
             raise
     
-    def semantic_search(self, query, printer_model=None, n_results=10, min_similarity=0.6):
+    def refresh_collection(self):
+        """
+        Troca para a nova versão ativa se o ponteiro mudou (um stat por chamada).
+        Chamado no início de cada busca, ou seja, sempre entre requisições.
+        Retorna True quando houve troca.
+        """
+        if pointer_mtime(self.db_path) == self._pointer_mtime:
+            return False
+        
+        previous = self.live_collection
+        try:
+            self._open_live_collection()
+        except Exception as e:
+            print(f"⚠️  Não foi possível abrir a nova versão, mantendo {version_label(previous)}: {e}")
+            return False
+        
+        if self.live_collection == previous:
+            return False
+        print(f"🔀 ChromaDB trocado para a versão {version_label(self.live_collection)} "
+              f"({self.collection.count()} documentos)")
+        return True
+    
+    def close(self):
+        """Para o observador da versão do índice e a thread do cross-encoder"""
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+        if self.reranker is not None:
+            self.reranker.close()
+    
+    def add_index_listener(self, callback):
+        """
+        Registra `callback(entry)`, chamado na thread do observador depois que
+        a coleção e o catálogo já foram recarregados para a nova versão do índice.
+        """
+        self._index_listeners.append(callback)
+    
+    def check_index_version(self):
+        """Verificação imediata da versão do índice (True se recarregou) - ex.: botão 'Atualizar'"""
+        if self._watcher is None:
+            return self.refresh_collection()
+        return self._watcher.check()
+    
+    def _on_index_version(self, entry):
+        """Nova versão do índice: reabre coleção e índice PCA, refaz o catálogo e avisa os ouvintes"""
+        self._open_live_collection()
+        self.index_version = entry['version']
+        models = self.get_available_printer_models()
+        print(f"🔔 Índice na versão {entry['version']} ({entry.get('reason', '?')}): "
+              f"{self.collection.count()} documentos, {len(models)} modelos")
+        
+        for listener in list(self._index_listeners):
+            try:
+                listener(entry)
+            except Exception as e:
+                print(f"⚠️  Erro ao notificar atualização do índice: {e}")
+    
+    def _encode_query(self, query):
+        """Gera embedding normalizado da consulta com o prefixo do modelo indexado"""
+        # Detecta tipo de modelo dos metadados (uma amostra por versão aberta)
+        if self._model_type is None:
+            sample = self.collection.get(limit=1)
+            model_type = "standard"  # padrão
+            if sample['metadatas'] and sample['metadatas'][0].get('model_type'):
+                model_type = sample['metadatas'][0]['model_type']
+            self._model_type = model_type
+        model_type = self._model_type
+        
+        # Aplica prefixo apropriado na consulta
+        query_with_prefix = apply_query_prefix(query, model_type)
+        
+        # Gera embedding da consulta (com prefixo se necessário)
+        return self.model.encode([query_with_prefix], normalize_embeddings=True)[0].tolist()
+    
+    def _iter_hits(self, results, min_similarity, printer_model=None):
+        """
+        Percorre o resultado bruto do ChromaDB gerando (índice, documento, similaridade).
+        Em buscas filtradas, chunks compartilhados aparecem como do modelo pedido.
+        """
+        if not results['ids'][0]:
+            return
+        
+        for i, (doc_id, distance) in enumerate(zip(results['ids'][0], results['distances'][0])):
+            # Converte distância para similaridade de cosseno conforme o espaço do índice
+            similarity = distance_to_similarity(distance, self.space)
+            
+            # Filtra por similaridade mínima
+            if similarity < min_similarity:
+                continue
+            
+            # Cria documento no formato do sistema atual
+            metadata = results['metadatas'][0][i]
+            document = {
+                'id': doc_id,
+                'title': metadata.get('original_title', ''),
+                'content': results['documents'][0][i],
+                'printer_model': printer_model or metadata.get('printer_model'),
+                'printer_models': record_models(metadata),
+                'type': metadata.get('type', 'geral'),
+                'keywords': metadata.get('keywords', '').split(', ') if metadata.get('keywords') else [],
+                'pdf_hash': metadata.get('pdf_hash')
+            }
+            
+            yield i, document, similarity
+    
+    def _format_results(self, results, min_similarity, printer_model=None):
+        """Converte o resultado bruto do ChromaDB em [(documento, score)]"""
+        # Score compatível (0-100)
+        formatted_results = [
+            (document, int(similarity * 100))
+            for _, document, similarity in self._iter_hits(results, min_similarity, printer_model)
+        ]
+        
+        # Ordena por score decrescente
+        formatted_results.sort(key=lambda x: x[1], reverse=True)
+        
+        return formatted_results
+    
+    def _candidates_with_vectors(self, results, min_similarity, printer_model=None):
+        """[(documento, score, similaridade, vetor)] na ordem de relevância do ChromaDB"""
+        return [
+            (document, int(similarity * 100), similarity, results['embeddings'][0][i])
+            for i, document, similarity in self._iter_hits(results, min_similarity, printer_model)
+        ]
+    
+    def _diversify(self, candidates, query_embedding, k, mmr_lambda):
+        """Re-seleciona os candidatos por MMR sobre os embeddings já retornados"""
+        if not candidates:
+            return []
+        selected = mmr_select(
+            query_embedding,
+            [vector for _, _, _, vector in candidates],
+            k=k,
+            lambda_mult=mmr_lambda,
+            relevance=[similarity for _, _, similarity, _ in candidates]
+        )
+        return [candidates[i] for i in selected]
+    
+    def semantic_search(self, query, printer_model=None, n_results=10, min_similarity=0.6,
+                        mmr_lambda=None, mmr_k=None, rerank=True):
         """
         Busca semântica que substitui o enhanced_search atual
         
@@ -56,83 +275,152 @@ class ChromaDBSearch:
             printer_model: Filtro por modelo de impressora (opcional)
             n_results: Número máximo de resultados
             min_similarity: Similaridade mínima (0-1)
+            mmr_lambda: Ativa a diversificação MMR (1.0 = só relevância, 0.0 = só diversidade)
+            mmr_k: Resultados mantidos após o MMR (padrão: n_results)
+            rerank: Reordena pelo cross-encoder, se carregado (CHATBOT_RERANK=on)
         
         Returns:
-            Lista de tuplas (documento, score) - compatível com enhanced_search
+            Lista de tuplas (documento, score) - compatível com enhanced_search.
+            Com MMR, a ordem é a da seleção (mais relevante primeiro, depois o mais novo).
+            Reordenados pelo cross-encoder, os documentos trazem `rerank_score`.
         """
+        self.refresh_collection()
         try:
-            # Detecta tipo de modelo dos metadados (pega uma amostra)
-            sample = self.collection.get(limit=1)
-            model_type = "standard"  # padrão
-            if sample['metadatas'] and sample['metadatas'][0].get('model_type'):
-                model_type = sample['metadatas'][0]['model_type']
+            query_embedding = self._encode_query(query)
             
-            # Aplica prefixo apropriado na consulta
-            query_with_prefix = apply_query_prefix(query, model_type)
+            # Prepara filtros (dono do chunk ou participante de um chunk compartilhado)
+            where_filter = membership_filter(printer_model) if printer_model else {}
             
-            # Gera embedding da consulta (com prefixo se necessário)
-            query_embedding = self.model.encode([query_with_prefix], normalize_embeddings=True)[0].tolist()
-            
-            # Prepara filtros
-            where_filter = {}
-            if printer_model:
-                where_filter["printer_model"] = printer_model
+            # Embeddings só são trazidos quando o MMR vai usá-los
+            include = ['documents', 'metadatas', 'distances']
+            if mmr_lambda is not None:
+                include.append('embeddings')
             
             # Busca no ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                where=where_filter if where_filter else None
-            )
-            
-            # Converte para formato compatível com sistema atual
-            formatted_results = []
+            results = self._query(query_embedding, n_results, where=where_filter if where_filter else None,
+                                  include=include)
             
-            if results['ids'][0]:
-                for i, (doc_id, distance) in enumerate(zip(results['ids'][0], results['distances'][0])):
-                    # Converte distância para similaridade (0-1, onde 1 = idêntico)
-                    similarity = 1 - distance
-                    
-                    # Filtra por similaridade mínima
-                    if similarity < min_similarity:
-                        continue
-                    
-                    # Cria documento no formato do sistema atual
-                    document = {
-                        'id': doc_id,
-                        'title': results['metadatas'][0][i].get('original_title', ''),
-                        'content': results['documents'][0][i],
-                        'printer_model': results['metadatas'][0][i].get('printer_model'),
-                        'type': results['metadatas'][0][i].get('type', 'geral'),
-                        'keywords': results['metadatas'][0][i].get('keywords', '').split(', ') if results['metadatas'][0][i].get('keywords') else [],
-                        'pdf_hash': results['metadatas'][0][i].get('pdf_hash')
-                    }
-                    
-                    # Score compatível (0-100)
-                    score = int(similarity * 100)
-                    
-                    formatted_results.append((document, score))
-            
-            # Ordena por score decrescente
-            formatted_results.sort(key=lambda x: x[1], reverse=True)
+            if mmr_lambda is not None:
+                candidates = self._candidates_with_vectors(results, min_similarity, printer_model)
+                selected = self._diversify(candidates, query_embedding, mmr_k or n_results, mmr_lambda)
+                hits = [(document, score) for document, score, _, _ in selected]
+            else:
+                # Converte para formato compatível com sistema atual
+                hits = self._format_results(results, min_similarity, printer_model)
             
-            return formatted_results
+            if rerank and self.reranker is not None:
+                hits = self.reranker.rerank(query, hits)
+            return hits
             
         except Exception as e:
             print(f"❌ Erro na busca semântica: {e}")
             return []
     
+    def evaluate_mmr(self, query, printer_model=None, n_results=15, min_similarity=0.2,
+                     mmr_lambda=0.7, budget=PROMPT_SECTIONS):
+        """
+        Gancho de avaliação do MMR: compara as `budget` seções que iriam para o
+        prompt com e sem diversificação (duplicatas e tokens economizados).
+        """
+        self.refresh_collection()
+        query_embedding = self._encode_query(query)
+        results = self._query(query_embedding, n_results,
+                              where=membership_filter(printer_model) if printer_model else None,
+                              include=['documents', 'metadatas', 'distances', 'embeddings'])
+        
+        candidates = self._candidates_with_vectors(results, min_similarity, printer_model)
+        baseline = sorted(candidates, key=lambda c: c[2], reverse=True)
+        diversified = self._diversify(candidates, query_embedding, budget, mmr_lambda)
+        
+        return mmr_report(
+            [(document, vector) for document, _, _, vector in baseline],
+            [(document, vector) for document, _, _, vector in diversified],
+            budget=budget
+        )
+    
+    def cross_model_search(self, query, n_results=40, per_model_k=3, min_similarity=0.6,
+                           temperature=CROSS_MODEL_TEMPERATURE):
+        """
+        Busca em todos os modelos com UMA consulta sem filtro, agrupando por printer_model
+        (chunks compartilhados entram no grupo de cada modelo participante).
+        
+        Usada quando nenhuma impressora foi identificada: permite responder perguntas
+        genéricas imediatamente ou propor o modelo mais provável sem o afunilamento.
+        
+        Args:
+            query: Pergunta do usuário
+            n_results: Candidatos buscados na consulta única (antes do agrupamento)
+            per_model_k: Máximo de seções mantidas por modelo
+            min_similarity: Similaridade mínima (0-1)
+            temperature: Temperatura do softmax entre modelos (menor = mais decidido)
+        
+        Returns:
+            Dict com:
+              - 'model_ranking': [(printer_model, probabilidade)] ordenado, soma = 1
+              - 'model_strength': {printer_model: similaridade média dos top-k} (ver confident_model)
+              - 'sections_by_model': {printer_model: [(documento, score)]} (top-k por modelo)
+              - 'sections': [(documento, score)] candidatos de todos os grupos, ordenados
+        """
+        empty = {'model_ranking': [], 'model_strength': {}, 'sections_by_model': {}, 'sections': []}
+        
+        self.refresh_collection()
+        try:
+            query_embedding = self._encode_query(query)
+            results = self._query(query_embedding, n_results)
+            hits = self._format_results(results, min_similarity)
+        except Exception as e:
+            print(f"❌ Erro na busca entre modelos: {e}")
+            return empty
+        
+        # Agrupa por modelo mantendo os top-k de cada um (hits já vêm ordenados)
+        sections_by_model = {}
+        for document, score in hits:
+            for model in document['printer_models'] or ['desconhecido']:
+                group = sections_by_model.setdefault(model, [])
+                if len(group) < per_model_k:
+                    group.append((dict(document, printer_model=model), score))
+        
+        if not sections_by_model:
+            return empty
+        
+        # Verossimilhança por modelo: softmax da similaridade média dos top-k
+        # (grupos com menos de k hits contam zero nas posições faltantes)
+        model_strength = {
+            model: sum(score for _, score in group) / (100 * per_model_k)
+            for model, group in sections_by_model.items()
+        }
+        model_ranking = rank_models(model_strength, temperature)
+        
+        # Um chunk compartilhado entra uma vez só na lista geral
+        sections = list({document['id']: (document, score)
+                         for group in sections_by_model.values()
+                         for document, score in group}.values())
+        sections.sort(key=lambda x: x[1], reverse=True)
+        
+        return {
+            'model_ranking': model_ranking,
+            'model_strength': model_strength,
+            'sections_by_model': sections_by_model,
+            'sections': sections
+        }
+    
     def get_available_printer_models(self):
-        """Obtém lista de modelos de impressora disponíveis"""
+        """Obtém lista de modelos de impressora disponíveis (em cache até a próxima versão do índice)"""
+        self.refresh_collection()
+        if self._models_cache is not None:
+            return list(self._models_cache)
         try:
-            all_docs = self.collection.get()
+            collection = self.collection
+            all_docs = collection.get(include=['metadatas'])
             models = set()
             
             for metadata in all_docs['metadatas']:
-                if metadata.get('printer_model'):
-                    models.add(metadata['printer_model'])
+                models.update(record_models(metadata))
             
-            return sorted(list(models))
+            models = sorted(list(models))
+            if collection is self.collection:  # não guarda o catálogo de uma versão já trocada
+                self._models_cache = models
+            return list(models)
             
         except Exception as e:
             print(f"❌ Erro ao obter modelos: {e}")
@@ -193,9 +481,7 @@ class ChromaDBSearch:
         """Busca textual simples para busca híbrida"""
         try:
             # Prepara filtros
-            where_filter = {}
-            if printer_model:
-                where_filter["printer_model"] = printer_model
+            where_filter = membership_filter(printer_model) if printer_model else {}
             
             # Busca por contém texto (limitação do ChromaDB)
             # Em implementação real, usaria busca full-text mais sofisticada
@@ -221,7 +507,8 @@ class ChromaDBSearch:
                             'id': all_results['ids'][i],
                             'title': all_results['metadatas'][i].get('original_title', ''),
                             'content': doc_text,
-                            'printer_model': all_results['metadatas'][i].get('printer_model'),
+                            'printer_model': printer_model or all_results['metadatas'][i].get('printer_model'),
+                            'printer_models': record_models(all_results['metadatas'][i]),
                             'type': all_results['metadatas'][i].get('type', 'geral'),
                             'keywords': all_results['metadatas'][i].get('keywords', []),
                             'pdf_hash': all_results['metadatas'][i].get('pdf_hash')
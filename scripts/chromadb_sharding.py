@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Particionamento (sharding) de coleções ChromaDB por modelo ou série
+==================================================================
+
+Layouts suportados:
+- "single": uma única coleção (`epson_manuals`) filtrada com where={"printer_model": ...}
+- "model":  uma coleção por modelo (`epson_manuals__impressoraL3150`)
+- "series": uma coleção por série (`epson_manuals__L3000`)
+
+Com shards, buscas filtradas usam índices HNSW menores (melhor recall para o
+mesmo `ef`) e remover um modelo vira `delete_collection` em vez de get + delete.
+
+`ShardedCollection` expõe o mesmo subconjunto da API de coleção usado pelo
+projeto (add, upsert, update, get, query, delete, count), roteando pelo `printer_model` dos
+metadados. Assim ChromaDBSearch, DriveChromaSync e insert_embeddings funcionam
+sem saber qual layout está em uso.
+"""
+
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional
+
+from chunk_dedup import drop_member, get_member_records, model_from_filter
+from printer_metadata_sync import generate_printer_metadata
+
+LAYOUTS = ("single", "model", "series")
+DEFAULT_LAYOUT = os.environ.get("CHROMADB_LAYOUT", "single")
+SHARD_SEPARATOR = "__"
+COMPANION_SEPARATOR = "."  # coleções auxiliares de uma versão (ex.: índice PCA `base.pca192`)
+MAX_COLLECTION_NAME = 63   # limite do ChromaDB
+SHARD_HASH_LENGTH = 8
+
+
+def get_shard_key(printer_model: str, layout: str) -> str:
+    """Retorna a chave do shard (modelo ou série) de um printer_model"""
+    if layout == "series":
+        return generate_printer_metadata(printer_model)['series']
+    return printer_model
+
+
+def shard_collection_name(base_name: str, shard_key: str) -> str:
+    """
+    Nome da coleção de um shard, válido para o ChromaDB (até 63 caracteres,
+    terminando em caractere alfanumérico).
+
+    Chaves usadas como estão quando possível; se a chave precisa ser
+    sanitizada, truncada ou termina em '_'/'-', o nome leva um hash curto da
+    chave original, para que chaves diferentes nunca caiam no mesmo shard.
+    """
+    prefix = f"{base_name}{SHARD_SEPARATOR}"
+    safe_key = re.sub(r'[^a-zA-Z0-9_-]', '_', shard_key)
+    name = f"{prefix}{safe_key}"
+    if safe_key == shard_key and len(name) <= MAX_COLLECTION_NAME and name[-1].isalnum():
+        return name
+
+    digest = hashlib.sha1(shard_key.encode('utf-8')).hexdigest()[:SHARD_HASH_LENGTH]
+    room = MAX_COLLECTION_NAME - len(prefix) - len(digest) - 1
+    if room < 0:
+        raise ValueError(f"Nome base longo demais para shards: '{base_name}' ({len(base_name)} caracteres)")
+    readable = safe_key[:room].rstrip('_-')
+    return f"{prefix}{readable}_{digest}" if readable else f"{prefix}{digest}"
+
+
+def _collection_name(entry) -> str:
+    """list_collections retorna nomes ou objetos Collection conforme a versão do ChromaDB"""
+    return entry if isinstance(entry, str) else entry.name
+
+
+def list_shards(client, base_name: str) -> List[str]:
+    """Lista os nomes das coleções-shard de uma coleção base"""
+    prefix = f"{base_name}{SHARD_SEPARATOR}"
+    return sorted(
+        name for name in (_collection_name(c) for c in client.list_collections())
+        if name.startswith(prefix)
+    )
+
+
+def list_companions(client, base_name: str) -> List[str]:
+    """Coleções auxiliares de uma coleção base (removidas junto com ela)"""
+    prefix = f"{base_name}{COMPANION_SEPARATOR}"
+    return sorted(
+        name for name in (_collection_name(c) for c in client.list_collections())
+        if name.startswith(prefix)
+    )
+
+
+def detect_layout(client, base_name: str) -> str:
+    """Detecta o layout de uma base existente (padrão: single)"""
+    shards = list_shards(client, base_name)
+    if not shards:
+        return "single"
+    metadata = client.get_collection(name=shards[0]).metadata or {}
+    return metadata.get("layout", "model")
+
+
+def _printer_model_from_where(where) -> Optional[str]:
+    """Extrai o printer_model de filtros simples ({"printer_model": X}, {"$eq": X} ou membership_filter)"""
+    if not isinstance(where, dict) or set(where) != {"printer_model"}:
+        return model_from_filter(where)
+    value = where["printer_model"]
+    if isinstance(value, dict):
+        return value.get("$eq")
+    return value
+
+
+class ShardedCollection:
+    """Coleção lógica composta por um shard ChromaDB por modelo ou série"""
+
+    def __init__(self, client, base_name: str, layout: str, collection_metadata: Optional[Dict] = None):
+        if layout not in ("model", "series"):
+            raise ValueError(f"Layout de shards inválido: {layout}")
+        self.client = client
+        self.name = base_name
+        self.layout = layout
+        self.collection_metadata = collection_metadata or {}
+        self._shards = {}
+
+    @property
+    def metadata(self) -> Dict:
+        """Descritor da coleção lógica (metadados do primeiro shard, incluindo hnsw:*)"""
+        shards = self._all_shards()
+        if shards:
+            return shards[0].metadata or {}
+        return dict(self.collection_metadata)
+
+    # ------------------------------------------------------------------ shards
+
+    def _shard_metadata(self, shard_key: str) -> Dict:
+        metadata = dict(self.collection_metadata)
+        metadata.update({"layout": self.layout, "shard_key": shard_key, "base_collection": self.name})
+        return metadata
+
+    def _get_shard(self, shard_key: str, create: bool = False):
+        """Obtém (ou cria) a coleção de um shard"""
+        name = shard_collection_name(self.name, shard_key)
+        if name in self._shards:
+            return self._shards[name]
+        try:
+            shard = self.client.get_collection(name=name)
+        except Exception:
+            if not create:
+                return None
+            shard = self.client.create_collection(name=name, metadata=self._shard_metadata(shard_key))
+        self._shards[name] = shard
+        return shard
+
+    def _all_shards(self):
+        """Todas as coleções-shard existentes (redescobre a cada chamada)"""
+        shards = []
+        for name in list_shards(self.client, self.name):
+            if name not in self._shards:
+                self._shards[name] = self.client.get_collection(name=name)
+            shards.append(self._shards[name])
+        return shards
+
+    def _route(self, where):
+        """Shards relevantes para um filtro e o filtro a repassar"""
+        printer_model = _printer_model_from_where(where)
+        if printer_model is None:
+            return self._all_shards(), where
+
+        shard = self._get_shard(get_shard_key(printer_model, self.layout))
+        if shard is None:
+            return [], where
+        # No layout por modelo o shard já é o filtro - evita o pós-filtro do HNSW
+        return [shard], (None if self.layout == "model" else where)
+
+    def drop_model(self, printer_model: str) -> int:
+        """Remove um modelo; no layout por modelo é um delete_collection (tempo constante)"""
+        shard_key = get_shard_key(printer_model, self.layout)
+        shard = self._get_shard(shard_key)
+        if shard is None:
+            return 0
+
+        if self.layout == "model":
+            removed = shard.count()
+            self.client.delete_collection(name=shard.name)
+            self._shards.pop(shard.name, None)
+            return removed
+
+        # Chunks compartilhados com outros modelos da série só perdem a participação
+        records = get_member_records(shard, printer_model)
+        drop_member(shard, records, printer_model)
+        if shard.count() == 0:
+            self.client.delete_collection(name=shard.name)
+            self._shards.pop(shard.name, None)
+        return len(records)
+
+    # ------------------------------------------------------------ API coleção
+
+    def _write(self, method: str, ids, documents=None, metadatas=None, embeddings=None):
+        """add/upsert/update roteando cada item pelo printer_model dos metadados"""
+        groups = {}
+        for i, metadata in enumerate(metadatas):
+            shard_key = get_shard_key(metadata['printer_model'], self.layout)
+            groups.setdefault(shard_key, []).append(i)
+
+        for shard_key, indexes in groups.items():
+            shard = self._get_shard(shard_key, create=True)
+            kwargs = {'ids': [ids[i] for i in indexes], 'metadatas': [metadatas[i] for i in indexes]}
+            if documents is not None:
+                kwargs['documents'] = [documents[i] for i in indexes]
+            if embeddings is not None:
+                kwargs['embeddings'] = [embeddings[i] for i in indexes]
+            getattr(shard, method)(**kwargs)
+
+    def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        """Insere roteando cada item pelo printer_model dos metadados"""
+        self._write('add', ids, documents, metadatas, embeddings)
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        """Insere ou substitui roteando pelo printer_model dos metadados"""
+        self._write('upsert', ids, documents, metadatas, embeddings)
+
+    def update(self, ids, documents=None, metadatas=None, embeddings=None):
+        """Atualiza itens existentes (metadados obrigatórios para o roteamento)"""
+        self._write('update', ids, documents, metadatas, embeddings)
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self._all_shards())
+
+    def get(self, ids=None, where=None, limit=None, include=None):
+        """Concatena o resultado de get() dos shards relevantes"""
+        shards, shard_where = self._route(where)
+        merged = {'ids': [], 'documents': [], 'metadatas': [], 'embeddings': []}
+        kwargs = {}
+        if include is not None:
+            kwargs['include'] = include
+
+        for shard in shards:
+            remaining = None if limit is None else limit - len(merged['ids'])
+            if remaining is not None and remaining <= 0:
+                break
+            part = shard.get(ids=ids, where=shard_where, limit=remaining, **kwargs)
+            for key in merged:
+                values = part.get(key)
+                if values is not None:
+                    merged[key].extend(values)
+
+        return merged
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None):
+        """Consulta os shards relevantes e intercala os resultados por distância"""
+        shards, shard_where = self._route(where)
+        kwargs = {}
+        if include is not None:
+            kwargs['include'] = include
+
+        partials = []
+        for shard in shards:
+            shard_count = shard.count()
+            if shard_count == 0:
+                continue
+            partials.append(shard.query(
+                query_embeddings=query_embeddings,
+                n_results=min(n_results, shard_count),
+                where=shard_where,
+                **kwargs
+            ))
+
+        # Campos fora do include ficam None, como no ChromaDB
+        all_keys = ('ids', 'distances', 'documents', 'metadatas', 'embeddings')
+        keys = [key for key in all_keys if any(part.get(key) is not None for part in partials)] or ['ids']
+        merged = {key: ([] if key in keys else None) for key in all_keys}
+
+        for q in range(len(query_embeddings)):
+            hits = [
+                {key: part[key][q][i] for key in keys}
+                for part in partials
+                for i in range(len(part['ids'][q]))
+            ]
+            hits.sort(key=lambda hit: hit.get('distances', 0))
+            for key in keys:
+                merged[key].append([hit[key] for hit in hits[:n_results]])
+
+        return merged
+
+    def delete(self, ids=None, where=None):
+        shards, shard_where = self._route(where)
+        for shard in shards:
+            shard.delete(ids=ids, where=shard_where)
+
+
+def open_collection(client, base_name: str, layout: Optional[str] = None, create: bool = False,
+                    collection_metadata: Optional[Dict] = None):
+    """
+    Abre a coleção lógica no layout pedido (ou detectado).
+
+    Retorna a coleção ChromaDB nativa no layout "single" e um ShardedCollection
+    nos layouts "model"/"series".
+    """
+    layout = layout or detect_layout(client, base_name)
+    if layout not in LAYOUTS:
+        raise ValueError(f"Layout inválido: {layout} (opções: {', '.join(LAYOUTS)})")
+
+    if layout != "single":
+        return ShardedCollection(client, base_name, layout, collection_metadata)
+
+    if create:
+        # Coleção existente mantém seu descritor (o espaço HNSW não pode ser alterado depois)
+        try:
+            return client.get_collection(name=base_name)
+        except Exception:
+            return client.create_collection(name=base_name, metadata=collection_metadata)
+    return client.get_collection(name=base_name)
+
+
+def delete_logical_collection(client, base_name: str):
+    """Remove a coleção base, todos os seus shards e coleções auxiliares"""
+    removed = []
+    for name in [base_name] + list_shards(client, base_name) + list_companions(client, base_name):
+        try:
+            client.delete_collection(name=name)
+            removed.append(name)
+        except Exception:
+            pass
+    return removed
+
+
+def remove_model(collection, printer_model: str) -> int:
+    """Remove todas as seções de um modelo, qualquer que seja o layout"""
+    if isinstance(collection, ShardedCollection):
+        return collection.drop_model(printer_model)
+
+    records = get_member_records(collection, printer_model)
+    drop_member(collection, records, printer_model)
+    return len(records)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Deduplicação de chunks entre manuais com participação multi-modelo
+=================================================================
+
+Manuais da mesma série (L3110/L3150/L3250, L4150/L4260) repetem blocos inteiros:
+avisos de segurança, recarga de tinta, descrição do painel. Em vez de guardar e
+gerar embedding de cada cópia por `printer_model`, chunks com o mesmo texto
+normalizado viram um único registro que pertence a vários modelos.
+
+O ChromaDB só aceita valores escalares nos metadados, então a participação é
+gravada como:
+
+- `printer_model`:  modelo "dono" do registro (roteamento de shards, exibição)
+- `printer_models`: todos os modelos, separados por vírgula (leitura)
+- `in__<modelo>`:   True para cada modelo participante (filtro); False após sair
+- `dedup_key`:      sha1 do texto normalizado
+
+Buscas filtradas usam `membership_filter(modelo)`, que também casa registros
+antigos (sem os campos acima) pelo `printer_model`.
+
+No layout "series" a deduplicação acontece dentro de cada série (os modelos que
+compartilham conteúdo ficam no mesmo shard); no layout "model" cada shard é de
+um modelo só, então só cópias dentro do mesmo manual são unificadas.
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional
+
+MEMBER_PREFIX = "in__"
+MEMBERS_FIELD = "printer_models"
+DEDUP_KEY_FIELD = "dedup_key"
+
+
+def normalize_for_dedup(text: str) -> str:
+    """Texto comparável: NFKC, sem diferença de caixa e com espaços colapsados"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def dedup_key(text: str) -> str:
+    return hashlib.sha1(normalize_for_dedup(text).encode("utf-8")).hexdigest()[:16]
+
+
+def member_field(printer_model: str) -> str:
+    return f"{MEMBER_PREFIX}{printer_model}"
+
+
+def membership_filter(printer_model: str) -> Dict:
+    """Filtro `where` de um modelo: dono do registro ou participante de um chunk compartilhado"""
+    return {"$or": [{"printer_model": printer_model}, {member_field(printer_model): True}]}
+
+
+def model_from_filter(where) -> Optional[str]:
+    """Modelo de um `membership_filter` (None para outros filtros)"""
+    if not isinstance(where, dict) or set(where) != {"$or"}:
+        return None
+    clauses = where["$or"]
+    if len(clauses) != 2 or set(clauses[0]) != {"printer_model"}:
+        return None
+    printer_model = clauses[0]["printer_model"]
+    return printer_model if clauses[1] == {member_field(printer_model): True} else None
+
+
+def record_models(metadata: Optional[Dict]) -> List[str]:
+    """Modelos a que um registro pertence (o dono primeiro)"""
+    if not metadata:
+        return []
+    owner = metadata.get("printer_model")
+    members = [m for m in (metadata.get(MEMBERS_FIELD) or "").split(",") if m]
+    return ([owner] if owner else []) + [m for m in members if m != owner]
+
+
+def set_members(metadata: Dict, printer_models: Iterable[str]) -> Dict:
+    """Grava a participação nos metadados (o primeiro modelo vira o dono)"""
+    models = list(dict.fromkeys(m for m in printer_models if m))
+    # `update` do ChromaDB mescla os metadados: flags antigas viram False em vez de sumir
+    for key in [k for k in metadata if k.startswith(MEMBER_PREFIX)]:
+        metadata[key] = False
+    metadata["printer_model"] = models[0]
+    metadata[MEMBERS_FIELD] = ",".join(models)
+    for model in models:
+        metadata[member_field(model)] = True
+    return metadata
+
+
+def drop_member(collection, records: Dict[str, Dict], printer_model: str, batch_size: int = 128):
+    """
+    Tira um modelo dos registros {id: metadados}: quem só pertencia a ele é
+    removido; chunks compartilhados só perdem a participação (e trocam de dono
+    se ele era o dono). Retorna (removidos, desvinculados).
+    """
+    delete_ids, update_ids, update_metadatas = [], [], []
+    for record_id, metadata in records.items():
+        remaining = [m for m in record_models(metadata) if m != printer_model]
+        if remaining:
+            update_ids.append(record_id)
+            update_metadatas.append(set_members(dict(metadata), remaining))
+        else:
+            delete_ids.append(record_id)
+
+    for i in range(0, len(delete_ids), batch_size):
+        collection.delete(ids=delete_ids[i:i + batch_size])
+    for i in range(0, len(update_ids), batch_size):
+        collection.update(ids=update_ids[i:i + batch_size], metadatas=update_metadatas[i:i + batch_size])
+    return len(delete_ids), len(update_ids)
+
+
+def get_member_records(collection, printer_model: str) -> Dict[str, Dict]:
+    """{id: metadados} de todos os registros de que o modelo participa"""
+    results = collection.get(where=membership_filter(printer_model), include=["metadatas"])
+    return dict(zip(results["ids"], results["metadatas"]))
+
+
+class ChunkDeduplicator:
+    """
+    Filtra um fluxo de itens processados ({'id', 'text', 'metadata'}) deixando
+    passar só a primeira cópia de cada texto; as demais viram participação no
+    registro canônico. Registros canônicos que ganharam modelos depois de
+    emitidos ficam em `updated` para um `collection.update` ao final.
+    """
+
+    def __init__(self, shard_key: Optional[Callable[[str], str]] = None):
+        self.shard_key = shard_key or (lambda printer_model: "")
+        self.canonical = {}  # (shard, dedup_key) → (id, metadados)
+        self.updated = {}    # id → metadados
+        self.total = 0
+        self.unique = 0
+
+    def filter(self, items: Iterable[Dict]):
+        for item in items:
+            self.total += 1
+            metadata = item["metadata"]
+            printer_model = metadata["printer_model"]
+            key = dedup_key(item["text"])
+            metadata[DEDUP_KEY_FIELD] = key
+
+            entry = self.canonical.get((self.shard_key(printer_model), key))
+            if entry is None:
+                set_members(metadata, [printer_model])
+                self.canonical[(self.shard_key(printer_model), key)] = (item["id"], metadata)
+                self.unique += 1
+                yield item
+                continue
+
+            canonical_id, canonical_metadata = entry
+            models = record_models(canonical_metadata)
+            if printer_model not in models:
+                set_members(canonical_metadata, models + [printer_model])
+                self.updated[canonical_id] = canonical_metadata
+
+    def apply_updates(self, collection, batch_size: int = 128) -> int:
+        """Grava a participação dos registros canônicos que ganharam modelos"""
+        ids = list(self.updated)
+        for i in range(0, len(ids), batch_size):
+            part = ids[i:i + batch_size]
+            collection.update(ids=part, metadatas=[self.updated[record_id] for record_id in part])
+        return len(ids)
+
+    @property
+    def ratio(self) -> float:
+        """Fração de chunks eliminados (0 = nenhuma duplicata)"""
+        return 1 - self.unique / self.total if self.total else 0.0
+
+    def report(self):
+        shared = sum(1 for _, metadata in self.canonical.values() if "," in metadata.get(MEMBERS_FIELD, ""))
+        print(f"♻️  Deduplicação: {self.total} chunks → {self.unique} únicos "
+              f"({self.ratio:.1%} eliminados, {shared} compartilhados entre modelos)")
+
+    def stats(self) -> Dict:
+        return {"chunks_total": self.total, "chunks_unique": self.unique, "dedup_ratio": round(self.ratio, 4)}
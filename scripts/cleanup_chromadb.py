@@ -25,6 +25,11 @@ from googleapiclient.discovery import build
 # ChromaDB imports
 import chromadb
 from sentence_transformers import SentenceTransformer
+from collection_versions import open_live_collection
+from chromadb_sharding import remove_model
+from index_version import bump_index_version
+from pca_index import refresh_pca_index
+from chunk_dedup import membership_filter, record_models
 
 # CONFIGURAÇÕES
 DRIVE_FOLDER_ID = '1B-Xsgvy4W392yfLP4ilrzrtl8zzmEgTl'
@@ -85,8 +90,8 @@ def get_models_in_chromadb(collection):
         # Agrupa por modelo
         models = defaultdict(int)
         for metadata in all_data['metadatas']:
-            if metadata and 'printer_model' in metadata:
-                model = metadata['printer_model']
+            # Chunks compartilhados contam para cada modelo participante
+            for model in record_models(metadata):
                 models[model] += 1
         
         return dict(models)
@@ -153,16 +158,10 @@ def remove_from_chromadb(collection, models_to_remove):
     
     for model in models_to_remove:
         try:
-            # Busca todos os IDs com este modelo
-            results = collection.get(
-                where={"printer_model": model},
-                include=['metadatas']
-            )
+            # Remove as seções do modelo (chunks compartilhados só perdem a participação)
+            removed_count = remove_model(collection, model)
             
-            if results['ids']:
-                # Remove todos os documentos deste modelo
-                collection.delete(ids=results['ids'])
-                removed_count = len(results['ids'])
+            if removed_count:
                 total_removed += removed_count
                 print(f"   ✅ Removidas {removed_count} seções do modelo '{model}'")
             else:
@@ -180,7 +179,7 @@ def verify_removal(collection, models_removed):
     all_success = True
     for model in models_removed:
         results = collection.get(
-            where={"printer_model": model},
+            where=membership_filter(model),
             limit=1
         )
         
@@ -226,7 +225,7 @@ def main():
         return
     
     try:
-        collection = client.get_collection(name=COLLECTION_NAME)
+        collection = open_live_collection(client, CHROMADB_PATH, COLLECTION_NAME)
         print(f"   ✅ Coleção '{COLLECTION_NAME}' carregada")
     except Exception as e:
         print(f"❌ Erro ao carregar coleção: {e}")
@@ -280,6 +279,13 @@ def main():
     # Remove do ChromaDB
     print(f"\n🗑️  Removendo do ChromaDB...")
     removed_count = remove_from_chromadb(collection, models_to_remove)
+    if removed_count:
+        # Índice PCA (se houver) com os mesmos IDs e participações da coleção
+        try:
+            refresh_pca_index(client, CHROMADB_PATH, collection)
+        except Exception as e:
+            print(f"⚠️  Erro ao atualizar o índice PCA: {e}")
+        bump_index_version(CHROMADB_PATH, "cleanup", {'models_removed': models_to_remove})
     
     # Verifica se a remoção foi bem-sucedida
     if verify_removal(collection, models_to_remove):
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Coleções versionadas (blue/green) com ponteiro para a versão ativa
+=================================================================
+
+Reindexações completas não mexem mais na coleção em uso: cada rebuild cria
+uma versão nova (`epson_manuals@20261019T101500`), preenche em segundo plano e
+só então o ponteiro passa a apontar para ela. Quem está consultando continua
+na versão anterior até a troca, e o ChromaDBSearch muda de versão entre uma
+requisição e outra (ver `refresh_collection`).
+
+O ChromaDB só aceita [a-zA-Z0-9._-] em nomes de coleção, então a versão
+`base@timestamp` é gravada fisicamente como `base-v<timestamp>`.
+
+Ponteiro: `<db_path>/live_collections.json`, trocado atomicamente (arquivo
+temporário + os.replace):
+
+    {"epson_manuals": {"live": "epson_manuals-v20261019101500",
+                       "version": "epson_manuals@20261019T101500",
+                       "layout": "single", "switched_at": "...",
+                       "previous": "epson_manuals-v20261018093000"}}
+
+Sem ponteiro, a coleção base (`epson_manuals`) continua sendo usada.
+"""
+
+import json
+import os
+import re
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from chromadb_sharding import SHARD_SEPARATOR, _collection_name, delete_logical_collection, open_collection
+from index_version import bump_index_version
+from pca_index import remove_projection_files
+
+POINTER_FILENAME = "live_collections.json"
+VERSION_MARKER = "-v"
+TIMESTAMP_FORMAT = "%Y%m%d%H%M%S"
+
+
+def pointer_path(db_path) -> str:
+    return os.path.join(str(db_path), POINTER_FILENAME)
+
+
+def new_version_name(base_name: str) -> str:
+    """Nome físico de uma nova versão da coleção base"""
+    return f"{base_name}{VERSION_MARKER}{datetime.now().strftime(TIMESTAMP_FORMAT)}"
+
+
+def version_label(version_name: str) -> str:
+    """Rótulo legível `base@timestamp` de uma versão física"""
+    match = re.match(rf"^(.*){VERSION_MARKER}(\d{{14}})$", version_name)
+    if not match:
+        return version_name
+    timestamp = datetime.strptime(match.group(2), TIMESTAMP_FORMAT)
+    return f"{match.group(1)}@{timestamp.strftime('%Y%m%dT%H%M%S')}"
+
+
+def read_pointers(db_path) -> Dict[str, Dict]:
+    try:
+        with open(pointer_path(db_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def read_pointer(db_path, base_name: str) -> Optional[Dict]:
+    """Entrada do ponteiro para a coleção base (None se nunca foi versionada)"""
+    return read_pointers(db_path).get(base_name)
+
+
+def pointer_mtime(db_path) -> float:
+    """mtime do arquivo de ponteiro (0 se não existir) - checagem barata de troca"""
+    try:
+        return os.stat(pointer_path(db_path)).st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def resolve_live_collection(db_path, base_name: str) -> str:
+    """Nome físico da versão ativa (a própria base quando não há ponteiro)"""
+    entry = read_pointer(db_path, base_name)
+    return entry['live'] if entry else base_name
+
+
+def open_live_collection(client, db_path, base_name: str, layout: Optional[str] = None):
+    """Abre a versão ativa da coleção lógica"""
+    return open_collection(client, resolve_live_collection(db_path, base_name), layout=layout)
+
+
+def publish_version(db_path, base_name: str, version_name: str, layout: str = "single") -> Dict:
+    """Troca atomicamente a versão ativa da coleção base"""
+    pointers = read_pointers(db_path)
+    previous = pointers.get(base_name, {}).get('live', base_name)
+    pointers[base_name] = {
+        'live': version_name,
+        'version': version_label(version_name),
+        'layout': layout,
+        'switched_at': datetime.now().isoformat(),
+        'previous': previous,
+    }
+
+    os.makedirs(str(db_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=str(db_path), prefix=".live_collections.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(pointers, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, pointer_path(db_path))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    print(f"🔀 Versão ativa de '{base_name}': {version_label(version_name)} (anterior: {version_label(previous)})")
+    bump_index_version(db_path, "publish", {'collection': base_name, 'live': version_name})
+    return pointers[base_name]
+
+
+def list_versions(client, base_name: str) -> List[str]:
+    """Versões lógicas existentes da base (inclui a base legada não versionada)"""
+    pattern = re.compile(rf"^{re.escape(base_name)}({re.escape(VERSION_MARKER)}\d{{14}})?$")
+    versions = set()
+    for name in (_collection_name(c) for c in client.list_collections()):
+        logical = name.split(SHARD_SEPARATOR, 1)[0]
+        if pattern.match(logical):
+            versions.add(logical)
+    return sorted(versions)
+
+
+def gc_old_versions(client, db_path, base_name: str, keep_previous: bool = True) -> List[str]:
+    """
+    Remove versões que não são a ativa. Por padrão mantém a imediatamente
+    anterior, que processos ainda não trocados podem estar consultando
+    (e que serve de rollback); ela é coletada na reindexação seguinte.
+    """
+    entry = read_pointer(db_path, base_name)
+    if not entry:
+        return []
+
+    protected = {entry['live']}
+    if keep_previous and entry.get('previous'):
+        protected.add(entry['previous'])
+
+    removed = []
+    for version in list_versions(client, base_name):
+        if version not in protected:
+            removed.extend(delete_logical_collection(client, version))
+    remove_projection_files(db_path, removed)
+    if removed:
+        print(f"🧹 Versões antigas removidas: {', '.join(removed)}")
+    return removed
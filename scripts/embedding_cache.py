@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Cache persistente de embeddings endereçado por conteúdo
+======================================================
+
+Quando um manual muda no Drive, a maior parte dos chunks continua idêntica à
+revisão anterior. O cache guarda o embedding de cada chunk indexado por
+(modelo de embeddings, tipo de prefixo, sha256 do texto), de modo que re-syncs
+e re-migrações só chamam `SentenceTransformer.encode` para o texto realmente novo.
+
+Armazenamento (em chromadb_storage/embedding_cache/ por padrão):
+- index.sqlite: chave → slot no arquivo de vetores + último uso
+- <modelo>.f32: matriz float32 memory-mapped (um arquivo por modelo/dimensão)
+
+Quando o total passa de `max_bytes` (EMBEDDING_CACHE_MAX_MB, padrão 512 MB),
+as entradas usadas há mais tempo são removidas e seus slots reaproveitados.
+EMBEDDING_CACHE=off desativa o cache.
+
+Vários processos compartilham o mesmo cache (worker de sincronização,
+reindexação em segundo plano, pipeline de ingestão): alocação de slots,
+gravação dos vetores e evicção rodam dentro de `BEGIN IMMEDIATE` (trava de
+escrita do SQLite), e a capacidade do arquivo é relida do banco antes de
+crescer ou de acessar um slot, já que outro processo pode tê-lo aumentado.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DEFAULT_CACHE_DIR = Path(os.environ.get("EMBEDDING_CACHE_DIR", PROJECT_ROOT / "chromadb_storage" / "embedding_cache"))
+DEFAULT_MAX_BYTES = int(os.environ.get("EMBEDDING_CACHE_MAX_MB", 512)) * 1024 * 1024
+CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE", "on").lower() not in ("off", "0", "false")
+
+# Ao estourar o limite, remove até ficar nesta fração dele (evita evicção a cada inserção)
+EVICTION_TARGET = 0.9
+INITIAL_CAPACITY = 1024
+
+
+def text_hash(text: str) -> str:
+    """sha256 do texto do chunk (sem prefixo)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Cache de embeddings em SQLite + arquivo de vetores memory-mapped"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._stores = {}  # model_name → (memmap, dim, capacity)
+
+        # Transações explícitas (isolation_level=None): o sqlite3 só abriria uma
+        # implicitamente no primeiro UPDATE, depois dos SELECTs da alocação
+        self.db = sqlite3.connect(str(self.cache_dir / "index.sqlite"), timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_name TEXT NOT NULL,
+                model_type TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                slot INTEGER NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model_name, model_type, text_hash)
+            );
+            CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used);
+            CREATE TABLE IF NOT EXISTS stores (
+                model_name TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                capacity INTEGER NOT NULL,
+                next_slot INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS free_slots (
+                model_name TEXT NOT NULL,
+                slot INTEGER NOT NULL
+            );
+        """)
+
+    @contextmanager
+    def _write_transaction(self):
+        """Transação com a trava de escrita já adquirida (exclusiva entre processos)"""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    # ------------------------------------------------------------- vetores
+
+    def _vectors_path(self, model_name: str) -> Path:
+        slug = re.sub(r'[^a-zA-Z0-9_-]', '_', model_name)
+        return self.cache_dir / f"{slug}.f32"
+
+    def _open_store(self, model_name: str, dim: Optional[int] = None, min_capacity: int = 0):
+        """
+        Abre (ou cria, se `dim` for informado, dentro de uma transação de escrita)
+        o arquivo de vetores de um modelo. Reabre com a capacidade atual do banco
+        quando a mapeada neste processo não cobre `min_capacity` slots.
+        """
+        if model_name in self._stores:
+            if self._stores[model_name][2] >= min_capacity:
+                return self._stores[model_name]
+            self._stores.pop(model_name)[0].flush()
+
+        row = self.db.execute("SELECT dim, capacity FROM stores WHERE model_name = ?", (model_name,)).fetchone()
+        if row is None:
+            if dim is None:
+                return None
+            row = (dim, INITIAL_CAPACITY)
+            self.db.execute("INSERT INTO stores (model_name, dim, capacity, next_slot) VALUES (?, ?, ?, 0)",
+                            (model_name, dim, INITIAL_CAPACITY))
+
+        store_dim, capacity = row
+        path = self._vectors_path(model_name)
+        self._ensure_file_size(path, capacity * store_dim * 4)
+        vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, store_dim))
+        self._stores[model_name] = (vectors, store_dim, capacity)
+        return self._stores[model_name]
+
+    @staticmethod
+    def _ensure_file_size(path: Path, size: int):
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+
+    def _grow(self, model_name: str, needed: int):
+        """Dobra a capacidade do arquivo de vetores até caber `needed` slots (na transação de escrita)"""
+        # Capacidade do banco, não a deste processo: outro processo pode ter crescido o arquivo
+        (capacity,) = self.db.execute("SELECT capacity FROM stores WHERE model_name = ?",
+                                      (model_name,)).fetchone()
+        new_capacity = capacity
+        while new_capacity < needed:
+            new_capacity *= 2
+        if new_capacity != capacity:
+            self.db.execute("UPDATE stores SET capacity = ? WHERE model_name = ?", (new_capacity, model_name))
+        self._open_store(model_name, min_capacity=new_capacity)
+
+    def _allocate_slots(self, model_name: str, count: int) -> List[int]:
+        """Reaproveita slots liberados pela evicção e depois cresce o arquivo (na transação de escrita)"""
+        free = [slot for (slot,) in self.db.execute(
+            "SELECT slot FROM free_slots WHERE model_name = ? LIMIT ?", (model_name, count))]
+        if free:
+            self.db.executemany("DELETE FROM free_slots WHERE model_name = ? AND slot = ?",
+                                [(model_name, slot) for slot in free])
+
+        missing = count - len(free)
+        if missing:
+            (next_slot,) = self.db.execute("SELECT next_slot FROM stores WHERE model_name = ?",
+                                           (model_name,)).fetchone()
+            self.db.execute("UPDATE stores SET next_slot = ? WHERE model_name = ?",
+                            (next_slot + missing, model_name))
+            self._grow(model_name, next_slot + missing)
+            free.extend(range(next_slot, next_slot + missing))
+        return free
+
+    # ----------------------------------------------------------------- API
+
+    def _lookup(self, model_name: str, model_type: str, hashes: List[str]):
+        """(hash, slot) das entradas existentes, consultando em lotes (limite de parâmetros do SQLite)"""
+        unique = list(dict.fromkeys(hashes))
+        for i in range(0, len(unique), 500):
+            part = unique[i:i + 500]
+            yield from self.db.execute(
+                f"SELECT text_hash, slot FROM embeddings WHERE model_name = ? AND model_type = ? "
+                f"AND text_hash IN ({','.join('?' * len(part))})",
+                [model_name, model_type, *part]
+            ).fetchall()
+
+    def get_many(self, model_name: str, model_type: str, hashes: List[str]) -> List[Optional[np.ndarray]]:
+        """Embeddings em cache para cada hash (None quando ausente)"""
+        if not hashes:
+            return []
+
+        # Consulta, cópia dos vetores e last_used sob a trava de escrita: a evicção
+        # de outro processo não libera e reaproveita um slot entre a consulta e a cópia
+        found = {}
+        with self._write_transaction():
+            if self._open_store(model_name) is not None:
+                slots = dict(self._lookup(model_name, model_type, hashes))
+                if slots:
+                    vectors = self._open_store(model_name, min_capacity=max(slots.values()) + 1)[0]
+                    found = {text_hash_: np.array(vectors[slot]) for text_hash_, slot in slots.items()}
+
+                    now = time.time()
+                    self.db.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model_name = ? AND model_type = ? AND text_hash = ?",
+                        [(now, model_name, model_type, h) for h in found]
+                    )
+
+        results = [found.get(h) for h in hashes]
+        hits = sum(r is not None for r in results)
+        self.hits += hits
+        self.misses += len(hashes) - hits
+        return results
+
+    def put_many(self, model_name: str, model_type: str, hashes: List[str], embeddings):
+        """Grava embeddings novos (hashes já presentes são ignorados)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not len(hashes):
+            return
+
+        # Tudo sob a trava de escrita: outro processo não recebe os mesmos slots
+        # nem grava o mesmo hash em outro slot entre a consulta e a inserção
+        with self._write_transaction():
+            self._open_store(model_name, dim=embeddings.shape[1])
+            existing = {text_hash_ for text_hash_, _ in self._lookup(model_name, model_type, hashes)}
+
+            new = {}
+            for h, vector in zip(hashes, embeddings):
+                if h not in existing and h not in new:
+                    new[h] = vector
+            if not new:
+                return
+
+            slots = self._allocate_slots(model_name, len(new))
+            vectors, dim, _ = self._open_store(model_name, min_capacity=max(slots) + 1)
+            for slot, vector in zip(slots, new.values()):
+                vectors[slot] = vector
+            vectors.flush()
+
+            now = time.time()
+            self.db.executemany(
+                "INSERT INTO embeddings (model_name, model_type, text_hash, slot, nbytes, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(model_name, model_type, h, slot, dim * 4, now) for h, slot in zip(new, slots)]
+            )
+            evicted = self._evict_if_needed()
+        if evicted:
+            print(f"🧹 Cache de embeddings: {evicted} entradas antigas removidas")
+
+    def _evict_if_needed(self) -> int:
+        """
+        Remove as entradas menos usadas recentemente quando o cache passa de
+        max_bytes (na transação de escrita); retorna quantas foram removidas.
+        """
+        (total,) = self.db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()
+        if total <= self.max_bytes:
+            return 0
+
+        to_free = total - int(self.max_bytes * EVICTION_TARGET)
+        evicted = []
+        for model_name, model_type, text_hash_, slot, nbytes in self.db.execute(
+            "SELECT model_name, model_type, text_hash, slot, nbytes FROM embeddings ORDER BY last_used"
+        ):
+            evicted.append((model_name, model_type, text_hash_, slot))
+            to_free -= nbytes
+            if to_free <= 0:
+                break
+
+        self.db.executemany("DELETE FROM embeddings WHERE model_name = ? AND model_type = ? AND text_hash = ?",
+                            [(m, t, h) for m, t, h, _ in evicted])
+        self.db.executemany("INSERT INTO free_slots (model_name, slot) VALUES (?, ?)",
+                            [(m, slot) for m, _, _, slot in evicted])
+        return len(evicted)
+
+    def stats(self):
+        """Entradas, bytes ocupados e acertos/faltas desde a abertura"""
+        (entries, total) = self.db.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()
+        return {"entries": entries, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        """Descarrega os vetores em disco e fecha o índice"""
+        for vectors, _, _ in self._stores.values():
+            vectors.flush()
+        self._stores.clear()
+        self.db.close()
+
+
+_default_cache = None
+
+
+def get_default_cache() -> Optional[EmbeddingCache]:
+    """Cache compartilhado do processo (None se desativado ou indisponível)"""
+    global _default_cache
+    if not CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        try:
+            _default_cache = EmbeddingCache()
+        except Exception as e:
+            print(f"⚠️  Cache de embeddings indisponível: {e}")
+            return None
+    return _default_cache
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Agendador de batches por comprimento para o SentenceTransformer
+===============================================================
+
+Um batch de `model.encode` custa (itens × tokens do MAIOR item): títulos curtos
+no mesmo batch de uma seção de 800 caracteres são preenchidos (padding) até o
+tamanho dela. Com batches de tamanho fixo na ordem dos documentos, boa parte do
+trabalho da CPU vai para padding.
+
+Aqui os textos são ordenados pelo número de tokens e agrupados por um orçamento
+de tokens (itens × maior comprimento ≤ `token_budget`) em vez de uma contagem:
+textos curtos saem em batches grandes, seções longas em batches pequenos, e o
+padding fica perto de zero. Os embeddings voltam na ordem original.
+
+O `encode` do SentenceTransformer já ordena por caracteres dentro de uma chamada,
+mas com o mesmo número de itens por batch; o ganho aqui vem do tamanho variável.
+Compare com `scripts/benchmark_encoding.py`.
+
+Configuração: EMBED_TOKEN_BUDGET (padrão 16384 tokens por batch) e
+EMBED_MAX_BATCH (padrão 512 itens por batch).
+"""
+
+import os
+import time
+from typing import List, Sequence
+
+import numpy as np
+
+TOKEN_BUDGET = int(os.environ.get("EMBED_TOKEN_BUDGET", 16384))
+MAX_BATCH = int(os.environ.get("EMBED_MAX_BATCH", 512))
+CHARS_PER_TOKEN = 4  # estimativa quando o modelo não expõe o tokenizer
+
+
+def token_lengths(model, texts: Sequence[str]) -> List[int]:
+    """Tokens de cada texto como o modelo vai vê-los (com truncamento em max_seq_length)"""
+    max_length = getattr(model, "max_seq_length", None) or 512
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is not None:
+        try:
+            encoded = tokenizer(list(texts), add_special_tokens=True, truncation=True, max_length=max_length)
+            return [len(ids) for ids in encoded["input_ids"]]
+        except Exception:
+            pass  # tokenizer sem chamada em lote: cai na estimativa
+    return [min(max_length, len(text) // CHARS_PER_TOKEN + 2) for text in texts]
+
+
+def plan_batches(lengths: Sequence[int], token_budget: int = TOKEN_BUDGET,
+                 max_batch: int = MAX_BATCH) -> List[List[int]]:
+    """
+    Índices agrupados em batches: ordem decrescente de tokens, cada batch com
+    itens × maior comprimento ≤ token_budget (sempre ao menos um item).
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    start = 0
+    while start < len(order):
+        # O primeiro item do batch é o mais longo: ele define o padding
+        longest = max(lengths[order[start]], 1)
+        size = max(1, min(max_batch, token_budget // longest))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def encode_bucketed(model, texts: Sequence[str], token_budget: int = TOKEN_BUDGET,
+                    max_batch: int = MAX_BATCH, stats=None, **encode_kwargs) -> np.ndarray:
+    """
+    `model.encode` com batches por orçamento de tokens; retorna os embeddings na
+    ordem de `texts`. `stats`, se informado, acumula textos, tokens, padding e segundos.
+    """
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    encode_kwargs.setdefault("show_progress_bar", False)
+    start = time.perf_counter()
+    lengths = token_lengths(model, texts)
+    output = None
+
+    for batch in plan_batches(lengths, token_budget, max_batch):
+        vectors = np.asarray(model.encode([texts[i] for i in batch], batch_size=len(batch), **encode_kwargs),
+                             dtype=np.float32)
+        if output is None:
+            output = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        output[batch] = vectors
+
+        if stats is not None:
+            stats["batches"] = stats.get("batches", 0) + 1
+            stats["tokens"] = stats.get("tokens", 0) + sum(lengths[i] for i in batch)
+            stats["padded_tokens"] = stats.get("padded_tokens", 0) + len(batch) * lengths[batch[0]]
+
+    if stats is not None:
+        stats["texts"] = stats.get("texts", 0) + len(texts)
+        stats["seconds"] = stats.get("seconds", 0.0) + time.perf_counter() - start
+    return output
+
+
+def print_encode_stats(stats):
+    """Resumo do encoder: textos/s e fração de tokens gastos com padding"""
+    if not stats.get("texts"):
+        return
+    rate = stats["texts"] / stats["seconds"] if stats["seconds"] else 0.0
+    padding = 1 - stats["tokens"] / stats["padded_tokens"] if stats["padded_tokens"] else 0.0
+    print(f"⚡ Encoder: {stats['texts']} textos em {stats['seconds']:.1f}s ({rate:.1f} textos/s), "
+          f"{stats['batches']} batches, padding {padding:.1%}")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Configuração do índice HNSW das coleções ChromaDB
+================================================
+
+Sem configuração explícita o ChromaDB cria a coleção no espaço L2, e a busca
+calculava `similarity = 1 - distance` como se fosse cosseno. Aqui o espaço de
+distância, `M`, `construction_ef` e `search_ef` ficam configuráveis e são
+gravados nos metadados da coleção (o descritor lido pelo ChromaDBSearch), e
+`distance_to_similarity` converte a distância de volta para cosseno conforme
+o espaço, para que os limiares `min_similarity` signifiquem o que dizem.
+
+Os padrões podem ser sobrescritos por variáveis de ambiente:
+CHROMADB_HNSW_SPACE, CHROMADB_HNSW_M, CHROMADB_HNSW_CONSTRUCTION_EF,
+CHROMADB_HNSW_SEARCH_EF. Mudar space/M/construction_ef exige recriar a coleção.
+"""
+
+import os
+from typing import Dict, Optional
+
+SPACES = ("cosine", "ip", "l2")
+
+# Espaço assumido para coleções antigas, criadas sem metadados HNSW
+LEGACY_SPACE = "l2"
+
+HNSW_DEFAULTS = {
+    "space": os.environ.get("CHROMADB_HNSW_SPACE", "cosine"),
+    "M": int(os.environ.get("CHROMADB_HNSW_M", 16)),
+    "construction_ef": int(os.environ.get("CHROMADB_HNSW_CONSTRUCTION_EF", 200)),
+    "search_ef": int(os.environ.get("CHROMADB_HNSW_SEARCH_EF", 64)),
+}
+
+
+def build_hnsw_metadata(space: Optional[str] = None, M: Optional[int] = None,
+                        construction_ef: Optional[int] = None, search_ef: Optional[int] = None) -> Dict:
+    """Monta os metadados `hnsw:*` de criação da coleção (valores ausentes usam os padrões)"""
+    space = space or HNSW_DEFAULTS["space"]
+    if space not in SPACES:
+        raise ValueError(f"Espaço de distância inválido: {space} (opções: {', '.join(SPACES)})")
+
+    return {
+        "hnsw:space": space,
+        "hnsw:M": M or HNSW_DEFAULTS["M"],
+        "hnsw:construction_ef": construction_ef or HNSW_DEFAULTS["construction_ef"],
+        "hnsw:search_ef": search_ef or HNSW_DEFAULTS["search_ef"],
+    }
+
+
+def describe_hnsw(metadata: Optional[Dict]) -> Dict:
+    """Lê a configuração HNSW gravada nos metadados de uma coleção"""
+    metadata = metadata or {}
+    return {
+        "space": metadata.get("hnsw:space", LEGACY_SPACE),
+        "M": metadata.get("hnsw:M"),
+        "construction_ef": metadata.get("hnsw:construction_ef"),
+        "search_ef": metadata.get("hnsw:search_ef"),
+    }
+
+
+def get_collection_space(collection) -> str:
+    """Espaço de distância de uma coleção (L2 para coleções antigas sem metadados)"""
+    return describe_hnsw(getattr(collection, "metadata", None))["space"]
+
+
+def distance_to_similarity(distance: float, space: str) -> float:
+    """
+    Converte a distância do ChromaDB em similaridade de cosseno (embeddings normalizados).
+
+    - cosine: d = 1 - cos
+    - ip:     d = 1 - <a, b>  (igual ao cosseno com vetores normalizados)
+    - l2:     d = ||a - b||² = 2 - 2·cos
+    """
+    if space == "l2":
+        return 1 - distance / 2
+    return 1 - distance
+
+
+def similarity_to_distance(similarity: float, space: str) -> float:
+    """Inverso de distance_to_similarity: distância no espaço da coleção a partir do cosseno"""
+    if space == "l2":
+        return 2 - 2 * similarity
+    return 1 - similarity
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Varredura de parâmetros HNSW: recall@k × latência no corpus real
+===============================================================
+
+Copia os embeddings da coleção existente, calcula o top-k EXATO (força bruta
+em numpy, similaridade de cosseno) para um conjunto de consultas e, para cada
+combinação de space/M/construction_ef/search_ef, monta uma coleção temporária
+e mede recall@k contra o exato e latência p50/p95 por consulta.
+
+Uso:
+    python scripts/hnsw_sweep.py
+    python scripts/hnsw_sweep.py --k 10 --m 8 16 32 --search-ef 10 32 64 128
+    python scripts/hnsw_sweep.py --queries-file perguntas.txt --output data/hnsw_sweep.json
+
+O ponto escolhido é aplicado com:
+    python scripts/migrate_to_chromadb.py --space cosine --hnsw-m 16 --search-ef 64
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import chromadb
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from collection_versions import open_live_collection
+from hnsw_config import SPACES, build_hnsw_metadata
+from model_prefixes import apply_query_prefix
+
+# Perguntas típicas dos usuários (mesmas categorias do test_chromadb.py)
+DEFAULT_QUERIES = [
+    "como trocar tinta da impressora",
+    "impressora não liga",
+    "papel emperrado",
+    "configurar wifi",
+    "qualidade de impressão ruim",
+    "como limpar o cabeçote de impressão",
+    "luz de erro piscando",
+    "como digitalizar um documento",
+    "imprimir frente e verso",
+    "alinhamento do cabeçote",
+    "a impressora não puxa o papel",
+    "recarregar tanque de tinta preta",
+    "instalar driver no computador",
+    "imprimir pelo celular",
+    "manchas na impressão",
+]
+
+
+def load_corpus(db_path, collection_name):
+    """Carrega ids, embeddings e metadados da coleção existente"""
+    client = chromadb.PersistentClient(path=db_path)
+    collection = open_live_collection(client, db_path, collection_name)
+    data = collection.get(include=['embeddings', 'metadatas'])
+    embeddings = np.asarray(data['embeddings'], dtype=np.float32)
+    return data['ids'], embeddings, data['metadatas']
+
+
+def load_queries(queries_file):
+    """Lê consultas de um arquivo (uma por linha) ou usa as padrão"""
+    if not queries_file:
+        return DEFAULT_QUERIES
+    with open(queries_file, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def exact_top_k(corpus, queries, k):
+    """Top-k exato por similaridade de cosseno (força bruta, vetorizado)"""
+    corpus_norm = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    scores = queries @ corpus_norm.T
+    top = np.argpartition(-scores, kth=min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def run_config(ids, embeddings, metadatas, query_vectors, truth, k, hnsw, batch_size=2000):
+    """Monta uma coleção temporária com a configuração e mede recall e latência"""
+    with tempfile.TemporaryDirectory() as tmp:
+        client = chromadb.PersistentClient(path=tmp)
+        collection = client.create_collection(name="hnsw_sweep", metadata=build_hnsw_metadata(**hnsw))
+
+        build_start = time.perf_counter()
+        for i in range(0, len(ids), batch_size):
+            collection.add(
+                ids=ids[i:i + batch_size],
+                embeddings=embeddings[i:i + batch_size].tolist(),
+                metadatas=metadatas[i:i + batch_size]
+            )
+        build_seconds = time.perf_counter() - build_start
+
+        id_to_index = {doc_id: i for i, doc_id in enumerate(ids)}
+        latencies = []
+        recalls = []
+        for query_vector, expected in zip(query_vectors, truth):
+            start = time.perf_counter()
+            result = collection.query(query_embeddings=[query_vector.tolist()], n_results=k, include=[])
+            latencies.append((time.perf_counter() - start) * 1000)
+            found = {id_to_index[doc_id] for doc_id in result['ids'][0]}
+            recalls.append(len(found & expected) / len(expected))
+
+    return {
+        **hnsw,
+        "recall_at_k": float(np.mean(recalls)),
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+        "build_seconds": build_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Varredura recall@k × latência dos parâmetros HNSW no corpus real",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--db", default="./chromadb_storage", help="Diretório do ChromaDB")
+    parser.add_argument("--collection", default="epson_manuals", help="Nome da coleção")
+    parser.add_argument("--model", default="intfloat/multilingual-e5-base", help="Modelo de embeddings das consultas")
+    parser.add_argument("--queries-file", help="Arquivo com uma consulta por linha")
+    parser.add_argument("--k", type=int, default=10, help="k do recall@k (padrão: 10)")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetições das consultas para estabilizar a latência")
+    parser.add_argument("--space", nargs="+", choices=SPACES, default=["cosine"], help="Espaços de distância")
+    parser.add_argument("--m", nargs="+", type=int, default=[8, 16, 32], help="Valores de M")
+    parser.add_argument("--construction-ef", nargs="+", type=int, default=[100, 200], help="Valores de construction_ef")
+    parser.add_argument("--search-ef", nargs="+", type=int, default=[10, 32, 64, 128], help="Valores de search_ef")
+    parser.add_argument("--output", help="Salva os resultados em JSON")
+    args = parser.parse_args()
+
+    print("📐 VARREDURA HNSW: recall@k × latência")
+    print("=" * 60)
+
+    ids, embeddings, metadatas = load_corpus(args.db, args.collection)
+    if not ids:
+        print("❌ Coleção vazia - execute a migração primeiro")
+        sys.exit(1)
+    print(f"📚 Corpus: {len(ids)} vetores de dimensão {embeddings.shape[1]}")
+
+    queries = load_queries(args.queries_file)
+    print(f"🤖 Codificando {len(queries)} consultas com {args.model}...")
+    model = SentenceTransformer(args.model)
+    model_type = metadatas[0].get('model_type', 'standard') if metadatas and metadatas[0] else 'standard'
+    query_vectors = np.asarray(
+        model.encode([apply_query_prefix(q, model_type) for q in queries], normalize_embeddings=True),
+        dtype=np.float32
+    )
+
+    k = min(args.k, len(ids))
+    truth = exact_top_k(embeddings, query_vectors, k)
+
+    # Repete as consultas para ter amostras de latência suficientes
+    query_vectors = np.tile(query_vectors, (args.repeat, 1))
+    truth = truth * args.repeat
+
+    results = []
+    grid = list(itertools.product(args.space, args.m, args.construction_ef, args.search_ef))
+    print(f"🔁 {len(grid)} configurações\n")
+    print(f"{'space':<8}{'M':>4}{'c_ef':>6}{'s_ef':>6}{'recall@' + str(k):>12}{'p50 ms':>9}{'p95 ms':>9}{'build s':>9}")
+    print("-" * 63)
+
+    for space, m, construction_ef, search_ef in grid:
+        hnsw = {"space": space, "M": m, "construction_ef": construction_ef, "search_ef": search_ef}
+        row = run_config(ids, embeddings, metadatas, query_vectors, truth, k, hnsw)
+        results.append(row)
+        print(f"{space:<8}{m:>4}{construction_ef:>6}{search_ef:>6}{row['recall_at_k']:>12.3f}"
+              f"{row['latency_p50_ms']:>9.2f}{row['latency_p95_ms']:>9.2f}{row['build_seconds']:>9.1f}")
+
+    if args.output:
+        report = {
+            "date": datetime.now().isoformat(),
+            "collection": args.collection,
+            "corpus_size": len(ids),
+            "queries": len(queries),
+            "k": k,
+            "results": results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n📋 Resultados salvos em: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
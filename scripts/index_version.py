@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Versão do índice com notificação por mudança de arquivo
+=======================================================
+
+O chatbot descobria atualizações da base relendo `data/webhook_activity.json`
+e `chromadb_storage/migration_log.json` a cada 5 perguntas (CLI) ou a cada 10
+(Streamlit) e comparando timestamps: a base podia ficar defasada enquanto
+ninguém perguntava nada, e cada verificação custava leitura e parse de JSON.
+
+Todo caminho que altera a base (migrações ao publicar uma versão, sincronização
+incremental, limpeza de modelos) chama `bump_index_version`, que grava um
+contador monotônico em `<db_path>/index_version.json`:
+
+    {"version": 42, "updated_at": "...", "reason": "sync", "details": {...}}
+
+- Incremento sob trava de arquivo (escritores concorrentes não repetem número)
+- Gravação atômica (arquivo temporário + os.replace): leitores nunca veem o
+  arquivo pela metade
+
+`IndexVersionWatcher` observa o arquivo em uma thread: um `os.stat` por
+intervalo (sem ler JSON) e, quando a assinatura muda, lê a versão e chama o
+callback se ela aumentou. O ChromaDBSearch usa o observador para reabrir a
+coleção e limpar catálogos em segundo plano (ver `ChromaDBSearch.add_index_listener`).
+
+Uso:
+    bump_index_version("./chromadb_storage", "sync", {"sections_added": 12})
+    read_index_version("./chromadb_storage")   # {'version': 42, ...}
+    python scripts/index_version.py --watch     # mostra as mudanças em tempo real
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: só a trava entre threads
+    fcntl = None
+
+INDEX_VERSION_FILENAME = "index_version.json"
+INDEX_WATCH = os.environ.get("INDEX_WATCH", "on").lower() in ("on", "1", "true")
+INDEX_WATCH_INTERVAL = float(os.environ.get("INDEX_WATCH_INTERVAL", 1.0))
+
+_thread_lock = threading.Lock()
+
+
+def index_version_path(db_path) -> str:
+    return os.path.join(str(db_path), INDEX_VERSION_FILENAME)
+
+
+def read_index_version(db_path) -> Dict:
+    """Conteúdo do arquivo de versão ({'version': 0} se a base nunca foi versionada)"""
+    try:
+        with open(index_version_path(db_path), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {'version': 0}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'version': 0}
+
+
+def file_signature(path) -> Optional[Tuple[int, int, int]]:
+    """(inode, mtime_ns, tamanho) do arquivo - muda a cada os.replace; None se não existe"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+@contextmanager
+def _locked(db_path):
+    """Trava entre threads e processos para o incremento"""
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(str(db_path), ".index_version.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def bump_index_version(db_path, reason: str, details: Optional[Dict] = None) -> int:
+    """Incrementa a versão do índice e grava atomicamente; retorna a nova versão"""
+    os.makedirs(str(db_path), exist_ok=True)
+    with _locked(db_path):
+        version = int(read_index_version(db_path).get('version', 0)) + 1
+        entry = {
+            'version': version,
+            'updated_at': datetime.now().isoformat(),
+            'reason': reason,
+            'details': details or {},
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=str(db_path), prefix=".index_version.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, indent=2, ensure_ascii=False, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, index_version_path(db_path))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    print(f"🔢 Versão do índice: {version} ({reason})")
+    return version
+
+
+class IndexVersionWatcher:
+    """Observa o arquivo de versão em uma thread e chama `on_change(entry)` quando a versão aumenta"""
+
+    def __init__(self, db_path, on_change: Callable[[Dict], None], interval: float = INDEX_WATCH_INTERVAL):
+        self.path = index_version_path(db_path)
+        self.db_path = db_path
+        self.on_change = on_change
+        self.interval = interval
+        self.version = int(read_index_version(db_path).get('version', 0))
+        self._signature = file_signature(self.path)
+        self._stop = threading.Event()
+        self._thread = None
+        self._check_lock = threading.Lock()
+
+    def start(self):
+        """Inicia a thread de observação (idempotente)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="index-version-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self) -> bool:
+        """Um stat; lê o arquivo e notifica só se ele mudou e a versão aumentou"""
+        with self._check_lock:
+            signature = file_signature(self.path)
+            if signature == self._signature:
+                return False
+            self._signature = signature
+            entry = read_index_version(self.db_path)
+            version = int(entry.get('version', 0))
+            if version <= self.version:
+                return False
+            self.version = version
+
+        try:
+            self.on_change(entry)
+        except Exception as e:
+            print(f"⚠️  Erro ao aplicar a versão {version} do índice: {e}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Versão do índice ChromaDB (notificação de atualizações)")
+    parser.add_argument("--db", default="./chromadb_storage", help="Diretório do ChromaDB")
+    parser.add_argument("--bump", metavar="MOTIVO", help="Incrementa a versão (ex.: após alteração manual)")
+    parser.add_argument("--watch", action="store_true", help="Mostra as mudanças de versão até Ctrl+C")
+    args = parser.parse_args()
+
+    if args.bump:
+        bump_index_version(args.db, args.bump)
+    print(json.dumps(read_index_version(args.db), indent=2, ensure_ascii=False))
+
+    if args.watch:
+        watcher = IndexVersionWatcher(args.db, lambda entry: print(
+            f"🔔 Versão {entry['version']} ({entry.get('reason')}) em {entry.get('updated_at')}"))
+        print(f"👀 Observando {watcher.path} (Ctrl+C para sair)")
+        watcher.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            watcher.stop()
+
+
+if __name__ == "__main__":
+    main()
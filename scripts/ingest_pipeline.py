@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Pipeline de ingestão em estágios concorrentes
+=============================================
+
+A sincronização processava cada modelo de ponta a ponta (download → extração →
+embeddings → inserção) antes de começar o próximo, deixando rede, CPU do parser,
+encoder e escrita do ChromaDB ociosos na maior parte do tempo. Aqui cada etapa
+roda em paralelo com as outras, ligadas por filas limitadas:
+
+    download (threads) → extração (pool de processos) → embeddings → inserção
+       └── q_extract ──────────┘    └── q_embed ───────────┘  └── q_insert ──┘
+
+- Download: até `downloader.workers` transferências simultâneas, streaming para disco
+- Extração: PDFs inteiros em um pool de processos (`_process_pdf_job`)
+- Embeddings: um único encoder já carregado, batches grandes misturando PDFs;
+  chunks inalterados (ID já existente) não passam pelo encoder
+- Inserção: um único escritor (upsert dos novos, update dos inalterados e, ao fim
+  de cada PDF, remoção dos chunks que sumiram)
+
+Chunks compartilhados com outros modelos (chunk_dedup, criados nas reconstruções
+completas) contam como inalterados enquanto o texto existir no PDF; os que
+sumiram só perdem a participação do modelo, sem afetar os outros.
+
+As filas limitadas dão o backpressure: se o encoder atrasa, a extração para de
+receber PDFs e o download espera. O tempo total tende ao do estágio mais lento.
+Cada estágio conta itens, tempo ocupado, tempo esperando entrada (ocioso) e
+tempo bloqueado na fila de saída (backpressure).
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from extract_pdf_complete import _process_pdf_job
+from chunk_dedup import DEDUP_KEY_FIELD, drop_member, record_models, set_members
+from embedding_cache import CACHE_ENABLED, EmbeddingCache
+from migrate_to_chromadb import encode_documents
+
+EXTRACT_WORKERS = int(os.environ.get("SYNC_EXTRACT_WORKERS", os.cpu_count() or 1))
+EMBED_BATCH = int(os.environ.get("SYNC_EMBED_BATCH", 256))
+QUEUE_SIZE = int(os.environ.get("SYNC_QUEUE_SIZE", 4))
+POLL_SECONDS = 0.5
+
+_DONE = object()  # sentinela de fim de fluxo entre estágios
+
+
+class PipelineAborted(Exception):
+    """Outro estágio falhou; o pipeline está sendo encerrado"""
+
+
+@dataclass
+class IngestJob:
+    """Um PDF a sincronizar (ação: add | update | verify)"""
+    model: str
+    pdf_info: Dict
+    action: str
+    stored_hash: str = ''
+    existing: Dict[str, Dict] = field(default_factory=dict)  # id → metadados dos registros do modelo
+    path: Optional[str] = None
+    pdf_hash: str = ''
+    seen_ids: Set[str] = field(default_factory=set)
+    added: int = 0
+    kept: int = 0
+    failed: bool = False
+
+
+@dataclass
+class StageCounter:
+    name: str
+    items: int = 0
+    units: float = 0
+    unit: str = ''
+    busy: float = 0.0
+    starved: float = 0.0
+    blocked: float = 0.0
+
+    def line(self) -> str:
+        rate = f"{self.units / self.busy:.1f} {self.unit}/s" if self.busy and self.unit else "-"
+        return (f"   {self.name:<10} {self.items:>5} itens  {self.units:>8.0f} {self.unit:<8} "
+                f"ocupado {self.busy:6.1f}s ({rate})  ocioso {self.starved:6.1f}s  "
+                f"bloqueado {self.blocked:6.1f}s")
+
+
+class SyncPipeline:
+    """Executa os jobs de sincronização de um DriveChromaSync em estágios sobrepostos"""
+
+    def __init__(self, syncer, temp_dir, extract_workers: int = EXTRACT_WORKERS,
+                 embed_batch: int = EMBED_BATCH, queue_size: int = QUEUE_SIZE):
+        self.syncer = syncer
+        self.temp_dir = Path(temp_dir)
+        self.extract_workers = max(1, extract_workers)
+        self.embed_batch = embed_batch
+
+        self.q_extract = queue.Queue(maxsize=queue_size)
+        self.q_embed = queue.Queue(maxsize=queue_size)
+        self.q_insert = queue.Queue(maxsize=queue_size)
+        self.abort = threading.Event()
+
+        self.counters = {
+            'download': StageCounter('download', unit='MB'),
+            'extract': StageCounter('extração', unit='seções'),
+            'embed': StageCounter('embeddings', unit='chunks'),
+            'insert': StageCounter('inserção', unit='registros'),
+        }
+
+    # ------------------------------------------------------------ filas
+
+    def _put(self, q, item, counter: StageCounter):
+        start = time.perf_counter()
+        while True:
+            if self.abort.is_set():
+                raise PipelineAborted()
+            try:
+                q.put(item, timeout=POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        counter.blocked += time.perf_counter() - start
+
+    def _get(self, q, counter: StageCounter):
+        start = time.perf_counter()
+        while True:
+            if self.abort.is_set():
+                raise PipelineAborted()
+            try:
+                item = q.get(timeout=POLL_SECONDS)
+                break
+            except queue.Empty:
+                continue
+        counter.starved += time.perf_counter() - start
+        return item
+
+    def _run_stage(self, target, *args):
+        """Executa um estágio; uma falha inesperada encerra todos os outros"""
+        try:
+            target(*args)
+        except PipelineAborted:
+            pass
+        except Exception as e:
+            self._error(f"Falha no pipeline ({target.__name__}): {e}")
+            self.abort.set()
+
+    def _error(self, message: str):
+        print(f"Erro: {message}")
+        self.syncer.stats['errors'].append(message)
+
+    # ---------------------------------------------------------- estágios
+
+    def _download_stage(self, jobs: List[IngestJob]):
+        counter = self.counters['download']
+        downloader = self.syncer.downloader
+        filename = self.syncer._local_filename
+
+        def fetch(job):
+            info = job.pdf_info
+            return downloader.download(info['id'], self.temp_dir / filename(info),
+                                       expected_md5=info.get('md5Checksum'),
+                                       expected_size=info.get('size'), name=info['name'])
+
+        with ThreadPoolExecutor(max_workers=downloader.workers) as pool:
+            pending, remaining = {}, list(jobs)
+            while remaining or pending:
+                # Só inicia downloads novos enquanto a extração acompanha (backpressure)
+                while remaining and len(pending) < downloader.workers:
+                    job = remaining.pop(0)
+                    pending[pool.submit(fetch, job)] = job
+                start = time.perf_counter()
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                counter.busy += time.perf_counter() - start
+
+                for future in done:
+                    job = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self._error(f"Erro ao baixar {job.pdf_info['name']}: {e}")
+                        continue
+
+                    counter.items += 1
+                    counter.units += result.size / 1024 / 1024
+                    job.path = result.path
+                    job.pdf_hash = job.pdf_info.get('md5Checksum') or result.md5
+
+                    if job.action == 'verify':
+                        if result.md5 == job.stored_hash:
+                            print(f"{job.model} não modificado")
+                            self.syncer.stats['pdfs_skipped'] += 1
+                            Path(result.path).unlink(missing_ok=True)
+                            continue
+                        print(f"PDF modificado detectado: {job.model} "
+                              f"(hash atual {result.md5[:8]}..., armazenado {job.stored_hash[:8]}...)")
+                        job.action = 'update'
+
+                    self._put(self.q_extract, job, counter)
+        self._put(self.q_extract, _DONE, counter)
+
+    def _extract_stage(self):
+        counter = self.counters['extract']
+        in_flight = {}
+        finished = False
+
+        with ProcessPoolExecutor(max_workers=self.extract_workers) as pool:
+            while not finished or in_flight:
+                # Mantém no máximo 2 PDFs por worker em andamento
+                while not finished and len(in_flight) < 2 * self.extract_workers:
+                    if in_flight:
+                        try:
+                            job = self.q_extract.get_nowait()
+                        except queue.Empty:
+                            break
+                    else:
+                        job = self._get(self.q_extract, counter)
+                    if job is _DONE:
+                        finished = True
+                        break
+                    in_flight[pool.submit(_process_pdf_job, (job.path, job.model, job.pdf_hash))] = job
+
+                if not in_flight:
+                    continue
+                start = time.perf_counter()
+                done, _ = wait(in_flight, timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+                counter.busy += time.perf_counter() - start
+
+                for future in done:
+                    job = in_flight.pop(future)
+                    Path(job.path).unlink(missing_ok=True)
+                    try:
+                        sections = future.result()
+                    except Exception as e:
+                        self._error(f"Erro ao extrair {job.model}: {e}")
+                        sections = []
+                    counter.items += 1
+                    counter.units += len(sections)
+                    self._put(self.q_embed, (job, sections), counter)
+        self._put(self.q_embed, _DONE, counter)
+
+    def _embed_stage(self):
+        counter = self.counters['embed']
+        syncer = self.syncer
+        # Conexão SQLite própria desta thread
+        cache = EmbeddingCache() if CACHE_ENABLED else None
+        entries = []        # (job, id, documento, metadados ou None = sem escrita, precisa_embedding)
+        pending_done = []   # jobs cujas seções já estão todas em `entries` ou emitidas
+        to_encode = 0
+
+        def flush():
+            nonlocal entries, to_encode
+            if entries:
+                start = time.perf_counter()
+                documents = [doc for _, _, doc, _, new in entries if new]
+                embeddings = iter(encode_documents(syncer.embedding_model, documents, syncer.embedding_model_name,
+                                                   syncer.model_type, cache=cache).tolist()) if documents else iter(())
+                batch = [(job, chunk_id, doc, meta, next(embeddings) if new else None)
+                         for job, chunk_id, doc, meta, new in entries]
+                counter.busy += time.perf_counter() - start
+                counter.items += 1
+                counter.units += len(documents)
+                self._put(self.q_insert, ('batch', batch), counter)
+                entries, to_encode = [], 0
+            for job in pending_done:
+                self._put(self.q_insert, ('done', job), counter)
+            pending_done.clear()
+
+        try:
+            while True:
+                item = self._get(self.q_embed, counter)
+                if item is _DONE:
+                    break
+                job, sections = item
+                ids, documents, metadatas = syncer._section_records(sections, job.model, job.pdf_hash)
+                # Chunks compartilhados em que o modelo participa sem ser o dono
+                shared = {m.get(DEDUP_KEY_FIELD): record_id for record_id, m in job.existing.items()
+                          if m.get('printer_model') != job.model and m.get(DEDUP_KEY_FIELD)}
+                for chunk_id, doc, meta in zip(ids, documents, metadatas):
+                    if chunk_id in job.existing:
+                        # Preserva a participação dos outros modelos no update
+                        set_members(meta, record_models(job.existing[chunk_id]))
+                        new = False
+                    elif meta[DEDUP_KEY_FIELD] in shared:
+                        chunk_id, meta, new = shared[meta[DEDUP_KEY_FIELD]], None, False
+                    else:
+                        new = True
+                    job.seen_ids.add(chunk_id)
+                    entries.append((job, chunk_id, doc, meta, new))
+                    to_encode += new
+                    if to_encode >= self.embed_batch or len(entries) >= 4 * self.embed_batch:
+                        flush()
+                pending_done.append(job)
+                if not entries:
+                    flush()
+            flush()
+        finally:
+            if cache:
+                cache.close()
+        self._put(self.q_insert, _DONE, counter)
+
+    def _insert_stage(self):
+        counter = self.counters['insert']
+        collection = self.syncer.collection
+        stats = self.syncer.stats
+
+        while True:
+            item = self._get(self.q_insert, counter)
+            if item is _DONE:
+                break
+            kind, payload = item
+            start = time.perf_counter()
+
+            if kind == 'batch':
+                new = [e for e in payload if e[4] is not None]
+                kept = [e for e in payload if e[4] is None and e[3] is not None]
+                try:
+                    if new:
+                        collection.upsert(ids=[e[1] for e in new], documents=[e[2] for e in new],
+                                          metadatas=[e[3] for e in new], embeddings=[e[4] for e in new])
+                    if kept:
+                        # ID = hash de título + conteúdo (o texto codificado): só pdf_hash, páginas e offsets mudam
+                        collection.update(ids=[e[1] for e in kept], metadatas=[e[3] for e in kept])
+                    for job, *_ , embedding in payload:
+                        if embedding is None:
+                            job.kept += 1
+                        else:
+                            job.added += 1
+                except Exception as e:
+                    for entry in payload:
+                        entry[0].failed = True
+                    self._error(f"Erro ao inserir batch: {e}")
+                counter.units += len(payload)
+            else:
+                self._finish_job(payload, stats)
+                counter.items += 1
+
+            counter.busy += time.perf_counter() - start
+
+    def _finish_job(self, job: IngestJob, stats: Dict):
+        """Fecha um PDF: remove chunks que sumiram e contabiliza"""
+        if job.failed:
+            self._error(f"{job.model}: inserção incompleta - chunks antigos mantidos")
+            return
+        if not job.seen_ids:
+            # Extração falhou: mantém a versão antiga em vez de apagar o modelo
+            print(f"Nenhuma seção extraída de {job.model} - versão anterior mantida")
+            return
+
+        # Chunks compartilhados que sumiram só perdem a participação deste modelo
+        removed_ids = [record_id for record_id in job.existing if record_id not in job.seen_ids]
+        drop_member(self.syncer.collection, {record_id: job.existing[record_id] for record_id in removed_ids},
+                    job.model)
+
+        print(f"{job.model}: +{job.added} novas, ={job.kept} inalteradas, -{len(removed_ids)} removidas")
+        stats['sections_added'] += job.added
+        stats['sections_unchanged'] += job.kept
+        stats['sections_removed'] += len(removed_ids)
+        stats['pdfs_added' if job.action == 'add' else 'pdfs_updated'] += 1
+
+    # -------------------------------------------------------------- run
+
+    def run(self, jobs: List[IngestJob]):
+        """Executa os estágios e espera o último terminar"""
+        if not jobs:
+            return
+        print(f"\nPipeline: {len(jobs)} PDFs | {self.syncer.downloader.workers} downloads, "
+              f"{self.extract_workers} processos de extração, batch de embeddings {self.embed_batch}")
+        start = time.perf_counter()
+
+        threads = [
+            threading.Thread(target=self._run_stage, args=(self._download_stage, jobs), daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._extract_stage,), daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._embed_stage,), daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            self._run_stage(self._insert_stage)
+        except BaseException:
+            # Ctrl+C: libera os estágios bloqueados nas filas
+            self.abort.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+
+        self.report(time.perf_counter() - start)
+
+    def report(self, wall_seconds: float):
+        print(f"\nESTÁGIOS DO PIPELINE (tempo total {wall_seconds:.1f}s)")
+        for counter in self.counters.values():
+            print(counter.line())
+        slowest = max(self.counters.values(), key=lambda c: c.busy)
+        print(f"   Estágio mais lento: {slowest.name} ({slowest.busy:.1f}s ocupado)")
@@ -4,9 +4,11 @@ Migração direta do Google Drive para ChromaDB (sem JSON intermediário)
 
 Fluxo:
  1) Lista PDFs no Drive
- 2) Baixa/atualiza cópias locais em pdfs_downloaded/
- 3) Extrai seções com metadados (printer_model, pdf_hash, etc.)
- 4) Recria a coleção no ChromaDB e insere embeddings
+ 2) Baixa/atualiza cópias locais em pdfs_downloaded/ (downloads paralelos em streaming)
+ 3) Extrai seções com metadados (printer_model, pdf_hash, etc.) em streaming
+ 4) Cria uma nova versão da coleção e insere embeddings batch a batch,
+    conforme as seções são extraídas (memória limitada, sem listas completas)
+ 5) Troca o ponteiro para a nova versão (sem indisponibilidade) e remove as antigas
 
 Uso:
   python3 scripts/migrate_from_drive_to_chromadb.py \
@@ -24,8 +26,9 @@ import argparse
 import os
 import re
 import sys
-import io
 import json
+import itertools
+import time
 from datetime import datetime
 
 # Garante import dos módulos locais do projeto
@@ -35,20 +38,29 @@ sys.path.append(PROJECT_ROOT)
 # Google Drive
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 
 # Extração de seções dos PDFs
-from core.extract_pdf_complete import process_pdf_to_sections
+from core.extract_pdf_complete import iter_pdf_sections, iter_pdfs_sections
+from core.pdf_extractors import DEFAULT_EXTRACTOR, EXTRACTORS, set_default_extractor
+from core.drive_downloader import DriveDownloader, DownloadError, DOWNLOAD_WORKERS, print_download_summary
 
 # Reuso de funções do migrador para ChromaDB
 from scripts.migrate_to_chromadb import (
     RECOMMENDED_MODELS,
     get_model_type,
-    process_items,
+    iter_processed_items,
+    new_process_stats,
+    print_process_stats,
     create_chromadb_collection,
-    insert_embeddings,
+    publish_collection,
+    insert_embeddings_stream,
+    new_deduplicator,
     save_migration_log,
 )
+from scripts.chromadb_sharding import LAYOUTS
+from scripts.hnsw_config import SPACES, HNSW_DEFAULTS
+from scripts.collection_versions import version_label
+from scripts.pca_index import build_pca_index
 
 
 def sanitize_filename(filename: str) -> str:
@@ -71,33 +83,55 @@ def get_drive_service(credentials_file: str):
 def list_pdfs_in_folder(service, folder_id: str):
     results = service.files().list(
         q=f"'{folder_id}' in parents and mimeType='application/pdf' and trashed=false",
-        fields="files(id, name, modifiedTime)",
+        fields="files(id, name, modifiedTime, md5Checksum, size)",
         pageSize=200
     ).execute()
     return results.get('files', [])
 
 
-def download_pdf(service, file_id: str, dest_path: str):
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    request = service.files().get_media(fileId=file_id)
-    with io.FileIO(dest_path, 'wb') as fh:
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
+def download_pdfs(credentials_file: str, pdf_files, pdfs_dir: str, workers: int = DOWNLOAD_WORKERS):
+    """Baixa/atualiza as cópias locais em paralelo (streaming para disco, MD5 verificado)"""
+    downloader = DriveDownloader.from_service_account(credentials_file, workers=workers)
+    start = time.perf_counter()
+    results = []
+    for pdf, result in downloader.download_many(pdf_files, pdfs_dir, filename=lambda f: sanitize_filename(f['name'])):
+        if isinstance(result, DownloadError):
+            print(f"❌ Erro ao baixar {pdf['name']}: {result}")
+            continue
+        print(f"⬇️  {pdf['name']} → {os.path.basename(result.path)} ({result.size / 1024 / 1024:.1f} MB)")
+        results.append(result)
+    print_download_summary(results, time.perf_counter() - start)
+    return results
 
 
-def build_items_from_pdfs(pdfs_dir: str):
-    items = []
-    for name in sorted(os.listdir(pdfs_dir)):
-        if not name.lower().endswith('.pdf'):
-            continue
-        pdf_path = os.path.join(pdfs_dir, name)
-        model = extract_model_from_filename(name)
-        sections = process_pdf_to_sections(pdf_path, printer_model=model)
-        # sections já possuem: id, title, content, type, keywords, printer_model, pdf_hash
-        items.extend(sections)
-    return items
+def _pdf_jobs(pdfs_dir: str):
+    return [
+        (os.path.join(pdfs_dir, name), extract_model_from_filename(name))
+        for name in sorted(os.listdir(pdfs_dir))
+        if name.lower().endswith('.pdf')
+    ]
+
+
+def iter_items_from_pdfs(pdfs_dir: str, workers: int = 1):
+    """Gera as seções de todos os PDFs sem acumulá-las (memória limitada por PDF/chunk)"""
+    jobs = _pdf_jobs(pdfs_dir)
+    if workers > 1 and len(jobs) >= workers:
+        # PDFs inteiros em paralelo, no máximo 2 por worker em andamento
+        for sections in iter_pdfs_sections(jobs, workers=workers):
+            yield from sections
+        return
+
+    # Um PDF por vez: páginas em paralelo e seções entregues conforme são lidas
+    for pdf_path, model in jobs:
+        try:
+            yield from iter_pdf_sections(pdf_path, printer_model=model, workers=workers)
+        except Exception as e:
+            print(f'❌ Erro ao processar {pdf_path}: {e}')
+
+
+def build_items_from_pdfs(pdfs_dir: str, workers: int = 1):
+    # sections já possuem: id, title, content, type, keywords, printer_model, pdf_hash
+    return list(iter_items_from_pdfs(pdfs_dir, workers))
 
 
 def main():
@@ -126,8 +160,33 @@ def main():
                         help='Preset de modelo de embeddings')
     parser.add_argument('--model', help='Modelo customizado (overrides preset)')
     parser.add_argument('--batch', type=int, help='Tamanho do batch para inserção')
+    parser.add_argument('--layout', choices=LAYOUTS, default='single',
+                        help='Layout da coleção: única, um shard por modelo ou por série')
+    parser.add_argument('--space', choices=SPACES, default=HNSW_DEFAULTS['space'],
+                        help='Espaço de distância do índice HNSW')
+    parser.add_argument('--hnsw-m', type=int, default=HNSW_DEFAULTS['M'],
+                        help='Parâmetro M do HNSW')
+    parser.add_argument('--construction-ef', type=int, default=HNSW_DEFAULTS['construction_ef'],
+                        help='ef de construção do HNSW')
+    parser.add_argument('--search-ef', type=int, default=HNSW_DEFAULTS['search_ef'],
+                        help='ef de busca do HNSW')
+    parser.add_argument('--in-place', action='store_true',
+                        help='Recria a coleção ativa no lugar em vez de construir uma nova versão (blue/green)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Processos para extração dos PDFs (padrão: número de CPUs)')
+    parser.add_argument('--extractor', choices=list(EXTRACTORS), default=DEFAULT_EXTRACTOR,
+                        help='Backend de extração de texto dos PDFs (compare com scripts/benchmark_extractors.py)')
+    parser.add_argument('--download-workers', type=int, default=DOWNLOAD_WORKERS,
+                        help='Downloads simultâneos do Drive')
+    parser.add_argument('--embed-workers', type=int, default=1,
+                        help='Processos de embeddings, cada um com o próprio modelo (padrão: 1)')
+    parser.add_argument('--no-dedup', action='store_true',
+                        help='Não unifica chunks idênticos entre manuais (um registro por modelo)')
+    parser.add_argument('--pca-dims', type=int,
+                        help='Constrói o índice PCA reduzido para busca em dois estágios (ex.: 192)')
 
     args = parser.parse_args()
+    set_default_extractor(args.extractor)
 
     print('🚀 MIGRAÇÃO DIRETA: Google Drive → ChromaDB (sem JSON)')
     print('=' * 60)
@@ -141,22 +200,8 @@ def main():
     pdf_files = list_pdfs_in_folder(service, args.folder_id)
     print(f'   • Encontrados {len(pdf_files)} PDFs')
 
-    for pdf in pdf_files:
-        safe_name = sanitize_filename(pdf['name'])
-        dest_path = os.path.join(args.pdfs_dir, safe_name)
-        print(f"⬇️  Baixando/atualizando: {pdf['name']} → {safe_name}")
-        download_pdf(service, pdf['id'], dest_path)
-
-    # 3) Extrai seções a partir dos PDFs locais
-    print('🧩 Extraindo seções dos PDFs...')
-    items = build_items_from_pdfs(args.pdfs_dir)
-    print(f'   • Total de seções extraídas: {len(items)}')
+    download_pdfs(args.credentials, pdf_files, args.pdfs_dir, workers=args.download_workers)
 
-    if not items:
-        print('❌ Nenhuma seção extraída. Abortando migração.')
-        sys.exit(1)
-
-    # 4) Processa items e injeta no ChromaDB
     # Configuração de modelo
     if args.model:
         model_name = args.model
@@ -166,21 +211,55 @@ def main():
         model_name = preset['name']
         batch_size = args.batch or preset['batch_size']
 
-    print('⚙️  Preparando itens para ChromaDB...')
-    processed_items = process_items(items)
-    if not processed_items:
-        print('❌ Nenhum item válido após processamento. Abortando.')
+    # 3) Pipeline em streaming: páginas → linhas → chunks → seções → batches → collection.add
+    print(f'🧩 Extraindo seções dos PDFs em streaming ({args.workers} processos)...')
+    extract_start = time.perf_counter()
+    process_stats = new_process_stats()
+    items_stream = iter_processed_items(iter_items_from_pdfs(args.pdfs_dir, workers=args.workers), process_stats)
+
+    # Só recria a coleção se houver ao menos uma seção válida
+    first_item = next(items_stream, None)
+    if first_item is None:
+        print('❌ Nenhuma seção extraída. Abortando migração.')
         sys.exit(1)
 
-    client, collection = create_chromadb_collection(args.db, args.collection)
-    insert_embeddings(collection, processed_items, model_name, batch_size)
+    # 4) Embeddings e inserção no ChromaDB, batch a batch
+    hnsw = {
+        'space': args.space,
+        'M': args.hnsw_m,
+        'construction_ef': args.construction_ef,
+        'search_ef': args.search_ef,
+    }
+    client, collection = create_chromadb_collection(args.db, args.collection, args.layout, hnsw,
+                                                    versioned=not args.in_place)
+    dedup = None if args.no_dedup else new_deduplicator(args.layout)
+    inserted = insert_embeddings_stream(collection, itertools.chain([first_item], items_stream),
+                                        model_name, batch_size, dedup, workers=args.embed_workers)
+
+    # Índice PCA opcional (antes da troca, para a versão já nascer com ele)
+    pca_collection = build_pca_index(client, args.db, collection, args.pca_dims) if args.pca_dims else None
+
+    # Troca atômica para a nova versão; chatbots em execução mudam na próxima consulta
+    publish_collection(client, args.db, args.collection, collection, args.layout)
+    pipeline_seconds = time.perf_counter() - extract_start
+    print(f'   • Pipeline concluído em {pipeline_seconds:.1f}s')
+    print_process_stats(process_stats)
 
     # 5) Log
     stats = {
-        'total_items': len(items),
-        'migrated_items': len(processed_items),
+        'total_items': process_stats['total'],
+        'migrated_items': inserted,
         'model_used': model_name,
         'batch_size': batch_size,
+        'layout': args.layout,
+        'hnsw': hnsw,
+        'collection_version': version_label(collection.name),
+        'extract_workers': args.workers,
+        'embed_workers': args.embed_workers,
+        'extractor': args.extractor,
+        'dedup': dedup.stats() if dedup else None,
+        'pca_collection': pca_collection,
+        'pipeline_seconds': round(pipeline_seconds, 1),
         'source': 'google_drive_pdfs',
         'migration_type': 'direct_no_json',
         'date': datetime.now().isoformat(),
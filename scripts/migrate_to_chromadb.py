@@ -21,8 +21,22 @@ import os
 import sys
 from datetime import datetime
 import chromadb
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from chromadb_sharding import LAYOUTS, get_shard_key, open_collection, delete_logical_collection
+from chunk_dedup import ChunkDeduplicator
+from hnsw_config import SPACES, HNSW_DEFAULTS, build_hnsw_metadata
+from embedding_cache import get_default_cache, text_hash
+from encode_scheduler import encode_bucketed, print_encode_stats
+from parallel_encoder import ParallelEncoder
+from collection_versions import (
+    gc_old_versions, new_version_name, publish_version, resolve_live_collection, version_label
+)
+from pca_index import build_pca_index
+from model_prefixes import apply_document_prefix, get_model_type
+
 # Configurações de modelos otimizados
 RECOMMENDED_MODELS = {
     "multilingual-e5-small": {
@@ -51,35 +65,6 @@ RECOMMENDED_MODELS = {
     }
 }
 
-def get_model_type(model_name):
-    """Detecta o tipo de modelo baseado no nome para aplicar prefixos corretos"""
-    model_name_lower = model_name.lower()
-    
-    if "e5" in model_name_lower and "multilingual" in model_name_lower:
-        return "e5"
-    elif "bge" in model_name_lower:
-        return "bge" 
-    else:
-        return "standard"
-
-def apply_document_prefix(documents, model_type):
-    """Aplica prefixos apropriados para documentos baseado no tipo de modelo"""
-    if model_type == "e5":
-        return [f"passage: {doc}" for doc in documents]
-    elif model_type == "bge":
-        return [f"passage: {doc}" for doc in documents]  # BGE também usa passage:
-    else:
-        return documents  # Modelos padrão não precisam de prefixo
-
-def apply_query_prefix(query, model_type):
-    """Aplica prefixos apropriados para consultas baseado no tipo de modelo"""
-    if model_type == "e5":
-        return f"query: {query}"
-    elif model_type == "bge":
-        return f"query: {query}"
-    else:
-        return query  # Modelos padrão não precisam de prefixo
-
 def validate_item(item):
     """Valida se o item tem os campos obrigatórios"""
     required_fields = ["id", "printer_model"]
@@ -115,6 +100,9 @@ def prepare_text_content(item):
     else:
         return ""
 
+# Campos de posição emitidos pelo chunker estruturado (core/chunker.py)
+CHUNK_SPAN_FIELDS = ("heading", "page_start", "page_end", "char_start", "char_end")
+
 def prepare_metadata(item):
     """Prepara metadados preservando campos específicos do projeto"""
     metadata = {
@@ -124,6 +112,11 @@ def prepare_metadata(item):
         "original_title": item.get("title", ""),
     }
     
+    # Título, páginas e offsets do chunk estruturado (quando presentes)
+    for field in CHUNK_SPAN_FIELDS:
+        if item.get(field) is not None:
+            metadata[field] = item[field]
+    
     # Adiciona keywords como string (ChromaDB não aceita listas)
     keywords = item.get("keywords", [])
     if keywords:
@@ -166,20 +159,16 @@ def load_knowledge_base(json_path):
     except json.JSONDecodeError as e:
         raise ValueError(f"Erro ao decodificar JSON: {e}")
 
-def process_items(items):
-    """Processa e valida os itens para inserção no ChromaDB"""
-    print("🔍 Processando e validando itens...")
-    
-    processed_items = []
-    stats = {
-        "total": len(items),
-        "valid": 0,
-        "invalid": 0,
-        "printers": set(),
-        "types": set()
-    }
+def iter_processed_items(items, stats=None):
+    """
+    Versão em streaming de process_items: valida e prepara um item por vez.
+    `stats`, se informado, acumula total/valid/invalid/printers/types.
+    """
+    if stats is None:
+        stats = new_process_stats()
     
     for item in items:
+        stats["total"] += 1
         if not validate_item(item):
             stats["invalid"] += 1
             continue
@@ -194,28 +183,48 @@ def process_items(items):
         # Prepara metadados
         metadata = prepare_metadata(item)
         
-        processed_item = {
+        stats["valid"] += 1
+        stats["printers"].add(item["printer_model"])
+        stats["types"].add(item.get("type", "geral"))
+        
+        yield {
             "id": item["id"],
             "text": text_content,
             "metadata": metadata
         }
-        
-        processed_items.append(processed_item)
-        stats["valid"] += 1
-        stats["printers"].add(item["printer_model"])
-        stats["types"].add(item.get("type", "geral"))
-    
+
+def new_process_stats():
+    """Contadores do processamento de itens"""
+    return {"total": 0, "valid": 0, "invalid": 0, "printers": set(), "types": set()}
+
+def print_process_stats(stats):
+    """Imprime o resumo do processamento de itens"""
     print(f"📈 Estatísticas do processamento:")
     print(f"   • Itens válidos: {stats['valid']}/{stats['total']}")
     print(f"   • Itens inválidos: {stats['invalid']}")
     print(f"   • Modelos de impressora: {len(stats['printers'])}")
     print(f"   • Tipos de conteúdo: {sorted(stats['types'])}")
     print(f"   • Impressoras: {sorted(stats['printers'])}")
+
+def process_items(items):
+    """Processa e valida os itens para inserção no ChromaDB"""
+    print("🔍 Processando e validando itens...")
+    
+    stats = new_process_stats()
+    processed_items = list(iter_processed_items(items, stats))
+    print_process_stats(stats)
     
     return processed_items
 
-def create_chromadb_collection(db_path, collection_name):
-    """Cria ou obtém a coleção do ChromaDB"""
+def create_chromadb_collection(db_path, collection_name, layout="single", hnsw=None, versioned=False):
+    """
+    Cria ou obtém a coleção do ChromaDB (única ou shards por modelo/série).
+    `hnsw` pode conter space, M, construction_ef e search_ef (ver hnsw_config).
+    
+    Com `versioned=True` cria uma versão nova (`<coleção>-v<timestamp>`) ao lado
+    da ativa, sem apagar nada; ela só passa a ser usada após `publish_collection`.
+    Sem versionamento, recria a versão ativa no lugar (consultas veem a coleção vazia).
+    """
     print(f"🗄️  Inicializando ChromaDB em {db_path}...")
     
     # Cria o diretório se não existir
@@ -223,66 +232,183 @@ def create_chromadb_collection(db_path, collection_name):
     
     client = chromadb.PersistentClient(path=db_path)
     
-    # Remove coleção existente se houver
-    try:
-        client.delete_collection(name=collection_name)
-        print(f"🗑️  Coleção existente '{collection_name}' removida")
-    except (ValueError, Exception) as e:
-        # Coleção não existia ou outro erro - isso é normal na primeira execução
-        if "does not exist" in str(e) or "not found" in str(e).lower():
-            print(f"💡 Coleção '{collection_name}' não existia (primeira execução)")
+    if versioned:
+        target = new_version_name(collection_name)
+        print(f"🆕 Construindo nova versão: {version_label(target)} (versão ativa segue atendendo)")
+    else:
+        target = resolve_live_collection(db_path, collection_name)
+        
+        # Remove coleção existente (e shards) se houver
+        removed = delete_logical_collection(client, target)
+        if removed:
+            print(f"🗑️  Coleções existentes removidas: {', '.join(removed)}")
         else:
-            print(f"⚠️  Aviso ao remover coleção: {e}")
+            print(f"💡 Coleção '{target}' não existia (primeira execução)")
     
-    # Cria nova coleção
-    collection = client.create_collection(name=collection_name)
-    print(f"✅ Coleção '{collection_name}' criada com sucesso")
+    # Cria nova coleção (no layout com shards, cada shard é criado na primeira inserção)
+    hnsw_metadata = build_hnsw_metadata(**(hnsw or {}))
+    collection = open_collection(client, target, layout=layout, create=True,
+                                 collection_metadata=hnsw_metadata)
+    print(f"✅ Coleção '{target}' criada com sucesso (layout: {layout})")
+    print(f"   HNSW: space={hnsw_metadata['hnsw:space']}, M={hnsw_metadata['hnsw:M']}, "
+          f"construction_ef={hnsw_metadata['hnsw:construction_ef']}, search_ef={hnsw_metadata['hnsw:search_ef']}")
     
     return client, collection
 
-def insert_embeddings(collection, items, model_name, batch_size):
-    """Insere os itens com embeddings na coleção"""
+def publish_collection(client, db_path, collection_name, collection, layout="single"):
+    """Ativa a versão recém-construída (troca atômica do ponteiro) e remove versões antigas"""
+    if collection.name == resolve_live_collection(db_path, collection_name):
+        return  # reconstrução no lugar: nada a trocar
+    publish_version(db_path, collection_name, collection.name, layout)
+    gc_old_versions(client, db_path, collection_name)
+
+def _insert_batch(collection, model, model_type, model_name, batch, encode_stats=None):
+    """Gera embeddings de um batch de itens processados e insere na coleção"""
+    # Prepara dados do batch
+    ids = [item["id"] for item in batch]
+    documents = [item["text"] for item in batch]
+    metadatas = [item["metadata"] for item in batch]
+    
+    # Gera embeddings (cache primeiro; só o texto novo passa pelo modelo)
+    embeddings = encode_documents(model, documents, model_name, model_type, stats=encode_stats).tolist()
+    
+    # Salva metadados do modelo para uso posterior nas consultas
+    for metadata in metadatas:
+        metadata["model_type"] = model_type
+        metadata["model_name"] = model_name
+    
+    # Insere no ChromaDB (documents originais sem prefixo para exibição)
+    collection.add(
+        ids=ids,
+        documents=documents,  # Documentos originais para exibição
+        metadatas=metadatas,
+        embeddings=embeddings
+    )
+
+def _encode(model, texts, stats=None):
+    """Embeddings normalizados: em paralelo (ParallelEncoder) ou por orçamento de tokens"""
+    if isinstance(model, ParallelEncoder):
+        return model.encode(texts, stats=stats, normalize_embeddings=True)
+    return encode_bucketed(model, texts, stats=stats, normalize_embeddings=True)
+
+def encode_documents(model, documents, model_name, model_type, cache=None, stats=None):
+    """
+    Embeddings normalizados dos documentos, consultando o cache de embeddings
+    (modelo, tipo de prefixo, sha256 do texto) antes de chamar `model.encode`.
+    O encoder recebe batches por orçamento de tokens (encode_scheduler).
+    """
+    cache = cache or get_default_cache()
+    if cache is None:
+        return _encode(model, apply_document_prefix(documents, model_type), stats)
+    
+    hashes = [text_hash(doc) for doc in documents]
+    cached = cache.get_many(model_name, model_type, hashes)
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+    
+    if missing:
+        # Aplica prefixos apropriados apenas aos documentos que serão codificados
+        new_embeddings = _encode(model, apply_document_prefix([documents[i] for i in missing], model_type), stats)
+        cache.put_many(model_name, model_type, [hashes[i] for i in missing], new_embeddings)
+        for i, vector in zip(missing, new_embeddings):
+            cached[i] = vector
+    
+    if len(missing) < len(documents):
+        print(f"   💾 Cache de embeddings: {len(documents) - len(missing)}/{len(documents)} reaproveitados")
+    return np.vstack(cached)
+
+def _load_encoder(model_name, workers=1):
+    """
+    Carrega o SentenceTransformer (ou um ParallelEncoder com `workers` processos)
+    e detecta o tipo de prefixo do modelo
+    """
     print(f"🤖 Carregando modelo {model_name}...")
-    model = SentenceTransformer(model_name)
+    model = ParallelEncoder(model_name, workers) if workers > 1 else SentenceTransformer(model_name)
     
     # Detecta tipo de modelo para aplicar prefixos
     model_type = get_model_type(model_name)
     if model_type != "standard":
         print(f"🏷️  Modelo {model_type.upper()} detectado - aplicando prefixos automáticos")
+    return model, model_type
+
+def new_deduplicator(layout="single"):
+    """Deduplicador de chunks no escopo de shard do layout (cópias em shards diferentes não se unem)"""
+    return ChunkDeduplicator(shard_key=lambda printer_model: get_shard_key(printer_model, layout))
+
+def finish_dedup(collection, dedup):
+    """Grava a participação multi-modelo acumulada pelo deduplicador e imprime a taxa"""
+    updated = dedup.apply_updates(collection)
+    if updated:
+        print(f"🔗 {updated} chunks compartilhados atualizados com os modelos participantes")
+    dedup.report()
+
+def insert_embeddings(collection, items, model_name, batch_size, dedup=None, workers=1):
+    """
+    Insere os itens com embeddings na coleção (chunks repetidos uma vez só, se
+    `dedup`; encode dividido entre `workers` processos se > 1)
+    """
+    model, model_type = _load_encoder(model_name, workers)
+    # Cada processo recebe um batch do tamanho do preset
+    batch_size *= workers
     
+    if dedup is not None:
+        items = list(dedup.filter(items))
     print(f"📝 Inserindo {len(items)} itens em batches de {batch_size}...")
+    encode_stats = {}
     
-    for i in range(0, len(items), batch_size):
-        batch = items[i:i+batch_size]
-        
-        # Prepara dados do batch
-        ids = [item["id"] for item in batch]
-        documents = [item["text"] for item in batch]
-        metadatas = [item["metadata"] for item in batch]
-        
-        # Aplica prefixos apropriados para documentos
-        documents_with_prefix = apply_document_prefix(documents, model_type)
-        
-        # Gera embeddings com os documentos prefixados
-        print(f"🔄 Processando batch {i//batch_size + 1}/{(len(items)-1)//batch_size + 1}...")
-        embeddings = model.encode(documents_with_prefix, normalize_embeddings=True, show_progress_bar=False).tolist()
-        
-        # Salva metadados do modelo para uso posterior nas consultas
-        for metadata in metadatas:
-            metadata["model_type"] = model_type
-            metadata["model_name"] = model_name
-        
-        # Insere no ChromaDB (documents originais sem prefixo para exibição)
-        collection.add(
-            ids=ids,
-            documents=documents,  # Documentos originais para exibição
-            metadatas=metadatas,
-            embeddings=embeddings
-        )
+    try:
+        for i in range(0, len(items), batch_size):
+            batch = items[i:i+batch_size]
+            print(f"🔄 Processando batch {i//batch_size + 1}/{(len(items)-1)//batch_size + 1}...")
+            _insert_batch(collection, model, model_type, model_name, batch, encode_stats)
+            print(f"   ✅ Inseridos {min(i+batch_size, len(items))}/{len(items)} itens")
+    finally:
+        if isinstance(model, ParallelEncoder):
+            model.close()
+    
+    print_encode_stats(encode_stats)
+    if dedup is not None:
+        finish_dedup(collection, dedup)
+    print("🎉 Inserção concluída com sucesso!")
+
+def insert_embeddings_stream(collection, items, model_name, batch_size, dedup=None, workers=1):
+    """
+    Insere a partir de um iterável de itens processados, um batch por vez.
+    Só um batch fica em memória; cada batch fica consultável assim que é inserido.
+    Com `dedup`, cópias de um chunk já visto não são inseridas nem codificadas;
+    com `workers` > 1, o encode de cada batch é dividido entre processos.
+    Retorna o número de itens inseridos.
+    """
+    model, model_type = _load_encoder(model_name, workers)
+    batch_size *= workers
+    if dedup is not None:
+        items = dedup.filter(items)
+    print(f"📝 Inserindo em streaming (batches de {batch_size})...")
+    
+    inserted = 0
+    batch = []
+    encode_stats = {}
+    try:
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                _insert_batch(collection, model, model_type, model_name, batch, encode_stats)
+                inserted += len(batch)
+                print(f"   ✅ Inseridos {inserted} itens")
+                batch = []
         
-        print(f"   ✅ Inseridos {min(i+batch_size, len(items))}/{len(items)} itens")
+        if batch:
+            _insert_batch(collection, model, model_type, model_name, batch, encode_stats)
+            inserted += len(batch)
+            print(f"   ✅ Inseridos {inserted} itens")
+    finally:
+        if isinstance(model, ParallelEncoder):
+            model.close()
     
+    print_encode_stats(encode_stats)
+    if dedup is not None:
+        finish_dedup(collection, dedup)
     print("🎉 Inserção concluída com sucesso!")
+    return inserted
 
 def save_migration_log(db_path, collection_name, stats):
     """Salva log da migração"""
@@ -330,6 +456,12 @@ EXEMPLOS DE USO:
   # Modelo customizado
   python scripts/migrate_to_chromadb.py --model intfloat/multilingual-e5-small
 
+  # Índice PCA de 192 dimensões para busca em dois estágios (CHROMADB_TWO_STAGE=on)
+  python scripts/migrate_to_chromadb.py --pca-dims 192
+
+  # Embeddings em 4 processos (reconstrução completa mais rápida em CPUs com muitos núcleos)
+  python scripts/migrate_to_chromadb.py --workers 4
+
 Para ver opções de modelos: python scripts/migrate_to_chromadb.py --show-models
         """
     )
@@ -347,6 +479,25 @@ Para ver opções de modelos: python scripts/migrate_to_chromadb.py --show-model
                        help="Preset de modelo recomendado (padrão: multilingual-e5-base)")
     parser.add_argument("--batch", type=int,
                        help="Tamanho do batch (automático baseado no modelo se não especificado)")
+    parser.add_argument("--layout", choices=LAYOUTS, default="single",
+                       help="Layout da coleção: única, um shard por modelo ou por série (padrão: single)")
+    parser.add_argument("--space", choices=SPACES, default=HNSW_DEFAULTS["space"],
+                       help=f"Espaço de distância do índice HNSW (padrão: {HNSW_DEFAULTS['space']})")
+    parser.add_argument("--hnsw-m", type=int, default=HNSW_DEFAULTS["M"],
+                       help="Parâmetro M do HNSW (vizinhos por nó)")
+    parser.add_argument("--construction-ef", type=int, default=HNSW_DEFAULTS["construction_ef"],
+                       help="ef de construção do HNSW")
+    parser.add_argument("--search-ef", type=int, default=HNSW_DEFAULTS["search_ef"],
+                       help="ef de busca do HNSW (use scripts/hnsw_sweep.py para escolher)")
+    parser.add_argument("--in-place", action="store_true",
+                       help="Recria a coleção ativa no lugar em vez de construir uma nova versão (blue/green)")
+    parser.add_argument("--workers", type=int, default=1,
+                       help="Processos de embeddings (cada um com o próprio modelo; padrão: 1)")
+    parser.add_argument("--no-dedup", action="store_true",
+                       help="Não unifica chunks idênticos entre manuais (um registro por modelo)")
+    parser.add_argument("--pca-dims", type=int,
+                       help="Constrói o índice PCA reduzido para busca em dois estágios (ex.: 192; "
+                            "use scripts/pca_recall_report.py para escolher)")
     parser.add_argument("--show-models", action="store_true",
                        help="Mostra modelos disponíveis e sai")
     
@@ -391,18 +542,38 @@ Para ver opções de modelos: python scripts/migrate_to_chromadb.py --show-model
             return
         
         # 3. Cria coleção ChromaDB
-        client, collection = create_chromadb_collection(args.db, args.collection)
+        hnsw = {
+            "space": args.space,
+            "M": args.hnsw_m,
+            "construction_ef": args.construction_ef,
+            "search_ef": args.search_ef,
+        }
+        client, collection = create_chromadb_collection(args.db, args.collection, args.layout, hnsw,
+                                                        versioned=not args.in_place)
+        
+        # 4. Insere com embeddings (chunks idênticos entre manuais viram um registro compartilhado)
+        dedup = None if args.no_dedup else new_deduplicator(args.layout)
+        insert_embeddings(collection, processed_items, model_name, batch_size, dedup, workers=args.workers)
+        
+        # 5. Índice PCA opcional, construído antes da troca para a versão já nascer com ele
+        pca_collection = build_pca_index(client, args.db, collection, args.pca_dims) if args.pca_dims else None
         
-        # 4. Insere com embeddings
-        insert_embeddings(collection, processed_items, model_name, batch_size)
+        # 6. Ativa a nova versão (consultas trocam de versão entre requisições)
+        publish_collection(client, args.db, args.collection, collection, args.layout)
         
-        # 5. Salva log
+        # 7. Salva log
         stats = {
             "total_items": len(items),
             "migrated_items": len(processed_items),
             "model_used": model_name,
             "model_type": model_type,
             "batch_size": batch_size,
+            "embed_workers": args.workers,
+            "layout": args.layout,
+            "hnsw": hnsw,
+            "collection_version": version_label(collection.name),
+            "dedup": dedup.stats() if dedup else None,
+            "pca_collection": pca_collection,
             "preset_used": args.model_preset if not args.model else None
         }
         save_migration_log(args.db, args.collection, stats)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Diversificação por Maximal Marginal Relevance (MMR)
+==================================================
+
+Os chunks dos manuais são janelas consecutivas de ~600 caracteres, então o
+top-15 da busca semântica costuma trazer vizinhos quase idênticos e o
+orçamento de 5 seções do prompt é gasto com texto repetido.
+
+`mmr_select` re-seleciona os candidatos usando os embeddings já retornados
+pelo ChromaDB (sem novo encode), de forma vetorizada:
+
+    MMR(d) = λ · sim(q, d) - (1 - λ) · max_{s ∈ S} sim(d, s)
+
+`mmr_report` é o gancho de avaliação: conta quantas quase-duplicatas saíram
+do orçamento do prompt e estima os tokens economizados por resposta.
+
+Uso (avaliação):
+    python scripts/mmr.py
+    python scripts/mmr.py --printer-model impressoraL3150 --lambda 0.6
+
+O chatbot só aplica o MMR com CHATBOT_MMR_LAMBDA definido (ex.: 0.7), a ser
+ligado quando esta avaliação mostrar ganho na base real.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# Similaridade a partir da qual dois chunks são considerados quase-duplicatas
+DUPLICATE_THRESHOLD = 0.95
+
+# Aproximação de tokens do Gemini para texto em português
+CHARS_PER_TOKEN = 4
+
+# Orçamento de seções e caracteres por seção usados em call_api_detailed
+PROMPT_SECTIONS = 5
+PROMPT_CHARS_PER_SECTION = 1000
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def mmr_select(query_vector, candidate_vectors, k, lambda_mult=0.7, relevance=None):
+    """
+    Seleciona k índices de candidatos maximizando relevância e diversidade.
+
+    Args:
+        query_vector: embedding da consulta (d,)
+        candidate_vectors: embeddings dos candidatos (n, d)
+        k: número de candidatos a selecionar
+        lambda_mult: 1.0 = só relevância, 0.0 = só diversidade
+        relevance: similaridades consulta-candidato já calculadas (opcional)
+
+    Returns:
+        Lista de índices na ordem de seleção
+    """
+    candidates = _normalize(candidate_vectors)
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+
+    if relevance is None:
+        relevance = candidates @ _normalize(query_vector)
+    relevance = np.asarray(relevance, dtype=np.float32)
+
+    # Matriz de similaridade entre candidatos, calculada uma vez
+    pairwise = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    # Maior similaridade de cada candidato com o conjunto já selecionado
+    max_redundancy = pairwise[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_redundancy
+        scores[~available] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected.append(chosen)
+        available[chosen] = False
+        np.maximum(max_redundancy, pairwise[chosen], out=max_redundancy)
+
+    return selected
+
+
+def count_near_duplicates(vectors, threshold=DUPLICATE_THRESHOLD):
+    """Quantos itens são quase-duplicatas de algum item anterior na lista"""
+    if len(vectors) < 2:
+        return 0
+    normalized = _normalize(vectors)
+    pairwise = np.triu(normalized @ normalized.T, k=1)
+    return int((pairwise >= threshold).any(axis=0).sum())
+
+
+def estimate_prompt_tokens(sections, budget=PROMPT_SECTIONS):
+    """Estimativa dos tokens de contexto que call_api_detailed enviaria"""
+    chars = sum(len(section['content'][:PROMPT_CHARS_PER_SECTION]) for section in sections[:budget])
+    return chars // CHARS_PER_TOKEN
+
+
+def mmr_report(baseline, diversified, budget=PROMPT_SECTIONS, threshold=DUPLICATE_THRESHOLD):
+    """
+    Compara o orçamento do prompt com e sem MMR.
+
+    Args:
+        baseline / diversified: listas de (seção, vetor) na ordem enviada ao prompt
+
+    Returns:
+        Dict com duplicatas no orçamento antes/depois e tokens redundantes evitados
+    """
+    def redundant_tokens(items):
+        # Tokens de seções que repetem uma seção anterior do mesmo orçamento
+        vectors = _normalize([vector for _, vector in items[:budget]]) if items else np.zeros((0, 0))
+        tokens = 0
+        for i in range(1, len(vectors)):
+            if float((vectors[:i] @ vectors[i]).max()) >= threshold:
+                tokens += estimate_prompt_tokens([items[i][0]], budget=1)
+        return tokens
+
+    dup_before = count_near_duplicates([v for _, v in baseline[:budget]], threshold)
+    dup_after = count_near_duplicates([v for _, v in diversified[:budget]], threshold)
+    redundant_before = redundant_tokens(baseline)
+    redundant_after = redundant_tokens(diversified)
+
+    return {
+        'duplicates_before': dup_before,
+        'duplicates_after': dup_after,
+        'duplicates_removed': dup_before - dup_after,
+        'prompt_tokens_before': estimate_prompt_tokens([s for s, _ in baseline], budget),
+        'prompt_tokens_after': estimate_prompt_tokens([s for s, _ in diversified], budget),
+        'redundant_tokens_before': redundant_before,
+        'redundant_tokens_after': redundant_after,
+        'tokens_saved': redundant_before - redundant_after,
+    }
+
+
+def main():
+    """Avalia o MMR nas consultas de teste usando a coleção real"""
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from chromadb_integration_example import ChromaDBSearch
+    from hnsw_sweep import DEFAULT_QUERIES
+
+    parser = argparse.ArgumentParser(description="Avaliação do estágio MMR (duplicatas e tokens de prompt)")
+    parser.add_argument("--printer-model", help="Filtra por modelo de impressora")
+    parser.add_argument("--lambda", dest="lambda_mult", type=float, default=0.7, help="λ do MMR (padrão: 0.7)")
+    parser.add_argument("--candidates", type=int, default=15, help="Candidatos buscados (padrão: 15)")
+    args = parser.parse_args()
+
+    search = ChromaDBSearch()
+    totals = {}
+
+    print(f"\n🧪 AVALIAÇÃO MMR (λ={args.lambda_mult}, {args.candidates} candidatos, orçamento {PROMPT_SECTIONS})")
+    print("=" * 60)
+
+    for query in DEFAULT_QUERIES:
+        report = search.evaluate_mmr(query, printer_model=args.printer_model,
+                                     n_results=args.candidates, mmr_lambda=args.lambda_mult)
+        for key, value in report.items():
+            totals[key] = totals.get(key, 0) + value
+        print(f"🔍 {query[:40]:<40} duplicatas {report['duplicates_before']}→{report['duplicates_after']}"
+              f" | tokens redundantes {report['redundant_tokens_before']}→{report['redundant_tokens_after']}")
+
+    n = len(DEFAULT_QUERIES)
+    print("-" * 60)
+    print(f"📊 Média por resposta: {totals.get('duplicates_removed', 0) / n:.2f} duplicatas removidas, "
+          f"{totals.get('tokens_saved', 0) / n:.0f} tokens de prompt economizados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Prefixos de consulta/documento por família de modelo de embeddings
+==================================================================
+
+Módulo leve (sem torch nem sentence_transformers): usado pelo caminho de
+consulta (ONNX, resolvedor de impressoras) sem carregar o stack de ingestão.
+migrate_to_chromadb importa daqui o detector de modelo e o prefixo de documentos.
+"""
+
+
+def get_model_type(model_name):
+    """Detecta o tipo de modelo baseado no nome para aplicar prefixos corretos"""
+    model_name_lower = model_name.lower()
+
+    if "e5" in model_name_lower and "multilingual" in model_name_lower:
+        return "e5"
+    elif "bge" in model_name_lower:
+        return "bge"
+    else:
+        return "standard"
+
+def apply_document_prefix(documents, model_type):
+    """Aplica prefixos apropriados para documentos baseado no tipo de modelo"""
+    if model_type == "e5":
+        return [f"passage: {doc}" for doc in documents]
+    elif model_type == "bge":
+        return [f"passage: {doc}" for doc in documents]  # BGE também usa passage:
+    else:
+        return documents  # Modelos padrão não precisam de prefixo
+
+def apply_query_prefix(query, model_type):
+    """Aplica prefixos apropriados para consultas baseado no tipo de modelo"""
+    if model_type == "e5":
+        return f"query: {query}"
+    elif model_type == "bge":
+        return f"query: {query}"
+    else:
+        return query  # Modelos padrão não precisam de prefixo
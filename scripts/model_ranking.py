@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Ranking de modelos da busca entre manuais
+=========================================
+
+`ChromaDBSearch.cross_model_search` mede a força de cada modelo pela
+similaridade média dos seus top-k e converte as forças em probabilidades com
+um softmax (`rank_models`).
+
+As similaridades do e5 entre manuais diferentes ficam a poucos centésimos umas
+das outras: com temperatura 0.02, uma diferença de 0.01 já dá ≈0.62 ao líder.
+A probabilidade sozinha não separa um empate técnico de um modelo dominante,
+então `confident_model` exige também uma diferença absoluta mínima de força
+entre os dois primeiros. Sem as duas condições, o app mantém o afunilamento.
+
+Ajuste por ambiente (sem calibração em consultas reais até aqui):
+    CROSS_MODEL_CONFIDENCE=0.6   probabilidade mínima do líder
+    CROSS_MODEL_MIN_GAP=0.03     diferença mínima de força (similaridade média) para o 2º
+"""
+
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+CROSS_MODEL_TEMPERATURE = 0.02
+CROSS_MODEL_CONFIDENCE = float(os.environ.get("CROSS_MODEL_CONFIDENCE", 0.6))
+CROSS_MODEL_MIN_GAP = float(os.environ.get("CROSS_MODEL_MIN_GAP", 0.03))
+
+
+def rank_models(model_strength: Dict[str, float],
+                temperature: float = CROSS_MODEL_TEMPERATURE) -> List[Tuple[str, float]]:
+    """Softmax das forças: [(modelo, probabilidade)] ordenado, soma = 1"""
+    if not model_strength:
+        return []
+    best_strength = max(model_strength.values())
+    model_mass = {
+        model: math.exp((strength - best_strength) / temperature)
+        for model, strength in model_strength.items()
+    }
+    total_mass = sum(model_mass.values())
+    return sorted(
+        ((model, mass / total_mass) for model, mass in model_mass.items()),
+        key=lambda x: x[1],
+        reverse=True
+    )
+
+
+def confident_model(cross: Dict, min_probability: float = CROSS_MODEL_CONFIDENCE,
+                    min_gap: float = CROSS_MODEL_MIN_GAP) -> Optional[str]:
+    """
+    Modelo líder da busca entre manuais, ou None se a pergunta deve seguir para
+    o afunilamento (probabilidade baixa ou líder empatado com o segundo).
+    """
+    ranking = cross.get('model_ranking') or []
+    if not ranking:
+        return None
+
+    best_model, probability = ranking[0]
+    if probability < min_probability:
+        return None
+
+    strengths = sorted(cross.get('model_strength', {}).values(), reverse=True)
+    if len(strengths) > 1 and strengths[0] - strengths[1] < min_gap:
+        return None
+    return best_model
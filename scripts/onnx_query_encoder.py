@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Encoder de consultas em ONNX Runtime com quantização int8
+=========================================================
+
+Cada pergunta do chatbot passa pelo encoder (e5-base) em PyTorch fp32 na CPU:
+dezenas de ms por consulta e >1 GB de RSS só para carregar torch + transformers.
+Este módulo exporta o mesmo modelo para ONNX com quantização dinâmica int8 e
+oferece um wrapper com a interface de `SentenceTransformer.encode` usada pelo
+ChromaDBSearch (mesmo pooling, vetores normalizados). Os pesos são os mesmos,
+então a coleção existente continua válida: nada precisa ser re-embedado.
+
+Exportação (uma vez, requer torch, sentence-transformers e onnxruntime):
+    python scripts/onnx_query_encoder.py export
+    python scripts/onnx_query_encoder.py export --model intfloat/multilingual-e5-small --no-quantize
+
+Uso em tempo de consulta (requer só onnxruntime e tokenizers):
+    QUERY_ENCODER=onnx python app_streamlit.py
+    ChromaDBSearch(encoder="onnx")
+
+Paridade com o PyTorch: scripts/test_onnx_encoder.py
+Latência e memória:      scripts/benchmark_query_encoder.py
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent
+ONNX_MODELS_DIR = Path(os.environ.get("ONNX_MODELS_DIR", PROJECT_ROOT / "chromadb_storage" / "onnx_models"))
+QUERY_ENCODER = os.environ.get("QUERY_ENCODER", "torch")  # torch | onnx
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", 0))  # 0 = padrão do ONNX Runtime
+MANIFEST_FILE = "encoder.json"
+
+
+def default_onnx_dir(model_name: str, quantized: bool = True) -> Path:
+    """Diretório padrão do modelo exportado (ex.: chromadb_storage/onnx_models/multilingual-e5-base-int8)"""
+    slug = re.sub(r'[^a-zA-Z0-9._-]', '_', model_name.split('/')[-1])
+    return ONNX_MODELS_DIR / f"{slug}-{'int8' if quantized else 'fp32'}"
+
+
+def _pooling_mode(st_model) -> str:
+    """Pooling do SentenceTransformer ('mean' para e5/MiniLM, 'cls' para bge)"""
+    for module in st_model:
+        if hasattr(module, "get_pooling_mode_str"):
+            return module.get_pooling_mode_str()
+    return "mean"
+
+
+def export_onnx(model_name: str, output_dir: Optional[Path] = None, quantize: bool = True, opset: int = 14) -> Path:
+    """Exporta o transformer do SentenceTransformer para ONNX (e quantiza os pesos em int8)"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    output_dir = Path(output_dir or default_onnx_dir(model_name, quantize))
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"🤖 Carregando {model_name}...")
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    pooling = _pooling_mode(st_model)
+    if pooling not in ("mean", "cls"):
+        raise ValueError(f"Pooling não suportado no ONNX: {pooling}")
+
+    sample = tokenizer(["query: como trocar a tinta"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    fp32_path = output_dir / "model-fp32.onnx"
+    print(f"📦 Exportando para ONNX (opset {opset})...")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(transformer),
+            tuple(sample[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    model_path = output_dir / "model.onnx"
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        print("🗜️  Quantizando pesos (int8 dinâmico)...")
+        quantize_dynamic(str(fp32_path), str(model_path), weight_type=QuantType.QInt8)
+        fp32_path.unlink()
+    else:
+        os.replace(fp32_path, model_path)
+
+    # tokenizer.json é lido em tempo de consulta pela biblioteca `tokenizers` (sem transformers/torch)
+    tokenizer.save_pretrained(str(output_dir))
+    manifest = {
+        "model_name": model_name,
+        "pooling": pooling,
+        "max_seq_length": st_model.max_seq_length,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "input_names": input_names,
+        "quantized": quantize,
+        "opset": opset,
+    }
+    with open(output_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    size_mb = model_path.stat().st_size / 1024 / 1024
+    print(f"✅ Modelo ONNX salvo em {output_dir} ({size_mb:.0f} MB)")
+    return output_dir
+
+
+class OnnxQueryEncoder:
+    """Encoder ONNX com a interface de SentenceTransformer.encode (subconjunto usado nas consultas)"""
+
+    def __init__(self, model_dir, threads: int = ONNX_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = Path(model_dir)
+        with open(self.model_dir / MANIFEST_FILE, encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.model_name = self.manifest["model_name"]
+        self.max_seq_length = self.manifest["max_seq_length"]
+        self.pooling = self.manifest["pooling"]
+
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=self.manifest["pad_token_id"], pad_token=self.manifest["pad_token"])
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(self.model_dir / "model.onnx"), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.manifest["dimension"]
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(list(texts))
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = attention_mask[..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = False,
+               show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """Embeddings de `sentences` (str ou lista), como SentenceTransformer.encode"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        vectors = np.vstack([self._encode_batch(texts[i:i + batch_size])
+                             for i in range(0, len(texts), batch_size)]).astype(np.float32)
+        if normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors[0] if single else vectors
+
+
+def load_query_encoder(model_name: str, backend: Optional[str] = None, onnx_dir=None):
+    """
+    Encoder de consultas do backend pedido (QUERY_ENCODER por padrão).
+    Sem o modelo exportado ou sem onnxruntime, volta para o SentenceTransformer.
+    """
+    backend = (backend or QUERY_ENCODER).lower()
+    if backend == "onnx":
+        model_dir = Path(onnx_dir or default_onnx_dir(model_name))
+        try:
+            encoder = OnnxQueryEncoder(model_dir)
+            if encoder.model_name != model_name:
+                raise ValueError(f"{model_dir} foi exportado de {encoder.model_name}")
+            print(f"⚡ Encoder de consultas ONNX: {model_dir}")
+            return encoder
+        except Exception as e:
+            print(f"⚠️  Encoder ONNX indisponível ({e}) - usando PyTorch")
+            print(f"💡 Exporte com: python scripts/onnx_query_encoder.py export --model {model_name}")
+    elif backend != "torch":
+        raise ValueError(f"Encoder de consultas desconhecido: {backend} (opções: torch, onnx)")
+
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Exporta o encoder de consultas para ONNX (int8)",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="Exporta e quantiza o modelo")
+    export.add_argument("--model", default="intfloat/multilingual-e5-base", help="Modelo SentenceTransformer")
+    export.add_argument("--output", help="Diretório de saída (padrão: chromadb_storage/onnx_models/<modelo>-int8)")
+    export.add_argument("--no-quantize", action="store_true", help="Mantém os pesos em fp32")
+    export.add_argument("--opset", type=int, default=14, help="Versão do opset ONNX")
+    args = parser.parse_args()
+
+    try:
+        export_onnx(args.model, args.output, quantize=not args.no_quantize, opset=args.opset)
+    except Exception as e:
+        print(f"❌ Erro na exportação: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
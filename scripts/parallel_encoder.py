@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Encoder de embeddings em vários processos
+=========================================
+
+Um único SentenceTransformer não ocupa todos os núcleos: o paralelismo interno
+do PyTorch satura em poucas threads por operação. Nas reconstruções completas
+(migrate_to_chromadb, migrate_from_drive_to_chromadb com `--workers`/
+`--embed-workers`) o encode é dividido entre N processos, cada um com o próprio
+modelo carregado e um número fixo de threads (núcleos / N).
+
+Cada chamada a `encode` distribui os textos entre os processos (intercalando
+por comprimento, para que todos recebam o mesmo volume de tokens), cada
+processo codifica sua parte com encode_bucketed e os vetores voltam na ordem
+original. O resultado é idêntico ao do encoder de um processo.
+
+Memória: cada processo carrega uma cópia do modelo (~1,1 GB para e5-base).
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from encode_scheduler import CHARS_PER_TOKEN, TOKEN_BUDGET, encode_bucketed
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int):
+    """Inicializa o processo: fixa as threads antes de importar o PyTorch e carrega o modelo"""
+    global _worker_model
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _worker_dimension() -> int:
+    return _worker_model.get_sentence_embedding_dimension()
+
+
+def _encode_part(texts, token_budget, encode_kwargs):
+    """Codifica uma parte dos textos no processo (batches por orçamento de tokens)"""
+    stats = {}
+    vectors = encode_bucketed(_worker_model, texts, token_budget=token_budget, stats=stats, **encode_kwargs)
+    return vectors, stats
+
+
+class ParallelEncoder:
+    """Pool de processos com um SentenceTransformer por processo"""
+
+    def __init__(self, model_name: str, workers: int, threads_per_worker: Optional[int] = None,
+                 token_budget: int = TOKEN_BUDGET):
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self.token_budget = token_budget
+
+        print(f"🧵 Iniciando {self.workers} processos de embeddings "
+              f"({self.threads_per_worker} threads cada)...")
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),  # sem herdar threads/estado do PyTorch do pai
+            initializer=_init_worker,
+            initargs=(model_name, self.threads_per_worker)
+        )
+        # Espera os modelos carregarem (e falha cedo se o modelo não existir)
+        self.dimension = self._pool.submit(_worker_dimension).result()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, texts: Sequence[str], stats: Optional[Dict] = None, **encode_kwargs) -> np.ndarray:
+        """Embeddings na ordem de `texts`, calculados em paralelo pelos processos"""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        encode_kwargs.setdefault("show_progress_bar", False)
+        start = time.perf_counter()
+
+        # Ordena pelo comprimento estimado e intercala: cada processo recebe curtos e longos
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]) // CHARS_PER_TOKEN, reverse=True)
+        parts = [order[k::self.workers] for k in range(min(self.workers, len(texts)))]
+        futures = [
+            self._pool.submit(_encode_part, [texts[i] for i in part], self.token_budget, encode_kwargs)
+            for part in parts
+        ]
+
+        output = None
+        for part, future in zip(parts, futures):
+            vectors, part_stats = future.result()
+            if output is None:
+                output = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            output[part] = vectors
+            if stats is not None:
+                for key in ("batches", "tokens", "padded_tokens", "texts"):
+                    stats[key] = stats.get(key, 0) + part_stats.get(key, 0)
+
+        if stats is not None:
+            # Tempo de parede (as partes rodam ao mesmo tempo)
+            stats["seconds"] = stats.get("seconds", 0.0) + time.perf_counter() - start
+        return output
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
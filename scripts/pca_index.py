@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Busca em dois estágios: índice PCA reduzido + rescoring com vetores completos
+============================================================================
+
+Os vetores do e5-base têm 768 dimensões e o custo de percorrer o índice HNSW
+cresce com elas. No modo em dois estágios:
+
+1. Uma projeção PCA (128–256 dimensões), ajustada na ingestão sobre os próprios
+   embeddings da coleção, alimenta uma coleção auxiliar `<coleção>.pca<dims>`
+   (mesmos IDs e metadados, sem documentos), percorrida com vetores 3–6x menores
+2. Os `n_results × PCA_CANDIDATES` candidatos do primeiro estágio são
+   reordenados pelo cosseno exato com os vetores completos da coleção principal
+
+O ganho é só de latência do primeiro estágio: a coleção principal (768
+dimensões) continua existindo para o rescoring, então o espaço em disco e a
+memória TOTAIS aumentam com a coleção auxiliar.
+
+A projeção (média + componentes) fica em `<db>/pca/<coleção auxiliar>.npz`; os
+metadados da coleção auxiliar (`pca:dims`, `pca:source`, `pca:explained_variance`)
+são o descritor lido pelo ChromaDBSearch. A coleção auxiliar é removida junto
+com a versão (ver chromadb_sharding.list_companions).
+
+Construção: `migrate_to_chromadb.py --pca-dims 192` (ou migrate_from_drive).
+Sincronizações incrementais e a limpeza de modelos (cleanup_chromadb) reprojetam
+com a projeção existente, mantendo IDs e metadados de participação alinhados.
+Consulta: CHROMADB_TWO_STAGE=on ou ChromaDBSearch(two_stage=True).
+Escolha de dimensões: scripts/pca_recall_report.py.
+"""
+
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from chromadb_sharding import COMPANION_SEPARATOR, _collection_name
+from hnsw_config import build_hnsw_metadata, similarity_to_distance
+
+PCA_DIR = "pca"
+PCA_MARKER = f"{COMPANION_SEPARATOR}pca"
+DEFAULT_DIMS = int(os.environ.get("PCA_DIMS", 192))
+CANDIDATE_FACTOR = int(os.environ.get("PCA_CANDIDATES", 4))
+TWO_STAGE = os.environ.get("CHROMADB_TWO_STAGE", "off").lower() in ("on", "1", "true")
+BATCH_SIZE = 1000
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+class PcaProjection:
+    """Projeção linear (x - média) · componentesᵀ, com saída normalizada"""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, explained_variance: float):
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+        self.explained_variance = float(explained_variance)
+
+    @property
+    def dims(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, embeddings, dims: int) -> "PcaProjection":
+        """Ajusta por SVD sobre os embeddings (normalizados) da coleção"""
+        data = _normalize(np.asarray(embeddings, dtype=np.float32))
+        dims = min(dims, data.shape[0], data.shape[1])
+        mean = data.mean(axis=0)
+        _, singular_values, vt = np.linalg.svd(data - mean, full_matrices=False)
+        variance = singular_values ** 2
+        return cls(mean, vt[:dims], variance[:dims].sum() / variance.sum())
+
+    def project(self, vectors) -> np.ndarray:
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        return _normalize((vectors - self.mean) @ self.components.T)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, mean=self.mean, components=self.components,
+                 explained_variance=np.float32(self.explained_variance))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PcaProjection":
+        data = np.load(path)
+        return cls(data["mean"], data["components"], float(data["explained_variance"]))
+
+
+def pca_collection_name(base_name: str, dims: int) -> str:
+    return f"{base_name}{PCA_MARKER}{dims}"
+
+
+def projection_path(db_path, pca_name: str) -> str:
+    return os.path.join(str(db_path), PCA_DIR, f"{pca_name}.npz")
+
+
+def find_pca_collection(client, base_name: str) -> Optional[str]:
+    """Coleção auxiliar PCA de uma versão (None se não foi construída)"""
+    prefix = f"{base_name}{PCA_MARKER}"
+    names = sorted(name for name in (_collection_name(c) for c in client.list_collections())
+                   if name.startswith(prefix))
+    return names[0] if names else None
+
+
+def remove_projection_files(db_path, collection_names: List[str]):
+    """Apaga as projeções de coleções auxiliares removidas (coleta de versões antigas)"""
+    for name in collection_names:
+        path = projection_path(db_path, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def build_pca_index(client, db_path, collection, dims: int = DEFAULT_DIMS,
+                    projection: Optional[PcaProjection] = None) -> str:
+    """
+    Cria/atualiza a coleção auxiliar com os vetores projetados de `collection`.
+    Sem `projection`, ajusta uma nova PCA sobre os embeddings da coleção.
+    """
+    data = collection.get(include=["embeddings", "metadatas"])
+    if not data["ids"]:
+        raise ValueError("coleção vazia - nada para projetar")
+    embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+
+    if projection is None:
+        print(f"📉 Ajustando PCA {embeddings.shape[1]} → {dims} dimensões em {len(embeddings)} vetores...")
+        projection = PcaProjection.fit(embeddings, dims)
+    pca_name = pca_collection_name(collection.name, projection.dims)
+    projection.save(projection_path(db_path, pca_name))
+
+    metadata = build_hnsw_metadata(space="cosine")
+    metadata.update({
+        "pca:dims": projection.dims,
+        "pca:source": collection.name,
+        "pca:source_dims": int(embeddings.shape[1]),
+        "pca:explained_variance": round(projection.explained_variance, 4),
+    })
+    pca_collection = client.get_or_create_collection(name=pca_name, metadata=metadata)
+
+    projected = projection.project(embeddings)
+    for i in range(0, len(data["ids"]), BATCH_SIZE):
+        pca_collection.upsert(
+            ids=data["ids"][i:i + BATCH_SIZE],
+            embeddings=projected[i:i + BATCH_SIZE].tolist(),
+            metadatas=data["metadatas"][i:i + BATCH_SIZE]
+        )
+
+    # Remove da auxiliar o que saiu da coleção principal
+    stale = list(set(pca_collection.get(include=[])["ids"]) - set(data["ids"]))
+    for i in range(0, len(stale), BATCH_SIZE):
+        pca_collection.delete(ids=stale[i:i + BATCH_SIZE])
+
+    print(f"✅ Índice PCA '{pca_name}': {len(data['ids'])} vetores de {projection.dims} dimensões "
+          f"({projection.explained_variance:.1%} da variância, "
+          f"1º estágio percorre vetores {embeddings.shape[1] / projection.dims:.1f}x menores; "
+          f"coleção completa mantida para o rescoring)")
+    return pca_name
+
+
+def refresh_pca_index(client, db_path, collection) -> Optional[str]:
+    """Reprojeta a coleção com a PCA existente (após sincronizações); None se não houver índice"""
+    pca_name = find_pca_collection(client, collection.name)
+    if pca_name is None:
+        return None
+    projection = PcaProjection.load(projection_path(db_path, pca_name))
+    return build_pca_index(client, db_path, collection, projection=projection)
+
+
+def two_stage_query(collection, pca_collection, projection: PcaProjection, query_embedding,
+                    n_results: int = 10, where: Optional[Dict] = None, include=None, space: str = "cosine",
+                    candidate_factor: int = CANDIDATE_FACTOR) -> Dict:
+    """
+    Consulta em dois estágios com o mesmo formato de `collection.query` (uma
+    consulta). As distâncias estão no espaço da coleção principal.
+    """
+    include = list(include) if include is not None else ["documents", "metadatas", "distances"]
+    empty = {key: [[]] if key in include or key == "ids" else None
+             for key in ("ids", "distances", "documents", "metadatas", "embeddings")}
+    n_candidates = min(n_results * candidate_factor, pca_collection.count())
+    if n_candidates == 0:
+        return empty
+
+    # 1º estágio: vizinhos aproximados no espaço reduzido
+    reduced_query = projection.project([query_embedding])[0]
+    shortlist = pca_collection.query(query_embeddings=[reduced_query.tolist()], n_results=n_candidates,
+                                     where=where, include=[])["ids"][0]
+    if not shortlist:
+        return empty
+
+    # 2º estágio: cosseno exato com os vetores completos
+    fetch = ["embeddings"] + [key for key in ("documents", "metadatas") if key in include]
+    full = collection.get(ids=shortlist, include=fetch)
+    vectors = _normalize(np.asarray(full["embeddings"], dtype=np.float32))
+    similarities = vectors @ _normalize(np.asarray(query_embedding, dtype=np.float32))
+    order = np.argsort(-similarities)[:n_results]
+
+    result = dict(empty)
+    result["ids"] = [[full["ids"][i] for i in order]]
+    if "distances" in include:
+        result["distances"] = [[similarity_to_distance(float(similarities[i]), space) for i in order]]
+    for key in ("documents", "metadatas", "embeddings"):
+        if key in include:
+            result[key] = [[full[key][i] for i in order]]
+    return result
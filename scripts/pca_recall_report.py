@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Relatório de recall da busca em dois estágios (PCA + rescoring)
+===============================================================
+
+Para escolher o `--pca-dims` da migração: copia os embeddings da coleção,
+calcula o top-k EXATO com os vetores completos e, para cada número de
+dimensões, ajusta a PCA e mede (força bruta em numpy, sem HNSW, para isolar o
+efeito da redução):
+
+- recall@k do 1º estágio sozinho (top-k no espaço reduzido)
+- recall@k do dois estágios (top k × candidatos reduzidos, rescoring completo)
+- variância explicada, redução de tamanho dos vetores e tempo de varredura
+
+Uso:
+    python scripts/pca_recall_report.py
+    python scripts/pca_recall_report.py --dims 96 128 192 --k 10 --candidates 4
+    python scripts/pca_recall_report.py --output data/pca_recall.json
+
+O ponto escolhido é aplicado com:
+    python scripts/migrate_to_chromadb.py --pca-dims 192
+    CHROMADB_TWO_STAGE=on PCA_CANDIDATES=4 python app_streamlit.py
+"""
+
+import argparse
+import json
+import sys
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from hnsw_sweep import exact_top_k, load_corpus, load_queries
+from model_prefixes import apply_query_prefix
+from pca_index import CANDIDATE_FACTOR, PcaProjection
+
+
+def top_k_indices(corpus, queries, k):
+    """Índices do top-k por produto interno (vetores já normalizados)"""
+    scores = queries @ corpus.T
+    k = min(k, corpus.shape[0])
+    return np.argpartition(-scores, kth=k - 1, axis=1)[:, :k]
+
+
+def two_stage_indices(corpus, reduced_corpus, queries, reduced_queries, k, candidate_factor):
+    """Top k × candidate_factor no espaço reduzido, reordenado pelos vetores completos"""
+    shortlist = top_k_indices(reduced_corpus, reduced_queries, k * candidate_factor)
+    results = []
+    for query, candidates in zip(queries, shortlist):
+        scores = corpus[candidates] @ query
+        results.append(candidates[np.argsort(-scores)[:k]])
+    return results
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(row) & expected) / len(expected) for row, expected in zip(found, truth)]))
+
+
+def run_dims(corpus, query_vectors, truth, k, dims, candidate_factor):
+    """Ajusta a PCA com `dims` dimensões e mede recall e tempo de varredura"""
+    projection = PcaProjection.fit(corpus, dims)
+    reduced_corpus = projection.project(corpus)
+    reduced_queries = projection.project(query_vectors)
+
+    start = time.perf_counter()
+    first_stage = top_k_indices(reduced_corpus, reduced_queries, k)
+    first_stage_ms = (time.perf_counter() - start) * 1000 / len(query_vectors)
+
+    start = time.perf_counter()
+    two_stage = two_stage_indices(corpus, reduced_corpus, query_vectors, reduced_queries, k, candidate_factor)
+    two_stage_ms = (time.perf_counter() - start) * 1000 / len(query_vectors)
+
+    return {
+        "dims": projection.dims,
+        "explained_variance": projection.explained_variance,
+        "size_ratio": corpus.shape[1] / projection.dims,
+        "first_stage_recall": recall(first_stage, truth),
+        "two_stage_recall": recall(two_stage, truth),
+        "first_stage_ms": first_stage_ms,
+        "two_stage_ms": two_stage_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recall@k da busca em dois estágios (PCA + rescoring) por número de dimensões",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--db", default="./chromadb_storage", help="Diretório do ChromaDB")
+    parser.add_argument("--collection", default="epson_manuals", help="Nome da coleção")
+    parser.add_argument("--model", default="intfloat/multilingual-e5-base", help="Modelo de embeddings das consultas")
+    parser.add_argument("--queries-file", help="Arquivo com uma consulta por linha")
+    parser.add_argument("--k", type=int, default=10, help="k do recall@k (padrão: 10)")
+    parser.add_argument("--dims", nargs="+", type=int, default=[64, 96, 128, 192, 256, 384],
+                        help="Dimensões da PCA avaliadas")
+    parser.add_argument("--candidates", type=int, default=CANDIDATE_FACTOR,
+                        help=f"Candidatos do 1º estágio por resultado (padrão: {CANDIDATE_FACTOR})")
+    parser.add_argument("--output", help="Salva os resultados em JSON")
+    args = parser.parse_args()
+
+    print("📉 RECALL DA BUSCA EM DOIS ESTÁGIOS (PCA + rescoring)")
+    print("=" * 60)
+
+    ids, embeddings, metadatas = load_corpus(args.db, args.collection)
+    if not ids:
+        print("❌ Coleção vazia - execute a migração primeiro")
+        sys.exit(1)
+    corpus = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+    print(f"📚 Corpus: {len(ids)} vetores de dimensão {corpus.shape[1]}")
+
+    queries = load_queries(args.queries_file)
+    print(f"🤖 Codificando {len(queries)} consultas com {args.model}...")
+    model = SentenceTransformer(args.model)
+    model_type = metadatas[0].get('model_type', 'standard') if metadatas and metadatas[0] else 'standard'
+    query_vectors = np.asarray(
+        model.encode([apply_query_prefix(q, model_type) for q in queries], normalize_embeddings=True),
+        dtype=np.float32
+    )
+
+    k = min(args.k, len(ids))
+    truth = exact_top_k(corpus, query_vectors, k)
+
+    print(f"🔁 k={k}, {args.candidates} candidatos por resultado no 1º estágio\n")
+    print(f"{'dims':>6}{'variância':>11}{'menor':>8}{'recall 1º':>11}{'recall 2E':>11}{'ms 1º':>8}{'ms 2E':>8}")
+    print("-" * 63)
+
+    results = []
+    for dims in args.dims:
+        if dims >= corpus.shape[1]:
+            print(f"{dims:>6}  ⏭️  não reduz (vetores de {corpus.shape[1]} dimensões)")
+            continue
+        row = run_dims(corpus, query_vectors, truth, k, dims, args.candidates)
+        results.append(row)
+        print(f"{row['dims']:>6}{row['explained_variance']:>11.1%}{row['size_ratio']:>7.1f}x"
+              f"{row['first_stage_recall']:>11.3f}{row['two_stage_recall']:>11.3f}"
+              f"{row['first_stage_ms']:>8.2f}{row['two_stage_ms']:>8.2f}")
+
+    if args.output:
+        report = {
+            "date": datetime.now().isoformat(),
+            "collection": args.collection,
+            "corpus_size": len(ids),
+            "queries": len(queries),
+            "k": k,
+            "candidate_factor": args.candidates,
+            "results": results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n📋 Resultados salvos em: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ import chromadb
 from collections import defaultdict
 import re
 
+from chunk_dedup import record_models
+
 def get_all_printer_models_from_chromadb(chromadb_path="./chromadb_storage", 
                                          collection_name="epson_manuals"):
     """
@@ -17,8 +19,11 @@ def get_all_printer_models_from_chromadb(chromadb_path="./chromadb_storage",
         dict: Dicionário com modelo como chave e contagem de seções como valor
     """
     try:
+        # Import local: chromadb_sharding depende deste módulo
+        from collection_versions import open_live_collection
+        
         client = chromadb.PersistentClient(path=chromadb_path)
-        collection = client.get_collection(name=collection_name)
+        collection = open_live_collection(client, chromadb_path, collection_name)
         
         # Pega todos os metadados
         all_data = collection.get(include=['metadatas'])
@@ -26,8 +31,8 @@ def get_all_printer_models_from_chromadb(chromadb_path="./chromadb_storage",
         # Agrupa por modelo
         models = defaultdict(int)
         for metadata in all_data['metadatas']:
-            if metadata and 'printer_model' in metadata:
-                model = metadata['printer_model']
+            # Chunks compartilhados contam para cada modelo participante
+            for model in record_models(metadata):
                 models[model] += 1
         
         return dict(models)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Resolução de impressoras por descrição livre
+============================================
+
+Identifica o modelo da impressora a partir de descrições como
+"a que tem fax e imprime A3", sem passar pelo afunilamento interativo.
+
+Cada modelo é representado por um texto montado a partir de `full_name`,
+`description`, `features` e `series` (PRINTER_METADATA + metadados gerados
+em data/printer_metadata_generated.json). Esses textos são embutidos UMA vez
+com o encoder e5 já carregado pelo ChromaDBSearch; cada consulta custa um
+único encode e um produto matriz-vetor.
+
+Os limiares de confiança não foram calibrados em um conjunto rotulado; por
+isso o resolvedor só é consultado quando o texto descreve a impressora pelas
+características (`describes_printer`). Perguntas sobre um problema ("o fax
+não envia") ou sem nenhuma característica não passam pelo resolvedor.
+
+Uso:
+    if describes_printer(texto):
+        printer_id = resolver.resolve(texto)
+"""
+
+import json
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from model_prefixes import apply_document_prefix, apply_query_prefix, get_model_type
+
+PROJECT_ROOT = Path(__file__).parent.parent
+GENERATED_METADATA_PATH = PROJECT_ROOT / "data" / "printer_metadata_generated.json"
+
+# Limiares de confiança (similaridade de cosseno com vetores normalizados).
+# Não calibrados: valem apenas para textos aceitos por `describes_printer`
+MIN_CONFIDENCE = 0.82
+MIN_MARGIN = 0.015
+
+# Descrições em linguagem natural das características, próximas de como o usuário fala
+FEATURE_PHRASES = {
+    'multifuncional': 'multifuncional que imprime, copia e digitaliza (scanner)',
+    'wifi': 'conexão Wi-Fi sem fio',
+    'ecotank': 'sistema EcoTank',
+    'tanque': 'tanques de tinta recarregáveis com garrafas de refil',
+    'duplex': 'impressão frente e verso automática (duplex)',
+    'adf': 'alimentador automático de documentos (ADF) na parte superior',
+    'fax': 'função de fax',
+    'a3': 'imprime em papel grande tamanho A3',
+    'ethernet': 'porta de rede cabeada Ethernet',
+    'usb': 'conexão USB',
+    'mobile': 'impressão pelo celular',
+    'cloud': 'impressão em nuvem',
+}
+
+
+# Características citadas pelo usuário (texto sem acentos, minúsculo)
+FEATURE_CUES_RE = re.compile(
+    r'\b(fax|a3|wi-?fi|sem fio|ecotank|tanques?|refil|garrafas?|multifuncional|copiadora|copia|'
+    r'scanner|digitaliza|frente e verso|duplex|alimentador automatico|adf|ethernet|cabo de rede|'
+    r'colorida|preto e branco|monocromatica|papel grande|(?:pelo|do) celular)\b'
+)
+# Formas de descrever a impressora ("a que tem", "que imprime", "só imprime")
+DESCRIPTION_FRAME_RE = re.compile(
+    r'\b(?:a|aquela|uma|minha impressora|modelo)\s+(?:que|com)\b|'
+    r'\bque\s+(?:tem|possui|imprime|faz|copia|digitaliza|vem)\b|'
+    r'\b(?:tem|possui|vem com|so imprime)\b'
+)
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize('NFD', text.lower())
+    return ''.join(char for char in text if unicodedata.category(char) != 'Mn')
+
+
+def describes_printer(text: str) -> bool:
+    """
+    True se o texto descreve a impressora pelas características: ao menos uma
+    característica citada junto de uma forma de descrição ("a que tem fax"),
+    ou duas características ("colorida, A3").
+    """
+    if not text:
+        return False
+    normalized = _normalize(text)
+    features = set(FEATURE_CUES_RE.findall(normalized))
+    if not features:
+        return False
+    return len(features) >= 2 or bool(DESCRIPTION_FRAME_RE.search(normalized))
+
+
+def load_generated_metadata(path=GENERATED_METADATA_PATH) -> Dict[str, Dict]:
+    """Carrega metadados gerados automaticamente (data/printer_metadata_generated.json)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('metadata', {}) if isinstance(data, dict) else {}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def build_printer_profile(metadata: Dict) -> str:
+    """Monta o texto que representa um modelo no espaço de embeddings"""
+    parts = [metadata.get('full_name', '')]
+
+    if metadata.get('description'):
+        parts.append(metadata['description'])
+
+    if metadata.get('type') == 'colorida':
+        parts.append('impressora colorida')
+    elif metadata.get('type') == 'monocromatica':
+        parts.append('impressora preto e branco')
+
+    features = metadata.get('features', [])
+    phrases = [FEATURE_PHRASES.get(f, f) for f in features]
+    if phrases:
+        parts.append('Recursos: ' + ', '.join(phrases))
+
+    if metadata.get('series') and metadata['series'] != 'Unknown':
+        parts.append(f"Série {metadata['series']}")
+
+    return '. '.join(p for p in parts if p)
+
+
+class PrinterResolver:
+    """Ranqueia modelos de impressora contra uma descrição em texto livre"""
+
+    def __init__(self, encoder, printer_metadata: Dict[str, Dict], model_name: str = "intfloat/multilingual-e5-base",
+                 generated_metadata: Optional[Dict[str, Dict]] = None, available_models: Optional[List[str]] = None):
+        self.encoder = encoder
+        self.model_type = get_model_type(model_name)
+
+        # Metadados estáticos têm prioridade sobre os gerados
+        merged = dict(load_generated_metadata() if generated_metadata is None else generated_metadata)
+        merged.update(printer_metadata)
+        if available_models:
+            merged = {k: v for k, v in merged.items() if k in set(available_models)}
+
+        self.printer_ids = sorted(merged)
+        self.metadata = {k: merged[k] for k in self.printer_ids}
+        self.profiles = [build_printer_profile(self.metadata[k]) for k in self.printer_ids]
+        self.matrix = self._embed_profiles()
+
+    def _embed_profiles(self):
+        """Embute os perfis de todos os modelos uma única vez"""
+        if not self.profiles:
+            return np.zeros((0, 0), dtype=np.float32)
+        docs = apply_document_prefix(self.profiles, self.model_type)
+        embeddings = self.encoder.encode(docs, normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def rank(self, description: str, top_k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Retorna [(printer_id, similaridade)] ordenado da maior para a menor"""
+        if not description or not self.printer_ids:
+            return []
+
+        query = apply_query_prefix(description, self.model_type)
+        query_vec = np.asarray(
+            self.encoder.encode([query], normalize_embeddings=True, show_progress_bar=False)[0],
+            dtype=np.float32
+        )
+
+        scores = self.matrix @ query_vec
+        order = np.argsort(-scores)
+        if top_k:
+            order = order[:top_k]
+        return [(self.printer_ids[i], float(scores[i])) for i in order]
+
+    def resolve(self, description: str, min_confidence: float = MIN_CONFIDENCE,
+                min_margin: float = MIN_MARGIN) -> Optional[str]:
+        """
+        Retorna o printer_id apenas quando a resolução é confiável:
+        melhor score acima de `min_confidence` e distante o bastante do segundo.
+        """
+        ranking = self.rank(description, top_k=2)
+        if not ranking:
+            return None
+
+        best_id, best_score = ranking[0]
+        second_score = ranking[1][1] if len(ranking) > 1 else -1.0
+
+        if best_score >= min_confidence and best_score - second_score >= min_margin:
+            return best_id
+        return None
+
+
+if __name__ == "__main__":
+    """Teste rápido do resolvedor com o encoder padrão"""
+    import sys
+    from sentence_transformers import SentenceTransformer
+
+    model_name = "intfloat/multilingual-e5-base"
+    resolver = PrinterResolver(SentenceTransformer(model_name), {}, model_name=model_name)
+
+    for text in sys.argv[1:] or ["a que tem fax e imprime A3", "só imprime, papel grande"]:
+        print(f"\n🔍 '{text}' (descreve a impressora: {describes_printer(text)})")
+        for printer_id, score in resolver.rank(text, top_k=3):
+            print(f"   {printer_id}: {score:.3f}")
+        print(f"   → Resolução confiável: {resolver.resolve(text)}")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Reordenação por cross-encoder com orçamento de latência e cache
+===============================================================
+
+A busca semântica ordena só pelo cosseno do bi-encoder, então o chatbot busca
+15 resultados e manda 5 seções ao Gemini por segurança. O cross-encoder lê
+consulta e chunk juntos e acerta melhor o top-3, o que permite mandar menos
+seções (menos tokens de prompt e menos latência na resposta).
+
+- Só os `RERANK_TOP_N` primeiros candidatos são pontuados (na CPU)
+- Orçamento estrito de `RERANK_BUDGET_MS`: a pontuação roda em uma thread e,
+  se não terminar a tempo, a ordem do bi-encoder é mantida. O lote atrasado
+  termina em segundo plano e alimenta o cache
+- Scores em cache LRU por (hash da consulta, id do chunk). Os ids são o hash
+  de título + conteúdo, então um chunk alterado nunca reaproveita score
+
+Documentos reordenados ganham `rerank_score`; o score (0-100) do bi-encoder é
+mantido, então `min_similarity` e a exibição continuam iguais.
+
+Uso:
+    CHATBOT_RERANK=on python app_streamlit.py
+    ChromaDBSearch(rerank=True)
+
+Avaliação (ordem do bi-encoder × reordenada, latência e cache):
+    python scripts/reranker.py "como trocar tinta" --printer-model impressoraL3150
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List, Optional, Tuple
+
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK = os.environ.get("CHATBOT_RERANK", "off").lower() in ("on", "1", "true")
+RERANK_TOP_N = int(os.environ.get("RERANK_TOP_N", 10))
+RERANK_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", 150))
+RERANK_CACHE_SIZE = int(os.environ.get("RERANK_CACHE_SIZE", 20000))
+
+# Seções enviadas ao prompt quando a ordem veio do cross-encoder (5 sem reordenação)
+RERANKED_PROMPT_SECTIONS = int(os.environ.get("RERANK_PROMPT_SECTIONS", 3))
+
+# Caracteres do chunk passados ao cross-encoder (o modelo trunca em 512 tokens)
+MAX_CHUNK_CHARS = 1500
+
+
+def query_hash(query: str) -> str:
+    """Hash da consulta normalizada (chave do cache junto com o id do chunk)"""
+    normalized = " ".join(query.lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def is_reranked(sections) -> bool:
+    """True se a ordem das seções veio do cross-encoder"""
+    return bool(sections) and "rerank_score" in sections[0][0]
+
+
+def prompt_section_count(sections, default: int = 5) -> int:
+    """Seções a enviar ao prompt: menos quando o top-3 é do cross-encoder"""
+    return RERANKED_PROMPT_SECTIONS if is_reranked(sections) else default
+
+
+class ScoreCache:
+    """Cache LRU de scores do cross-encoder por (hash da consulta, id do chunk)"""
+
+    def __init__(self, max_entries: int = RERANK_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, qhash: str, chunk_ids: List[str]) -> Dict[str, float]:
+        found = {}
+        with self._lock:
+            for chunk_id in chunk_ids:
+                key = (qhash, chunk_id)
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    found[chunk_id] = self._scores[key]
+            self.hits += len(found)
+            self.misses += len(chunk_ids) - len(found)
+        return found
+
+    def put_many(self, qhash: str, scores: Dict[str, float]):
+        with self._lock:
+            for chunk_id, score in scores.items():
+                self._scores[(qhash, chunk_id)] = score
+                self._scores.move_to_end((qhash, chunk_id))
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def __len__(self):
+        return len(self._scores)
+
+
+class CrossEncoderReranker:
+    """Reordena [(documento, score)] da busca semântica com um cross-encoder na CPU"""
+
+    def __init__(self, model_name: str = RERANK_MODEL, top_n: int = RERANK_TOP_N,
+                 budget_ms: float = RERANK_BUDGET_MS, cache: Optional[ScoreCache] = None):
+        from sentence_transformers import CrossEncoder
+
+        print(f"🎯 Carregando cross-encoder {model_name}...")
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.model_name = model_name
+        self.top_n = top_n
+        self.budget_ms = budget_ms
+        self.cache = cache or ScoreCache()
+        # Uma thread: lotes atrasados não competem com o próximo pela CPU
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        self._pending = None
+        self.stats = {"calls": 0, "reranked": 0, "timeouts": 0, "busy": 0, "last_ms": 0.0}
+
+        # Aquecimento: a primeira inferência é bem mais lenta e estouraria o orçamento
+        self.model.predict([("consulta", "texto")], show_progress_bar=False)
+
+    def _score(self, qhash: str, query: str, pending: List[Tuple[str, str]]) -> Dict[str, float]:
+        """Pontua (id, texto) e grava no cache (roda na thread do reranker)"""
+        scores = self.model.predict([(query, text) for _, text in pending], show_progress_bar=False)
+        scored = {chunk_id: float(score) for (chunk_id, _), score in zip(pending, scores)}
+        self.cache.put_many(qhash, scored)
+        return scored
+
+    def rerank(self, query: str, results: List[Tuple[Dict, int]]) -> List[Tuple[Dict, int]]:
+        """
+        Reordena os `top_n` primeiros resultados pelo cross-encoder.
+        Sem tempo (ou com a thread ocupada), devolve a ordem do bi-encoder.
+        """
+        self.stats["calls"] += 1
+        if len(results) < 2:
+            return results
+
+        start = time.perf_counter()
+        head, tail = results[:self.top_n], results[self.top_n:]
+        qhash = query_hash(query)
+        scores = self.cache.get_many(qhash, [document["id"] for document, _ in head])
+        pending = [(document["id"], f"{document['title']}\n{document['content']}"[:MAX_CHUNK_CHARS])
+                   for document, _ in head if document["id"] not in scores]
+
+        if pending:
+            if self._pending is not None and not self._pending.done():
+                # Lote anterior estourou o orçamento e ainda ocupa a CPU
+                self.stats["busy"] += 1
+                return results
+            self._pending = self._executor.submit(self._score, qhash, query, pending)
+            remaining = max(self.budget_ms / 1000 - (time.perf_counter() - start), 0)
+            try:
+                scores.update(self._pending.result(timeout=remaining))
+            except FutureTimeout:
+                self.stats["timeouts"] += 1
+                self.stats["last_ms"] = (time.perf_counter() - start) * 1000
+                print(f"   ⏱️  Reordenação excedeu {self.budget_ms:.0f} ms - mantendo a ordem do bi-encoder")
+                return results
+
+        order = sorted(range(len(head)), key=lambda i: (-scores[head[i][0]["id"]], i))
+        reranked = [(dict(head[i][0], rerank_score=round(scores[head[i][0]["id"]], 4)), head[i][1])
+                    for i in order]
+        self.stats["reranked"] += 1
+        self.stats["last_ms"] = (time.perf_counter() - start) * 1000
+        return reranked + tail
+
+    def report(self) -> Dict:
+        total = self.cache.hits + self.cache.misses
+        return dict(self.stats, cache_entries=len(self.cache),
+                    cache_hit_rate=round(self.cache.hits / total, 3) if total else 0.0)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a ordem do bi-encoder com a do cross-encoder")
+    parser.add_argument("query", help="Pergunta do usuário")
+    parser.add_argument("--printer-model", help="Filtro por modelo de impressora")
+    parser.add_argument("--model", default=RERANK_MODEL, help="Cross-encoder")
+    parser.add_argument("--top-n", type=int, default=RERANK_TOP_N, help="Candidatos reordenados")
+    parser.add_argument("--budget-ms", type=float, default=RERANK_BUDGET_MS, help="Orçamento de latência")
+    parser.add_argument("--repeats", type=int, default=3, help="Repetições (a partir da 2ª, com cache)")
+    args = parser.parse_args()
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from chromadb_integration_example import ChromaDBSearch
+
+    search = ChromaDBSearch()
+    results = search.semantic_search(args.query, args.printer_model, n_results=15, min_similarity=0.2)
+    if not results:
+        print("❌ Nenhum resultado para reordenar")
+        sys.exit(1)
+
+    reranker = CrossEncoderReranker(args.model, top_n=args.top_n, budget_ms=args.budget_ms)
+    for attempt in range(args.repeats):
+        reranked = reranker.rerank(args.query, results)
+        print(f"   Tentativa {attempt + 1}: {reranker.stats['last_ms']:.1f} ms "
+              f"({'reordenado' if is_reranked(reranked) else 'ordem do bi-encoder'})")
+
+    print(f"\n{'pos':>4}  {'bi-encoder':<40}  {'cross-encoder':<40}")
+    print("-" * 88)
+    for i in range(min(args.top_n, len(results))):
+        before = f"{results[i][1]:3d} {results[i][0]['title'][:35]}"
+        document = reranked[i][0]
+        after = f"{document.get('rerank_score', 0):+6.2f} {document['title'][:33]}"
+        print(f"{i + 1:>4}  {before:<40}  {after:<40}")
+
+    print(f"\n📊 {reranker.report()}")
+    reranker.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,9 @@ Características:
 - Detecção automática de mudanças no Drive
 - Sincronização direta sem JSON intermediário
 - Sem fallback em caso de erro
-- Atualização incremental eficiente
+- Atualização incremental eficiente (diferença por chunk, IDs derivados do conteúdo)
+- Downloads paralelos em streaming, com MD5 verificado durante a transferência
+- Download, extração, embeddings e inserção em estágios concorrentes (ingest_pipeline)
 - Log detalhado das operações
 
 Uso:
@@ -25,12 +27,10 @@ Requisitos:
 import os
 import sys
 import json
-import hashlib
-import io
 import re
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Set, Tuple, Optional
+from typing import List, Dict
 
 # Adiciona paths do projeto
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -40,25 +40,33 @@ sys.path.append(str(PROJECT_ROOT / "scripts"))
 # Google Drive imports
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 
 # ChromaDB imports
 import chromadb
 from sentence_transformers import SentenceTransformer
 
 # Imports locais
-from extract_pdf_complete import process_pdf_to_sections, get_pdf_hash
+from extract_pdf_complete import section_text
+from drive_downloader import DriveDownloader
 from migrate_to_chromadb import (
     get_model_type, 
-    apply_document_prefix,
+    CHUNK_SPAN_FIELDS,
     RECOMMENDED_MODELS
 )
+from chromadb_sharding import DEFAULT_LAYOUT, open_collection, remove_model
+from chunk_dedup import DEDUP_KEY_FIELD, dedup_key, get_member_records, record_models, set_members
+from hnsw_config import build_hnsw_metadata
+from collection_versions import read_pointer
+from index_version import bump_index_version
+from ingest_pipeline import IngestJob, SyncPipeline
+from pca_index import refresh_pca_index
 
 # Configurações
 DRIVE_FOLDER_ID = "1B-Xsgvy4W392yfLP4ilrzrtl8zzmEgTl"
 CREDENTIALS_PATH = PROJECT_ROOT / "core" / "key.json"
 CHROMADB_PATH = PROJECT_ROOT / "chromadb_storage"
 COLLECTION_NAME = "epson_manuals"
+COLLECTION_LAYOUT = DEFAULT_LAYOUT  # single | model | series (env CHROMADB_LAYOUT)
 EMBEDDING_MODEL = "intfloat/multilingual-e5-base"
 BATCH_SIZE = 128
 TEMP_DIR = PROJECT_ROOT / "temp_sync"
@@ -68,13 +76,22 @@ class DriveChromaSync:
     
     def __init__(self):
         self.drive_service = None
+        self.downloader = None
         self.chromadb_client = None
         self.collection = None
         self.embedding_model = None
+        self.embedding_model_name = None
         self.model_type = None
         
         # Estatísticas da operação
-        self.stats = {
+        self.stats = self._new_stats()
+        
+        print("Inicializando sincronização direta Drive → ChromaDB")
+        self._setup()
+    
+    @staticmethod
+    def _new_stats() -> Dict:
+        return {
             'pdfs_found': 0,
             'pdfs_added': 0,
             'pdfs_updated': 0,
@@ -82,12 +99,10 @@ class DriveChromaSync:
             'pdfs_skipped': 0,  # PDFs não modificados (downloads evitados)
             'sections_added': 0,
             'sections_updated': 0,
+            'sections_unchanged': 0,  # chunks mantidos na sincronização por diferença
             'sections_removed': 0,
             'errors': []
         }
-        
-        print("Inicializando sincronização direta Drive → ChromaDB")
-        self._setup()
     
     def _setup(self):
         """Configura todos os serviços necessários"""
@@ -120,6 +135,7 @@ class DriveChromaSync:
         )
         
         self.drive_service = build('drive', 'v3', credentials=credentials)
+        self.downloader = DriveDownloader.from_service_account(CREDENTIALS_PATH)
         print("Google Drive configurado")
     
     def _setup_chromadb(self):
@@ -130,24 +146,37 @@ class DriveChromaSync:
         
         self.chromadb_client = chromadb.PersistentClient(path=str(CHROMADB_PATH))
         
-        try:
-            # Tenta obter coleção existente
-            self.collection = self.chromadb_client.get_collection(COLLECTION_NAME)
-            print(f"Coleção '{COLLECTION_NAME}' encontrada")
-        except Exception:
-            # Cria nova coleção se não existir
-            print(f"Criando nova coleção '{COLLECTION_NAME}'")
-            self.collection = self.chromadb_client.create_collection(
-                name=COLLECTION_NAME,
-                metadata={"description": "Manuais Epson - Sincronização Direta"}
-            )
-            print("Coleção criada")
+        # Sincroniza a versão ativa (blue/green); sem ponteiro, a coleção base
+        live = read_pointer(CHROMADB_PATH, COLLECTION_NAME)
+        live_name = live['live'] if live else COLLECTION_NAME
+        layout = live['layout'] if live else COLLECTION_LAYOUT
+        
+        # Obtém ou cria a coleção (única ou shards por modelo/série)
+        self.collection = open_collection(
+            self.chromadb_client,
+            live_name,
+            layout=layout,
+            create=True,
+            collection_metadata={
+                "description": "Manuais Epson - Sincronização Direta",
+                **build_hnsw_metadata()
+            }
+        )
+        print(f"Coleção '{live_name}' pronta (layout: {layout})")
+    
+    def refresh_collection(self):
+        """Reabre a coleção se outra versão foi publicada (instância reutilizada pelo sync_worker)"""
+        live = read_pointer(CHROMADB_PATH, COLLECTION_NAME)
+        live_name = live['live'] if live else COLLECTION_NAME
+        if self.collection is None or self.collection.name != live_name:
+            self._setup_chromadb()
     
     def _setup_embedding_model(self):
         """Carrega modelo de embedding"""
         print(f"Carregando modelo de embedding: {EMBEDDING_MODEL}")
         
         self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        self.embedding_model_name = EMBEDDING_MODEL
         self.model_type = get_model_type(EMBEDDING_MODEL)
         
         if self.model_type != "standard":
@@ -183,6 +212,15 @@ class DriveChromaSync:
             self.stats['errors'].append(error_msg)
             return []
     
+    def refresh_pca_index(self):
+        """Mantém a coleção auxiliar PCA alinhada com a coleção principal"""
+        try:
+            refresh_pca_index(self.chromadb_client, CHROMADB_PATH, self.collection)
+        except Exception as e:
+            error_msg = f"Erro ao atualizar o índice PCA: {e}"
+            print(f"⚠️  {error_msg}")
+            self.stats['errors'].append(error_msg)
+    
     def get_chromadb_state(self) -> Dict[str, Dict]:
         """Obtém estado atual do ChromaDB (PDFs e seus hashes)"""
         print("\nVerificando estado atual do ChromaDB...")
@@ -197,20 +235,27 @@ class DriveChromaSync:
             
             if results['metadatas']:
                 for metadata in results['metadatas']:
-                    printer_model = metadata.get('printer_model')
                     pdf_hash = metadata.get('pdf_hash')
+                    if not pdf_hash:
+                        continue
                     
-                    if printer_model and pdf_hash:
+                    # Chunks compartilhados contam para todos os modelos participantes;
+                    # o pdf_hash do registro é o do modelo dono
+                    for printer_model in record_models(metadata):
                         if printer_model not in chromadb_state:
                             chromadb_state[printer_model] = {
-                                'pdf_hash': pdf_hash,
+                                'pdf_hash': None,
                                 'section_count': 0
                             }
                         chromadb_state[printer_model]['section_count'] += 1
+                    
+                    owner = metadata.get('printer_model')
+                    if owner and chromadb_state[owner]['pdf_hash'] is None:
+                        chromadb_state[owner]['pdf_hash'] = pdf_hash
             
             print(f"ChromaDB contém {len(chromadb_state)} modelos:")
             for model, info in chromadb_state.items():
-                print(f"   {model}: {info['section_count']} seções (hash: {info['pdf_hash'][:8]}...)")
+                print(f"   {model}: {info['section_count']} seções (hash: {(info['pdf_hash'] or '-')[:8]}...)")
             
             return chromadb_state
             
@@ -244,59 +289,21 @@ class DriveChromaSync:
         
         return model_mapping.get(base, base)
     
-    def download_pdf(self, pdf_info: Dict) -> Optional[Path]:
-        """Baixa PDF do Drive para processamento temporário"""
-        pdf_name = pdf_info['name']
-        pdf_id = pdf_info['id']
-        
-        # Nome seguro para arquivo local
-        safe_name = re.sub(r'[^\w\-_\.]', '_', pdf_name)
-        local_path = TEMP_DIR / safe_name
-        
-        print(f"Baixando: {pdf_name}")
-        
-        try:
-            request = self.drive_service.files().get_media(fileId=pdf_id)
-            file_io = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_io, request)
-            
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-            
-            # Salva arquivo
-            with open(local_path, 'wb') as f:
-                f.write(file_io.getvalue())
-            
-            print(f"Baixado: {local_path}")
-            return local_path
-            
-        except Exception as e:
-            error_msg = f"Erro ao baixar {pdf_name}: {e}"
-            print(f"Erro: {error_msg}")
-            self.stats['errors'].append(error_msg)
-            return None
-    
-    def calculate_pdf_hash(self, pdf_path: Path) -> str:
-        """Calcula hash MD5 do PDF"""
-        return get_pdf_hash(str(pdf_path))
+    @staticmethod
+    def _local_filename(pdf_info: Dict) -> str:
+        """Nome seguro para o arquivo local"""
+        return re.sub(r'[^\w\-_\.]', '_', pdf_info['name'])
     
     def remove_model_from_chromadb(self, printer_model: str):
         """Remove todas as seções de um modelo do ChromaDB"""
         print(f"Removendo modelo {printer_model} do ChromaDB...")
         
         try:
-            # Busca IDs de todas as seções do modelo
-            results = self.collection.get(
-                where={"printer_model": printer_model},
-                include=['metadatas']
-            )
+            # Com shards por modelo, remove a coleção inteira; senão, get + delete por IDs
+            # (chunks compartilhados com outros modelos só perdem a participação)
+            removed_count = remove_model(self.collection, printer_model)
             
-            if results['ids']:
-                # Remove seções
-                self.collection.delete(ids=results['ids'])
-                removed_count = len(results['ids'])
-                
+            if removed_count:
                 print(f"Removidas {removed_count} seções do modelo {printer_model}")
                 self.stats['sections_removed'] += removed_count
                 
@@ -311,87 +318,35 @@ class DriveChromaSync:
             self.stats['errors'].append(error_msg)
             return False
     
-    def process_and_insert_pdf(self, pdf_path: Path, printer_model: str, drive_hash: str = None) -> bool:
-        """Processa PDF e insere seções no ChromaDB"""
-        print(f"Processando PDF: {printer_model}")
+    def _section_records(self, sections: List[Dict], printer_model: str, pdf_hash: str):
+        """IDs, textos e metadados de um batch de seções no formato da coleção"""
+        ids = []
+        documents = []
+        metadatas = []
         
-        try:
-            # Processa PDF em seções
-            sections = process_pdf_to_sections(str(pdf_path), printer_model=printer_model)
-            
-            if not sections:
-                print(f"Nenhuma seção extraída de {printer_model}")
-                return False
-            
-            print(f"Extraídas {len(sections)} seções")
-            
-            # Usa hash do Drive se fornecido, senão usa o hash das seções
-            pdf_hash = drive_hash if drive_hash else sections[0].get('pdf_hash', '')
-            
-            # Prepara dados para inserção
-            ids = []
-            documents = []
-            metadatas = []
-            
-            for section in sections:
-                # ID único
-                section_id = f"{printer_model}_{section['id']}"
-                ids.append(section_id)
-                
-                # Texto combinado para embedding
-                text_content = f"{section['title']} {section['content']}"
-                documents.append(text_content)
-                
-                # Metadados
-                metadata = {
-                    'printer_model': printer_model,
-                    'title': section['title'],
-                    'type': section.get('type', 'geral'),
-                    'keywords': ','.join(section.get('keywords', [])),
-                    'pdf_hash': pdf_hash,  # Usa hash otimizado
-                    'model_type': self.model_type,
-                    'model_name': EMBEDDING_MODEL
-                }
-                metadatas.append(metadata)
-            
-            # Processa em batches
-            for i in range(0, len(sections), BATCH_SIZE):
-                batch_end = min(i + BATCH_SIZE, len(sections))
-                
-                batch_ids = ids[i:batch_end]
-                batch_docs = documents[i:batch_end]
-                batch_metas = metadatas[i:batch_end]
-                
-                # Aplica prefixos para documentos se necessário
-                docs_with_prefix = apply_document_prefix(batch_docs, self.model_type)
-                
-                # Gera embeddings
-                print(f"🧠 Gerando embeddings para batch {i//BATCH_SIZE + 1}")
-                embeddings = self.embedding_model.encode(
-                    docs_with_prefix, 
-                    normalize_embeddings=True, 
-                    show_progress_bar=False
-                ).tolist()
-                
-                # Insere no ChromaDB
-                self.collection.add(
-                    ids=batch_ids,
-                    documents=batch_docs,  # Documentos originais
-                    metadatas=batch_metas,
-                    embeddings=embeddings
-                )
-                
-                print(f"Inseridas {len(batch_ids)} seções")
-            
-            self.stats['sections_added'] += len(sections)
-            print(f"Modelo {printer_model} processado com sucesso!")
-            return True
-            
-        except Exception as e:
-            error_msg = f"Erro ao processar {printer_model}: {e}"
-            print(f"Erro: {error_msg}")
-            self.stats['errors'].append(error_msg)
-            return False
+        for section in sections:
+            # ID estável derivado do conteúdo do chunk
+            ids.append(section['id'])
+            
+            # Texto combinado para embedding
+            documents.append(section_text(section['title'], section['content']))
+            
+            # Metadados (novo chunk pertence só a este modelo até uma reconstrução deduplicar)
+            metadata = {
+                'printer_model': printer_model,
+                'title': section['title'],
+                'type': section.get('type', 'geral'),
+                'keywords': ','.join(section.get('keywords', [])),
+                'pdf_hash': pdf_hash,  # Usa hash otimizado
+                'model_type': self.model_type,
+                'model_name': EMBEDDING_MODEL
+            }
+            # Título, páginas e offsets do chunk estruturado
+            metadata.update({k: section[k] for k in CHUNK_SPAN_FIELDS if section.get(k) is not None})
+            metadata[DEDUP_KEY_FIELD] = dedup_key(documents[-1])
+            metadatas.append(set_members(metadata, [printer_model]))
+        
+        return ids, documents, metadatas
     
     def sync(self):
         """Executa sincronização completa"""
@@ -400,7 +355,13 @@ class DriveChromaSync:
         
         start_time = datetime.now()
         
+        # Instância pode ser reutilizada (sync_worker): estado limpo a cada rodada
+        self.stats = self._new_stats()
+        TEMP_DIR.mkdir(exist_ok=True)
+        
         try:
+            self.refresh_collection()
+            
             # 1. Lista PDFs no Drive
             drive_pdfs = self.get_drive_pdfs()
             if not drive_pdfs:
@@ -440,80 +401,48 @@ class DriveChromaSync:
                 if self.remove_model_from_chromadb(model):
                     self.stats['pdfs_removed'] += 1
             
-            # 6. Processa modelos novos
+            # 6. Decide o que baixar (hash MD5 do Drive evita downloads desnecessários)
+            jobs = []
             for model in models_to_add:
-                pdf_info = drive_models[model]
-                
-                # Baixa PDF
-                pdf_path = self.download_pdf(pdf_info)
-                if not pdf_path:
-                    continue
-                
-                # Processa e insere (usa hash do Drive se disponível)
-                drive_hash = pdf_info.get('md5Checksum')
-                if self.process_and_insert_pdf(pdf_path, model, drive_hash):
-                    self.stats['pdfs_added'] += 1
-                
-                # Remove arquivo temporário
-                pdf_path.unlink(missing_ok=True)
+                jobs.append(IngestJob(model=model, pdf_info=drive_models[model], action='add'))
             
-            # 7. Verifica modelos existentes por mudanças (usando hash do Drive - sem download)
             for model in models_to_check:
                 pdf_info = drive_models[model]
-                current_state = chromadb_state[model]
-                
-                # Usa hash MD5 do Google Drive (evita download desnecessário)
                 drive_hash = pdf_info.get('md5Checksum', '')
-                stored_hash = current_state['pdf_hash']
+                stored_hash = chromadb_state[model]['pdf_hash'] or ''
                 
                 if drive_hash and drive_hash != stored_hash:
                     print(f"PDF modificado detectado: {model}")
                     print(f"   Hash Drive: {drive_hash[:8]}...")
                     print(f"   Hash armazenado: {stored_hash[:8]}...")
-                    
-                    # Baixa apenas PDFs modificados
-                    pdf_path = self.download_pdf(pdf_info)
-                    if not pdf_path:
-                        continue
-                    
-                    # Remove versão antiga
-                    if self.remove_model_from_chromadb(model):
-                        # Insere versão nova
-                        if self.process_and_insert_pdf(pdf_path, model, drive_hash):
-                            self.stats['pdfs_updated'] += 1
-                    
-                    # Remove arquivo temporário
-                    pdf_path.unlink(missing_ok=True)
+                    action = 'update'
                 elif drive_hash:
                     print(f"{model} não modificado (hash: {drive_hash[:8]}...)")
                     self.stats['pdfs_skipped'] += 1
+                    continue
                 else:
                     # Fallback: se Drive não fornecer hash, baixa para verificar
-                    print(f"Hash não disponível no Drive para {model}, verificando localmente...")
-                    pdf_path = self.download_pdf(pdf_info)
-                    if not pdf_path:
-                        continue
-                    
-                    current_hash = self.calculate_pdf_hash(pdf_path)
-                    
-                    if current_hash != stored_hash:
-                        print(f"PDF modificado detectado: {model}")
-                        print(f"   Hash atual: {current_hash[:8]}...")
-                        print(f"   Hash armazenado: {stored_hash[:8]}...")
-                        
-                        # Remove versão antiga
-                        if self.remove_model_from_chromadb(model):
-                            # Insere versão nova
-                            if self.process_and_insert_pdf(pdf_path, model, current_hash):
-                                self.stats['pdfs_updated'] += 1
-                    else:
-                        print(f"{model} não modificado")
-                        self.stats['pdfs_skipped'] += 1
-                    
-                    # Remove arquivo temporário
-                    pdf_path.unlink(missing_ok=True)
+                    print(f"Hash não disponível no Drive para {model}, verificando após o download...")
+                    action = 'verify'
+                
+                # Registros atuais do modelo (inclusive compartilhados): base da sincronização por diferença
+                jobs.append(IngestJob(model=model, pdf_info=pdf_info, action=action, stored_hash=stored_hash,
+                                      existing=get_member_records(self.collection, model)))
+            
+            # 7. Download, extração, embeddings e inserção em estágios sobrepostos
+            SyncPipeline(self, TEMP_DIR).run(jobs)
+            
+            # 8. Reprojeta o índice PCA (se existir) para incluir os chunks novos
+            if jobs or models_to_remove:
+                self.refresh_pca_index()
+            
+            # 9. Avisa os chatbots abertos (ChromaDBSearch observa a versão do índice)
+            changed = {key: self.stats[key] for key in
+                       ('pdfs_added', 'pdfs_updated', 'pdfs_removed', 'sections_added', 'sections_removed')}
+            if any(changed.values()):
+                bump_index_version(CHROMADB_PATH, "sync", changed)
             
-            # 8. Salva log da sincronização
+            # 10. Salva log da sincronização
             self._save_sync_log()
             
             return True
@@ -545,6 +474,7 @@ class DriveChromaSync:
             print(f"PDFs removidos: {self.stats['pdfs_removed']}")
             print(f"PDFs não modificados (ignorados): {self.stats['pdfs_skipped']}")
             print(f"Seções adicionadas: {self.stats['sections_added']}")
+            print(f"Seções inalteradas: {self.stats['sections_unchanged']}")
             print(f"Seções removidas: {self.stats['sections_removed']}")
             
             if self.stats['errors']:
@@ -569,6 +499,7 @@ class DriveChromaSync:
                 "drive_folder_id": DRIVE_FOLDER_ID,
                 "chromadb_path": str(CHROMADB_PATH),
                 "collection_name": COLLECTION_NAME,
+                "collection_layout": COLLECTION_LAYOUT,
                 "embedding_model": EMBEDDING_MODEL,
                 "batch_size": BATCH_SIZE
             }
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Worker de sincronização residente (Drive → ChromaDB)
+===================================================
+
+Cada atualização disparada pelos webhooks ou pelo chatbot abria um Python
+novo, que importava chromadb e sentence_transformers e recarregava o e5 do
+disco antes de qualquer trabalho: dezenas de segundos fixos por atualização.
+
+Este worker fica rodando com o `DriveChromaSync` já montado (encoder, cliente
+ChromaDB e serviço do Drive quentes) e recebe pedidos por um socket local
+(`multiprocessing.connection`, autenticado por chave):
+
+- `sync`: sincronização incremental (sync_drive_chromadb)
+- `status`: rodadas, última execução e se há sincronização em andamento
+- `ping`: verificação de vida
+
+Chave de autenticação: SYNC_WORKER_AUTHKEY ou, sem ela, uma chave aleatória
+gerada pelo worker em `data/.sync_worker_key` (permissão 0600) e lida pelos
+clientes do mesmo usuário. O protocolo desserializa (pickle) o que o cliente
+envia, então a chave nunca pode ser pública.
+
+No máximo uma sincronização roda por vez. Pedidos que chegam durante uma
+rodada são atendidos juntos pela rodada seguinte (uma só, como na fila dos
+webhooks).
+
+Uso:
+    python scripts/sync_worker.py                 # inicia o worker (deixe rodando)
+    python scripts/sync_worker.py --submit sync   # envia um pedido e espera o resultado
+    python scripts/sync_worker.py --submit status
+
+Clientes (webhooks, chatbot):
+    from sync_worker import SyncWorkerUnavailable, submit_job
+    result = submit_job("sync", wait=False)
+"""
+
+import argparse
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Dict, Optional
+
+SYNC_WORKER_HOST = os.environ.get("SYNC_WORKER_HOST", "127.0.0.1")
+SYNC_WORKER_PORT = int(os.environ.get("SYNC_WORKER_PORT", 8765))
+SYNC_WORKER_KEY_FILE = Path(os.environ.get(
+    "SYNC_WORKER_KEY_FILE", Path(__file__).parent.parent / "data" / ".sync_worker_key"))
+
+ACTIONS = ("sync", "status", "ping")
+
+
+class SyncWorkerUnavailable(Exception):
+    """Worker não está rodando (ou recusou a autenticação)"""
+
+
+def load_authkey(create: bool = False) -> bytes:
+    """
+    Chave do socket: SYNC_WORKER_AUTHKEY ou o arquivo de chave.
+    Com create=True (worker), gera uma chave aleatória 0600 se o arquivo não existir.
+    """
+    if os.environ.get("SYNC_WORKER_AUTHKEY"):
+        return os.environ["SYNC_WORKER_AUTHKEY"].encode()
+
+    try:
+        return SYNC_WORKER_KEY_FILE.read_bytes().strip()
+    except FileNotFoundError:
+        if not create:
+            raise SyncWorkerUnavailable(f"chave do worker não encontrada em {SYNC_WORKER_KEY_FILE}")
+
+    SYNC_WORKER_KEY_FILE.parent.mkdir(parents=True, exist_ok=True)
+    key = secrets.token_hex(32).encode()
+    fd = os.open(SYNC_WORKER_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    print(f"🔑 Chave do worker gerada em {SYNC_WORKER_KEY_FILE} (0600)")
+    return key
+
+
+class SyncWorker:
+    """Mantém o DriveChromaSync quente e executa as sincronizações pedidas, uma por vez"""
+
+    def __init__(self):
+        # Imports pesados só no processo do worker (clientes importam só submit_job)
+        sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+        from sync_drive_chromadb import DriveChromaSync
+
+        start = time.perf_counter()
+        self.syncer = DriveChromaSync()
+        self.setup_seconds = round(time.perf_counter() - start, 1)
+        print(f"🔥 Worker pronto em {self.setup_seconds}s (encoder e ChromaDB carregados)")
+
+        self._condition = threading.Condition()
+        self._running = False
+        self._requested = 0   # sequência do último pedido de sync
+        self._completed = 0   # maior sequência atendida por uma rodada terminada
+        self.started_at = datetime.now().isoformat()
+        self.runs = 0
+        self.last_run = None
+
+    def request_sync(self, wait: bool = True, timeout: Optional[float] = None) -> Dict:
+        """Registra um pedido; a rodada seguinte atende todos os pedidos acumulados"""
+        with self._condition:
+            self._requested += 1
+            sequence = self._requested
+            self._condition.notify_all()
+            if wait:
+                self._condition.wait_for(lambda: self._completed >= sequence, timeout=timeout)
+            return dict(self.status_locked(), done=self._completed >= sequence)
+
+    def run_forever(self):
+        """Loop das sincronizações (thread própria)"""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._requested > self._completed)
+                covered = self._requested
+                self._running = True
+
+            started = datetime.now()
+            start = time.perf_counter()
+            try:
+                success = bool(self.syncer.sync())
+                error = None
+            except Exception as e:
+                success, error = False, str(e)
+                traceback.print_exc()
+
+            with self._condition:
+                self._running = False
+                self._completed = covered
+                self.runs += 1
+                self.last_run = {
+                    "started": started.isoformat(),
+                    "duration_seconds": round(time.perf_counter() - start, 1),
+                    "success": success,
+                    "error": error,
+                    "stats": dict(self.syncer.stats, errors=list(self.syncer.stats["errors"])),
+                }
+                self._condition.notify_all()
+
+    def status_locked(self) -> Dict:
+        return {
+            "running": self._running,
+            "pending": self._requested > self._completed + int(self._running),
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "started_at": self.started_at,
+            "setup_seconds": self.setup_seconds,
+        }
+
+    def status(self) -> Dict:
+        with self._condition:
+            return self.status_locked()
+
+    def handle(self, request: Dict) -> Dict:
+        action = request.get("action")
+        if action == "ping":
+            return {"ok": True}
+        if action == "status":
+            return self.status()
+        if action == "sync":
+            return self.request_sync(wait=request.get("wait", True), timeout=request.get("timeout"))
+        return {"error": f"Ação desconhecida: {action} (opções: {', '.join(ACTIONS)})"}
+
+
+def _serve_connection(worker: SyncWorker, connection):
+    try:
+        with connection:
+            connection.send(worker.handle(connection.recv()))
+    except (EOFError, OSError) as e:
+        print(f"⚠️  Conexão encerrada pelo cliente: {e}")
+    except Exception as e:
+        print(f"❌ Erro ao atender pedido: {e}")
+
+
+def serve(host: str = SYNC_WORKER_HOST, port: int = SYNC_WORKER_PORT):
+    """Inicia o worker e atende pedidos até ser interrompido"""
+    authkey = load_authkey(create=True)
+    worker = SyncWorker()
+    threading.Thread(target=worker.run_forever, name="sync-runner", daemon=True).start()
+
+    with Listener((host, port), authkey=authkey) as listener:
+        print(f"📡 Worker de sincronização ouvindo em {host}:{port}")
+        while True:
+            try:
+                connection = listener.accept()
+            except Exception as e:
+                # Falha de autenticação ou handshake: ignora o cliente
+                print(f"⚠️  Conexão recusada: {e}")
+                continue
+            threading.Thread(target=_serve_connection, args=(worker, connection), daemon=True).start()
+
+
+def submit_job(action: str = "sync", wait: bool = True, timeout: Optional[float] = None,
+               host: str = SYNC_WORKER_HOST, port: int = SYNC_WORKER_PORT) -> Dict:
+    """
+    Envia um pedido ao worker residente.
+
+    Args:
+        action: 'sync', 'status' ou 'ping'
+        wait: Para 'sync', espera a rodada que atende o pedido terminar
+        timeout: Limite da espera em segundos (None = sem limite)
+
+    Raises:
+        SyncWorkerUnavailable: worker não está rodando (ou sem chave)
+    """
+    authkey = load_authkey()
+    try:
+        connection = Client((host, port), authkey=authkey)
+    except (OSError, EOFError, AuthenticationError) as e:
+        raise SyncWorkerUnavailable(f"worker em {host}:{port} indisponível ({e})") from e
+
+    with connection:
+        connection.send({"action": action, "wait": wait, "timeout": timeout})
+        return connection.recv()
+
+
+def format_result(result: Dict) -> str:
+    """Resumo em texto de uma resposta de 'sync' (para logs dos webhooks)"""
+    return json.dumps(result.get("last_run") or result, ensure_ascii=False, default=str)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de sincronização Drive → ChromaDB residente")
+    parser.add_argument("--host", default=SYNC_WORKER_HOST, help="Endereço do socket local")
+    parser.add_argument("--port", type=int, default=SYNC_WORKER_PORT, help="Porta do socket local")
+    parser.add_argument("--submit", choices=ACTIONS, help="Envia um pedido a um worker em execução")
+    parser.add_argument("--no-wait", action="store_true", help="Com --submit sync, não espera a rodada")
+    args = parser.parse_args()
+
+    if args.submit:
+        try:
+            result = submit_job(args.submit, wait=not args.no_wait, host=args.host, port=args.port)
+        except SyncWorkerUnavailable as e:
+            print(f"❌ {e}")
+            print("💡 Inicie com: python scripts/sync_worker.py")
+            sys.exit(1)
+        print(json.dumps(result, indent=2, ensure_ascii=False, default=str))
+        if args.submit == "sync" and not args.no_wait and not (result.get("last_run") or {}).get("success"):
+            sys.exit(1)
+        return
+
+    print("🚀 WORKER DE SINCRONIZAÇÃO RESIDENTE")
+    print("=" * 50)
+    try:
+        serve(args.host, args.port)
+    except KeyboardInterrupt:
+        print("\n👋 Worker encerrado")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,9 @@ from sentence_transformers import SentenceTransformer
 # Adiciona o diretório core ao path para importar funções do sistema atual
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'core'))
 
+from hnsw_config import distance_to_similarity, get_collection_space
+from collection_versions import open_live_collection
+
 def apply_query_prefix(query, model_type):
     """Aplica prefixos apropriados para consultas baseado no tipo de modelo"""
     if model_type in ["e5", "bge"]:
@@ -30,7 +33,7 @@ def load_chromadb(db_path, collection_name):
     """Carrega a coleção do ChromaDB"""
     try:
         client = chromadb.PersistentClient(path=db_path)
-        collection = client.get_collection(name=collection_name)
+        collection = open_live_collection(client, db_path, collection_name)
         return client, collection
     except Exception as e:
         print(f"❌ Erro ao carregar ChromaDB: {e}")
@@ -111,7 +114,7 @@ def test_semantic_search(collection, model_name):
                 print(f"   ✅ Encontrados {len(results['ids'][0])} resultados")
                 for i, (doc_id, distance) in enumerate(zip(results['ids'][0], results['distances'][0])):
                     metadata = results['metadatas'][0][i]
-                    similarity = 1 - distance  # Converte distância para similaridade
+                    similarity = distance_to_similarity(distance, get_collection_space(collection))
                     print(f"      {i+1}. {doc_id} (Similaridade: {similarity:.3f})")
                     print(f"         Modelo: {metadata.get('printer_model', 'N/A')}")
                     print(f"         Tipo: {metadata.get('type', 'N/A')}")
@@ -188,7 +191,7 @@ def compare_with_current_system(query, collection, model_name):
         
         if chroma_results['ids'][0]:
             for i, (doc_id, distance) in enumerate(zip(chroma_results['ids'][0], chroma_results['distances'][0])):
-                similarity = 1 - distance
+                similarity = distance_to_similarity(distance, get_collection_space(collection))
                 metadata = chroma_results['metadatas'][0][i]
                 print(f"   {i+1}. {doc_id} (Sim: {similarity:.3f}) - {metadata.get('printer_model', 'N/A')}")
         
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Teste do chunker estruturado
+============================
+
+Confere a heurística `is_heading` e os limites de tamanho em amostras no
+formato dos manuais Epson:
+
+1. Títulos reais (numerados, caixa alta, caixa de título e caixa de frase)
+   são reconhecidos
+2. Linhas do corpo (instruções curtas no imperativo, passos, avisos) não são
+   títulos
+3. Os passos de um procedimento com instruções curtas entre eles ficam no mesmo chunk,
+   com o título da seção
+4. Uma página inteira em uma só linha (comum no pypdf) é quebrada em chunks
+   de até `chunk_size`, cortados em espaços
+5. Um título seguido de linha longa não vira um chunk só com o título
+   (nada abaixo de `min_chunk` é emitido)
+
+Uso:
+    python scripts/test_chunker.py
+
+Sai com código 1 se algum teste falhar.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'core'))
+from chunker import is_heading, iter_structured_chunks
+
+HEADING_SAMPLES = [
+    "3.2 Limpeza do cabeçote",
+    "4 Solução de problemas",
+    "SOLUÇÃO DE PROBLEMAS",
+    "CARREGAMENTO DE PAPEL",
+    "Carregamento de Papel",
+    "Solução de problemas",
+    "Limpeza do cabeçote",
+    "Especificações técnicas",
+    "Conexão Wi-Fi",
+    "Substituição das almofadas de tinta",
+]
+
+BODY_SAMPLES = [
+    "Pressione o botão",
+    "Carregue papel",
+    "Abra a tampa do scanner",
+    "Ligue a impressora",
+    "Verifique o nível de tinta",
+    "Remova o papel atolado",
+    "Não toque no cabeçote",
+    "Certifique-se de que a impressora está desligada",
+    "1. Abra a tampa",
+    "2) Feche a tampa",
+    "Passo 3 Aguarde",
+    "Tinta preta 001",
+    "tampa do alimentador",
+    "Observação:",
+    "L3150",
+]
+
+PROCEDURE = [
+    "Limpeza do cabeçote",
+    "Use este procedimento quando as impressões saírem falhadas ou com listras.",
+    "1. Ligue a impressora",
+    "Pressione o botão",
+    "2. Abra a tampa do scanner",
+    "Carregue papel",
+    "3. Selecione Manutenção no painel",
+    "Aguarde a conclusão",
+    "4. Feche a tampa e imprima um padrão de verificação dos jatos.",
+]
+
+
+def test_headings():
+    """Títulos das amostras reconhecidos"""
+    print("\n🏷️  TESTE 1: Títulos reconhecidos")
+    print("-" * 40)
+    missed = [line for line in HEADING_SAMPLES if not is_heading(line)]
+    for line in missed:
+        print(f"   ⚠️  não reconhecido: '{line}'")
+    print(f"   {len(HEADING_SAMPLES) - len(missed)}/{len(HEADING_SAMPLES)} títulos")
+    return not missed
+
+
+def test_body_lines():
+    """Linhas do corpo não viram título"""
+    print("\n📄 TESTE 2: Linhas do corpo não são títulos")
+    print("-" * 40)
+    wrong = [line for line in BODY_SAMPLES if is_heading(line)]
+    for line in wrong:
+        print(f"   ⚠️  tratada como título: '{line}'")
+    print(f"   {len(BODY_SAMPLES) - len(wrong)}/{len(BODY_SAMPLES)} linhas do corpo")
+    return not wrong
+
+
+def test_procedure_not_fragmented():
+    """Instruções curtas entre os passos não abrem chunk novo"""
+    print("\n🧩 TESTE 3: Procedimento não fragmentado")
+    print("-" * 40)
+    chunks = list(iter_structured_chunks(((1, line) for line in PROCEDURE), chunk_size=800, min_chunk=20))
+    headings = [chunk['heading'] for chunk in chunks]
+    print(f"   {len(chunks)} chunks, títulos: {headings}")
+    return len(chunks) <= 2 and set(headings) == {"Limpeza do cabeçote"} \
+        and any("Pressione o botão" in chunk['text'] and "2. Abra" in chunk['text'] for chunk in chunks)
+
+
+def test_long_line_split():
+    """Linha maior que chunk_size é quebrada em espaços, sem chunk acima do limite"""
+    print("\n✂️  TESTE 4: Linha longa quebrada")
+    print("-" * 40)
+    long_line = " ".join(f"palavra{i}" for i in range(700))
+    chunks = list(iter_structured_chunks([(1, "Limpeza do cabeçote"), (1, long_line)],
+                                         chunk_size=800, min_chunk=50))
+    sizes = [len(chunk['text']) for chunk in chunks]
+    print(f"   {len(long_line)} caracteres → chunks de {sizes}")
+    words = " ".join(chunk['text'] for chunk in chunks).split()
+    return len(chunks) > 1 and max(sizes) <= 800 and words == ["Limpeza", "do", "cabeçote"] + long_line.split()
+
+
+def test_no_chunk_below_min():
+    """O título sozinho (abaixo de min_chunk) não é emitido como chunk"""
+    print("\n📏 TESTE 5: Nada abaixo de min_chunk")
+    print("-" * 40)
+    lines = [(1, "Limpeza do cabeçote"), (1, "x " * 3000), (2, "Fim do procedimento de limpeza do cabeçote.")]
+    chunks = list(iter_structured_chunks(lines, chunk_size=800, min_chunk=50))
+    sizes = [len(chunk['text']) for chunk in chunks]
+    print(f"   chunks de {sizes}")
+    return bool(chunks) and min(sizes) >= 50 and max(sizes) <= 800 \
+        and chunks[0]['text'].startswith("Limpeza do cabeçote x")
+
+
+def main():
+    print("🧪 CHUNKER ESTRUTURADO")
+    print("=" * 50)
+
+    results = {
+        "Títulos reconhecidos": test_headings(),
+        "Corpo não é título": test_body_lines(),
+        "Procedimento inteiro": test_procedure_not_fragmented(),
+        "Linha longa quebrada": test_long_line_split(),
+        "Mínimo por chunk": test_no_chunk_below_min(),
+    }
+
+    print("\n" + "=" * 50)
+    for name, passed in results.items():
+        print(f"   {name}: {'✅ PASSOU' if passed else '❌ FALHOU'}")
+    if not all(results.values()):
+        sys.exit(1)
+    print("\n🎉 Chunker estruturado OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Teste da decisão da busca entre manuais
+=======================================
+
+Confere `confident_model` com forças no formato de `cross_model_search`
+(similaridade média dos top-k, 0-1):
+
+1. Modelos quase empatados (diferença de 0.01) seguem para o afunilamento,
+   mesmo com o líder acima da probabilidade mínima
+2. Um modelo claramente à frente é respondido direto
+3. Sem resultados, ou com um único modelo, a decisão é coerente
+
+Uso:
+    python scripts/test_model_ranking.py
+
+Sai com código 1 se algum teste falhar.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+from model_ranking import CROSS_MODEL_CONFIDENCE, confident_model, rank_models
+
+
+def cross_result(model_strength):
+    """Resultado de cross_model_search reduzido ao que a decisão usa"""
+    return {'model_ranking': rank_models(model_strength), 'model_strength': model_strength}
+
+
+def test_near_tie_uses_funnel():
+    """Empate técnico não escolhe um modelo (o app inicia o afunilamento)"""
+    print("\n⚖️  TESTE 1: Quase empate → afunilamento")
+    print("-" * 40)
+    cross = cross_result({'impressoraL3150': 0.842, 'impressoraL3250': 0.832})
+    top_model, probability = cross['model_ranking'][0]
+    leader = confident_model(cross)
+    print(f"   líder {top_model} com {probability:.0%} (mínimo {CROSS_MODEL_CONFIDENCE:.0%}) → {leader or 'afunilamento'}")
+    return probability >= CROSS_MODEL_CONFIDENCE and leader is None
+
+
+def test_clear_leader_answered():
+    """Modelo dominante é respondido sem afunilamento"""
+    print("\n🏆 TESTE 2: Líder claro → resposta direta")
+    print("-" * 40)
+    cross = cross_result({'impressoraL3150': 0.86, 'impressoraL3250': 0.80, 'impressoraL375': 0.79})
+    leader = confident_model(cross)
+    print(f"   ranking {[(m, round(p, 3)) for m, p in cross['model_ranking']]} → {leader}")
+    return leader == 'impressoraL3150'
+
+
+def test_edge_cases():
+    """Sem resultados → afunilamento; um único modelo → esse modelo"""
+    print("\n🧪 TESTE 3: Casos de borda")
+    print("-" * 40)
+    empty = confident_model(cross_result({}))
+    single = confident_model(cross_result({'impressoraL3150': 0.7}))
+    print(f"   sem resultados → {empty}, um modelo → {single}")
+    return empty is None and single == 'impressoraL3150'
+
+
+def main():
+    print("🧪 DECISÃO DA BUSCA ENTRE MANUAIS")
+    print("=" * 50)
+
+    results = {
+        "Quase empate": test_near_tie_uses_funnel(),
+        "Líder claro": test_clear_leader_answered(),
+        "Casos de borda": test_edge_cases(),
+    }
+
+    print("\n" + "=" * 50)
+    for name, passed in results.items():
+        print(f"   {name}: {'✅ PASSOU' if passed else '❌ FALHOU'}")
+    if not all(results.values()):
+        sys.exit(1)
+    print("\n🎉 Decisão entre modelos OK")
+
+
+if __name__ == "__main__":
+    main()
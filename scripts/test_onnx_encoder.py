@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Teste de paridade do encoder de consultas ONNX (int8) com o PyTorch
+===================================================================
+
+Antes de ativar QUERY_ENCODER=onnx, confere que a quantização não mudou a busca:
+
+1. Concordância de cosseno: similaridade entre o vetor PyTorch e o ONNX de cada
+   consulta (média e mínimo acima dos limites)
+2. Sobreposição do top-k: fração dos k resultados da coleção ativa que são os
+   mesmos com os dois encoders (a coleção continua com os embeddings PyTorch)
+
+Uso:
+    python scripts/test_onnx_encoder.py
+    python scripts/test_onnx_encoder.py --k 5 --queries-file perguntas.txt
+    python scripts/test_onnx_encoder.py --onnx-dir chromadb_storage/onnx_models/multilingual-e5-base-int8
+
+Sai com código 1 se algum teste falhar.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from hnsw_sweep import load_queries
+from model_prefixes import apply_query_prefix, get_model_type
+from onnx_query_encoder import OnnxQueryEncoder, default_onnx_dir
+
+MIN_MEAN_COSINE = 0.99
+MIN_COSINE = 0.98
+MIN_TOP_K_OVERLAP = 0.8
+
+
+def test_cosine_agreement(torch_vectors, onnx_vectors, min_mean=MIN_MEAN_COSINE, min_each=MIN_COSINE):
+    """Cosseno entre os vetores dos dois encoders (ambos normalizados)"""
+    print("\n📐 TESTE 1: Concordância de cosseno")
+    print("-" * 40)
+    cosines = np.sum(torch_vectors * onnx_vectors, axis=1)
+    print(f"   Média: {cosines.mean():.4f} (mínimo exigido {min_mean})")
+    print(f"   Mínimo: {cosines.min():.4f} (mínimo exigido {min_each})")
+    return bool(cosines.mean() >= min_mean and cosines.min() >= min_each)
+
+
+def test_top_k_overlap(collection, queries, torch_vectors, onnx_vectors, k, min_overlap=MIN_TOP_K_OVERLAP):
+    """Sobreposição dos top-k da coleção ativa com os dois encoders"""
+    print(f"\n🎯 TESTE 2: Sobreposição do top-{k}")
+    print("-" * 40)
+    overlaps = []
+    for query, torch_vector, onnx_vector in zip(queries, torch_vectors, onnx_vectors):
+        torch_ids = collection.query(query_embeddings=[torch_vector.tolist()], n_results=k, include=[])['ids'][0]
+        onnx_ids = collection.query(query_embeddings=[onnx_vector.tolist()], n_results=k, include=[])['ids'][0]
+        overlap = len(set(torch_ids) & set(onnx_ids)) / max(len(torch_ids), 1)
+        overlaps.append(overlap)
+        if overlap < 1:
+            print(f"   ⚠️  '{query}': {overlap:.0%}")
+    mean_overlap = float(np.mean(overlaps))
+    print(f"   Sobreposição média: {mean_overlap:.1%} (mínimo exigido {min_overlap:.0%})")
+    print(f"   Consultas com top-{k} idêntico: {sum(o == 1 for o in overlaps)}/{len(overlaps)}")
+    return mean_overlap >= min_overlap
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridade do encoder ONNX com o PyTorch")
+    parser.add_argument("--model", default="intfloat/multilingual-e5-base", help="Modelo de embeddings")
+    parser.add_argument("--onnx-dir", help="Modelo exportado (padrão: chromadb_storage/onnx_models/<modelo>-int8)")
+    parser.add_argument("--db", default="./chromadb_storage", help="Diretório do banco ChromaDB")
+    parser.add_argument("--collection", default="epson_manuals", help="Nome da coleção")
+    parser.add_argument("--k", type=int, default=10, help="Top-k comparado")
+    parser.add_argument("--queries-file", help="Arquivo com uma consulta por linha")
+    parser.add_argument("--skip-collection", action="store_true", help="Só compara os vetores (sem ChromaDB)")
+    args = parser.parse_args()
+
+    print("🧪 PARIDADE DO ENCODER ONNX")
+    print("=" * 50)
+    onnx_dir = args.onnx_dir or default_onnx_dir(args.model)
+    try:
+        onnx_encoder = OnnxQueryEncoder(onnx_dir)
+    except Exception as e:
+        print(f"❌ Erro ao carregar o modelo ONNX em {onnx_dir}: {e}")
+        print(f"💡 Exporte com: python scripts/onnx_query_encoder.py export --model {args.model}")
+        sys.exit(1)
+    print(f"⚡ ONNX: {onnx_dir} (int8: {onnx_encoder.manifest['quantized']})")
+    print(f"🤖 PyTorch: {args.model}")
+
+    model_type = get_model_type(args.model)
+    queries = load_queries(args.queries_file)
+    texts = [apply_query_prefix(query, model_type) for query in queries]
+    torch_vectors = np.asarray(SentenceTransformer(args.model).encode(texts, normalize_embeddings=True),
+                               dtype=np.float32)
+    onnx_vectors = onnx_encoder.encode(texts, normalize_embeddings=True)
+
+    results = {"Concordância de cosseno": test_cosine_agreement(torch_vectors, onnx_vectors)}
+
+    if not args.skip_collection:
+        import chromadb
+        from collection_versions import open_live_collection
+        try:
+            client = chromadb.PersistentClient(path=args.db)
+            collection = open_live_collection(client, args.db, args.collection)
+            results[f"Sobreposição do top-{args.k}"] = test_top_k_overlap(
+                collection, queries, torch_vectors, onnx_vectors, args.k)
+        except Exception as e:
+            print(f"❌ Erro ao consultar o ChromaDB: {e}")
+            results[f"Sobreposição do top-{args.k}"] = False
+
+    print("\n" + "=" * 50)
+    for name, passed in results.items():
+        print(f"   {name}: {'✅ PASSOU' if passed else '❌ FALHOU'}")
+    if not all(results.values()):
+        sys.exit(1)
+    print("\n🎉 Encoder ONNX equivalente - pode ativar QUERY_ENCODER=onnx")
+
+
+if __name__ == "__main__":
+    main()
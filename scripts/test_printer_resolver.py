@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Teste do filtro do resolvedor de impressoras por descrição
+==========================================================
+
+O resolvedor só roda quando `describes_printer` aceita o texto. Confere o
+filtro em amostras rotuladas:
+
+1. Descrições da impressora pelas características são aceitas
+2. Perguntas comuns (problemas, procedimentos, modelo citado pelo nome) e
+   problemas com uma característica ("o fax não envia") são recusadas
+
+Uso:
+    python scripts/test_printer_resolver.py
+
+Sai com código 1 se algum teste falhar.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+from printer_resolver import describes_printer
+
+DESCRIPTIONS = [
+    "a que tem fax e imprime A3",
+    "só imprime, papel grande",
+    "aquela com tanque de tinta",
+    "minha impressora é multifuncional com wifi",
+    "uma que copia e tem scanner",
+    "colorida, frente e verso",
+    "a que tem alimentador automático",
+    "tem wi-fi e imprime pelo celular",
+    "a preto e branco que tem ethernet",
+]
+
+QUERIES = [
+    "como limpar o cabeçote",
+    "a impressora não liga",
+    "papel atolado na bandeja",
+    "o fax não envia",
+    "o wifi não conecta",
+    "como trocar a tinta",
+    "minha L3150 está com listras",
+    "erro E-01 no painel",
+    "como recarregar o tanque",
+    "Epson L6270 não imprime",
+    "",
+]
+
+
+def test_descriptions_accepted():
+    """Descrições pelas características passam pelo filtro"""
+    print("\n🖨️  TESTE 1: Descrições aceitas")
+    print("-" * 40)
+    missed = [text for text in DESCRIPTIONS if not describes_printer(text)]
+    for text in missed:
+        print(f"   ⚠️  recusada: '{text}'")
+    print(f"   {len(DESCRIPTIONS) - len(missed)}/{len(DESCRIPTIONS)} descrições")
+    return not missed
+
+
+def test_queries_rejected():
+    """Perguntas comuns não acionam o resolvedor"""
+    print("\n❓ TESTE 2: Perguntas comuns recusadas")
+    print("-" * 40)
+    wrong = [text for text in QUERIES if describes_printer(text)]
+    for text in wrong:
+        print(f"   ⚠️  aceita: '{text}'")
+    print(f"   {len(QUERIES) - len(wrong)}/{len(QUERIES)} perguntas")
+    return not wrong
+
+
+def main():
+    print("🧪 FILTRO DO RESOLVEDOR DE IMPRESSORAS")
+    print("=" * 50)
+
+    results = {
+        "Descrições aceitas": test_descriptions_accepted(),
+        "Perguntas recusadas": test_queries_rejected(),
+    }
+
+    print("\n" + "=" * 50)
+    for name, passed in results.items():
+        print(f"   {name}: {'✅ PASSOU' if passed else '❌ FALHOU'}")
+    if not all(results.values()):
+        sys.exit(1)
+    print("\n🎉 Filtro do resolvedor OK")
+
+
+if __name__ == "__main__":
+    main()
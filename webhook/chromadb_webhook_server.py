@@ -4,11 +4,13 @@ ChromaDB Webhook Server
 ======================
 Servidor webhook simplificado que executa update_chromadb.sh
 quando recebe notificações de alterações no Google Drive.
+
+As notificações são respondidas na hora e agrupadas na fila com debounce
+(sync_queue.py): uma rajada do Drive custa uma única atualização.
 """
 
 import os
 import sys
-import json
 import logging
 import subprocess
 import hashlib
@@ -17,11 +19,17 @@ from datetime import datetime
 from flask import Flask, request, jsonify
 from pathlib import Path
 
+from sync_queue import DebouncedSyncQueue
+
+sys.path.append(str(Path(__file__).parent.parent / "scripts"))
+sys.path.append(str(Path(__file__).parent.parent / "core"))
+from sync_worker import SyncWorkerUnavailable, format_result, submit_job
+from activity_log import CHROMADB_WEBHOOK_ACTIVITY_LOG, ActivityLog
+
 # Configuração de caminhos
 PROJECT_ROOT = Path(__file__).parent.parent
 UPDATE_SCRIPT = PROJECT_ROOT / "executables" / "update_chromadb.sh"
 LOG_FILE = PROJECT_ROOT / "data" / "chromadb_webhook.log"
-ACTIVITY_FILE = PROJECT_ROOT / "data" / "chromadb_webhook_activity.json"
 
 # Criar diretório de logs se não existir
 LOG_FILE.parent.mkdir(exist_ok=True)
@@ -41,43 +49,44 @@ app = Flask(__name__)
 # Configuração
 WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', 'chromadb-sync-secret-2024')
 PORT = int(os.environ.get('WEBHOOK_PORT', 8080))
+TEST_UPDATE_TIMEOUT = int(os.environ.get('TEST_UPDATE_TIMEOUT', 600))
+
+# Log de atividades append-only (JSONL com rotação por tamanho)
+activity_log = ActivityLog(CHROMADB_WEBHOOK_ACTIVITY_LOG)
 
 def log_activity(event_type, details=None):
-    """Registra atividade do webhook"""
-    activity = {
-        'timestamp': datetime.now().isoformat(),
-        'event_type': event_type,
-        'details': details or {}
-    }
-    
-    # Carrega histórico existente
-    activities = []
-    if ACTIVITY_FILE.exists():
-        try:
-            with open(ACTIVITY_FILE, 'r') as f:
-                activities = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            activities = []
-    
-    # Adiciona nova atividade
-    activities.append(activity)
-    
-    # Mantém apenas as últimas 100 atividades
-    if len(activities) > 100:
-        activities = activities[-100:]
-    
-    # Salva
-    with open(ACTIVITY_FILE, 'w') as f:
-        json.dump(activities, f, indent=2, ensure_ascii=False)
-    
+    """Registra atividade do webhook (um acréscimo atômico, sem regravar o histórico)"""
+    activity_log.append(event_type, details)
     logging.info(f"Activity logged: {event_type}")
 
+def submit_to_sync_worker():
+    """Pede a sincronização ao worker residente (None se ele não estiver rodando)"""
+    try:
+        result = submit_job("sync", wait=True)
+    except SyncWorkerUnavailable as e:
+        logging.info(f"Worker de sincronização indisponível ({e}) - executando o script")
+        return None
+    
+    last_run = result.get("last_run") or {}
+    success = bool(last_run.get("success"))
+    log_activity("update_success" if success else "update_failed", {
+        "worker": True,
+        "duration_seconds": last_run.get("duration_seconds"),
+        "error": last_run.get("error")
+    })
+    return success, format_result(result)
+
 def execute_update_script():
-    """Executa o script de atualização do ChromaDB"""
+    """Executa a atualização do ChromaDB (worker residente ou script)"""
     try:
         logging.info("Iniciando atualização do ChromaDB...")
         log_activity("update_started")
         
+        # Worker quente: sem recarregar Python, encoder e ChromaDB a cada atualização
+        worker_result = submit_to_sync_worker()
+        if worker_result is not None:
+            return worker_result
+        
         # Torna o script executável
         UPDATE_SCRIPT.chmod(0o755)
         
@@ -110,6 +119,9 @@ def execute_update_script():
         log_activity("update_error", {"error": str(e)})
         return False, error_msg
 
+# Fila de atualizações: no máximo uma rodando e uma pendente
+sync_queue = DebouncedSyncQueue(execute_update_script, name="chromadb")
+
 def verify_webhook_token(request_data, token):
     """Verifica o token de autenticação do webhook"""
     # Google Drive webhooks usam o header X-Goog-Channel-Token
@@ -161,21 +173,22 @@ def webhook_handler():
             logging.info(f"Mudança detectada: {resource_state}")
             log_activity("change_detected", {"state": resource_state})
             
-            # Executa atualização
-            success, output = execute_update_script()
+            # Agenda a atualização e responde imediatamente (rajadas viram uma rodada)
+            queue = sync_queue.notify(resource_state)
+            log_activity("update_queued", {
+                "state": resource_state,
+                "coalesced": queue["coalesced"],
+                "queue_depth": queue["queue_depth"]
+            })
             
-            if success:
-                return jsonify({
-                    "status": "success",
-                    "message": "ChromaDB atualizado com sucesso",
-                    "timestamp": datetime.now().isoformat()
-                }), 200
-            else:
-                return jsonify({
-                    "status": "error",
-                    "message": "Erro ao atualizar ChromaDB",
-                    "error": output
-                }), 500
+            return jsonify({
+                "status": "queued",
+                "message": "Atualização do ChromaDB agendada",
+                "coalesced": queue["coalesced"],
+                "queue_depth": queue["queue_depth"],
+                "next_run_in_seconds": queue["next_run_in_seconds"],
+                "timestamp": datetime.now().isoformat()
+            }), 200
         
         # Mensagem de sincronização inicial (sync)
         elif resource_state == "sync":
@@ -210,7 +223,9 @@ def health_check():
         "service": "ChromaDB Webhook Server",
         "timestamp": datetime.now().isoformat(),
         "update_script": str(UPDATE_SCRIPT),
-        "script_exists": UPDATE_SCRIPT.exists()
+        "script_exists": UPDATE_SCRIPT.exists(),
+        "queue": sync_queue.status(),
+        "last_update": activity_log.latest("update_success")
     }), 200
 
 @app.route('/test-update', methods=['POST'])
@@ -224,7 +239,16 @@ def test_update():
         logging.info("Teste de atualização iniciado")
         log_activity("test_update_requested")
         
-        success, output = execute_update_script()
+        # Passa pela fila (sem debounce) para nunca rodar junto com uma atualização do webhook
+        queue = sync_queue.notify("manual", immediate=True, wait=True, timeout=TEST_UPDATE_TIMEOUT)
+        if not queue["done"]:
+            return jsonify({
+                "success": False,
+                "output": f"Atualização ainda em andamento após {TEST_UPDATE_TIMEOUT}s",
+                "queue": sync_queue.status(),
+                "timestamp": datetime.now().isoformat()
+            }), 202
+        success, output = queue["last_run"]["success"], queue["last_run"]["output"]
         
         return jsonify({
             "success": success,
@@ -246,7 +270,7 @@ def index():
         "status": "running",
         "endpoints": {
             "/webhook": "POST - Recebe notificações do Google Drive",
-            "/health": "GET - Health check",
+            "/health": "GET - Health check e estado da fila de atualizações",
             "/test-update": "POST - Testa execução do script (requer autenticação)"
         },
         "timestamp": datetime.now().isoformat()
@@ -260,6 +284,7 @@ def main():
     print(f"📍 Porta: {PORT}")
     print(f"🔧 Script de atualização: {UPDATE_SCRIPT}")
     print(f"📝 Log: {LOG_FILE}")
+    print(f"⏳ Debounce: {sync_queue.debounce_seconds:.0f}s (no máximo uma atualização rodando e uma pendente)")
     print(f"🔐 Secret configurado: {'Sim' if WEBHOOK_SECRET != 'chromadb-sync-secret-2024' else 'Não (usando padrão)'}")
     print("\n📡 Endpoints disponíveis:")
     print("   POST /webhook - Recebe notificações do Google Drive")
@@ -270,6 +295,7 @@ def main():
     print("=" * 60 + "\n")
     
     log_activity("server_started", {"port": PORT})
+    sync_queue.start()
     
     # Inicia servidor
     app.run(host='0.0.0.0', port=PORT, debug=False)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Fila de sincronização com debounce para as notificações do Drive
+================================================================
+
+O Google envia rajadas de notificações `update`/`change` para uma única
+alteração na pasta. Rodar a sincronização dentro da requisição Flask prende um
+worker por minutos e dispara uma sincronização completa por notificação.
+
+`DebouncedSyncQueue` roda as sincronizações em uma thread do próprio servidor:
+
+- `notify()` só registra a notificação e retorna (o handler responde em ms)
+- Notificações dentro da janela `SYNC_DEBOUNCE_SECONDS` viram uma única
+  sincronização; a janela recomeça a cada notificação, limitada a
+  `SYNC_MAX_DELAY_SECONDS` desde a primeira (rajadas contínuas não adiam para sempre)
+- No máximo uma sincronização rodando e uma pendente: notificações durante a
+  execução agendam UMA nova rodada, que cobre todas elas
+- `status()` informa a profundidade da fila e a última execução (endpoints de status)
+
+Uso:
+    queue = DebouncedSyncQueue(run_update, name="chromadb")
+    queue.start()
+    queue.notify("update")                              # no handler do webhook
+    queue.notify("manual", wait=True, timeout=600)      # espera a rodada que cobre o pedido
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+SYNC_DEBOUNCE_SECONDS = float(os.environ.get('SYNC_DEBOUNCE_SECONDS', 30))
+SYNC_MAX_DELAY_SECONDS = float(os.environ.get('SYNC_MAX_DELAY_SECONDS', 300))
+
+
+class DebouncedSyncQueue:
+    """Agrupa notificações e executa `run_sync` em segundo plano, uma rodada por vez"""
+
+    def __init__(self, run_sync: Callable[[], Tuple[bool, str]], name: str = "sync",
+                 debounce_seconds: float = SYNC_DEBOUNCE_SECONDS,
+                 max_delay_seconds: float = SYNC_MAX_DELAY_SECONDS):
+        self.run_sync = run_sync
+        self.name = name
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max(max_delay_seconds, debounce_seconds)
+
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._first_at = None   # primeira notificação pendente (monotonic)
+        self._due_at = None     # início previsto da próxima rodada (monotonic)
+        self._pending_reasons = []
+        self._requested = 0     # número de sequência da última notificação
+        self._completed = 0     # maior sequência coberta por uma rodada terminada
+
+        self.stats = {
+            'notifications': 0,
+            'coalesced': 0,
+            'runs': 0,
+            'failures': 0,
+            'last_notification': None,
+            'last_run': None,
+        }
+
+    def start(self):
+        """Inicia a thread da fila (idempotente)"""
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name=f"{self.name}-queue", daemon=True)
+                self._thread.start()
+        return self
+
+    def notify(self, reason: str = "change", immediate: bool = False,
+               wait: bool = False, timeout: Optional[float] = None) -> Dict:
+        """
+        Registra uma notificação e retorna sem esperar a sincronização.
+
+        Args:
+            reason: Motivo (estado do recurso no Drive, 'manual', ...)
+            immediate: Ignora a janela de debounce (pedidos manuais)
+            wait: Espera a rodada que cobre esta notificação terminar
+            timeout: Limite da espera em segundos (com wait=True)
+        """
+        self.start()
+        now = time.monotonic()
+        with self._condition:
+            self._requested += 1
+            sequence = self._requested
+            coalesced = self._first_at is not None
+            if not coalesced:
+                self._first_at = now
+            self._pending_reasons.append(reason)
+
+            deadline = self._first_at + self.max_delay_seconds
+            due_at = now if immediate else min(now + self.debounce_seconds, deadline)
+            if self._due_at is not None and self._due_at <= now:
+                due_at = self._due_at  # rodada já vencida (ex.: pedido manual) não é adiada
+            self._due_at = due_at
+
+            self.stats['notifications'] += 1
+            self.stats['coalesced'] += int(coalesced)
+            self.stats['last_notification'] = datetime.now().isoformat()
+            self._condition.notify_all()
+
+            if wait:
+                self._condition.wait_for(lambda: self._completed >= sequence, timeout=timeout)
+            return dict(self._status_locked(), coalesced=coalesced,
+                        done=self._completed >= sequence)
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                # Espera haver rodada pendente e a janela de debounce fechar
+                while self._due_at is None or time.monotonic() < self._due_at:
+                    timeout = None if self._due_at is None else self._due_at - time.monotonic()
+                    self._condition.wait(timeout=timeout)
+
+                covered = self._requested
+                reasons = self._pending_reasons
+                self._first_at, self._due_at, self._pending_reasons = None, None, []
+                self._running = True
+
+            started = datetime.now()
+            start = time.monotonic()
+            logging.info(f"🔄 Sincronização '{self.name}' iniciada ({len(reasons)} notificações agrupadas)")
+            try:
+                success, output = self.run_sync()
+            except Exception as e:
+                success, output = False, f"Erro inesperado: {e}"
+            duration = time.monotonic() - start
+            logging.info(f"{'✅' if success else '❌'} Sincronização '{self.name}' "
+                         f"{'concluída' if success else 'falhou'} em {duration:.1f}s")
+
+            with self._condition:
+                self._running = False
+                self._completed = covered
+                self.stats['runs'] += 1
+                self.stats['failures'] += int(not success)
+                self.stats['last_run'] = {
+                    'started': started.isoformat(),
+                    'duration_seconds': round(duration, 1),
+                    'success': success,
+                    'notifications': len(reasons),
+                    'reasons': sorted(set(reasons)),
+                    'output': (output or '')[-500:],
+                }
+                self._condition.notify_all()
+
+    def _status_locked(self) -> Dict:
+        pending = self._due_at is not None
+        return {
+            'queue_depth': int(self._running) + int(pending),
+            'running': self._running,
+            'pending': pending,
+            'pending_notifications': len(self._pending_reasons),
+            'next_run_in_seconds': round(max(self._due_at - time.monotonic(), 0), 1) if pending else None,
+            'debounce_seconds': self.debounce_seconds,
+            **self.stats,
+        }
+
+    def status(self) -> Dict:
+        """Profundidade da fila (rodando + pendente), contadores e última execução"""
+        with self._condition:
+            return self._status_locked()
@@ -14,8 +14,10 @@ from pathlib import Path
 
 # Configurações
 PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT / "core"))
+from activity_log import CHROMADB_WEBHOOK_ACTIVITY_LOG, ActivityLog
+
 CONFIG_FILE = PROJECT_ROOT / "data" / "chromadb_webhook_config.json"
-ACTIVITY_FILE = PROJECT_ROOT / "data" / "chromadb_webhook_activity.json"
 WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', 'chromadb-sync-secret-2024')
 
 def load_webhook_config():
@@ -29,16 +31,11 @@ def load_webhook_config():
     return {}
 
 def load_recent_activity():
-    """Carrega atividade recente do webhook"""
-    if ACTIVITY_FILE.exists():
-        try:
-            with open(ACTIVITY_FILE, 'r') as f:
-                activities = json.load(f)
-                # Retorna últimas 10 atividades
-                return activities[-10:] if activities else []
-        except:
-            return []
-    return []
+    """Carrega atividade recente do webhook (últimas 10)"""
+    try:
+        return ActivityLog(CHROMADB_WEBHOOK_ACTIVITY_LOG).recent(10)
+    except Exception:
+        return []
 
 def test_health_check(webhook_url):
     """Testa o endpoint de health check"""
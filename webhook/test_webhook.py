@@ -66,7 +66,7 @@ def check_webhook_logs():
     
     print("📄 Checking webhook logs...")
     
-    log_files = ['webhook.log', 'webhook_activity.json']
+    log_files = ['webhook.log', 'webhook_activity.jsonl']
     
     for log_file in log_files:
         if os.path.exists(log_file):
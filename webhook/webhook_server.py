@@ -2,19 +2,25 @@
 """
 Google Drive Webhook Server
 Receives notifications when PDFs are modified in Google Drive and automatically updates the knowledge base
+
+Notifications are acknowledged immediately and collapsed by the debounced job
+queue (sync_queue.py), so a burst from Drive costs a single update.
 """
 
 import os
 import sys
-import json
 import logging
 import subprocess
 import time
 from datetime import datetime
 from flask import Flask, request, jsonify
 
+from sync_queue import DebouncedSyncQueue
+
 # Add project root to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'core'))
+from activity_log import WEBHOOK_ACTIVITY_LOG, ActivityLog
 
 app = Flask(__name__)
 
@@ -33,32 +39,12 @@ logging.basicConfig(
 WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', 'your-secret-token-change-this')
 UPDATE_SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'core', 'update_drive.py')
 METADATA_GENERATOR_SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'generate_printer_metadata.py')
-WEBHOOK_LOG_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'webhook_activity.json')
+# Append-only activity log (JSONL, size-based rotation, indexed latest event per type)
+activity_log = ActivityLog(WEBHOOK_ACTIVITY_LOG)
 
 def log_webhook_activity(event_type, details):
-    """Log webhook activity for monitoring"""
-    activity = {
-        'timestamp': datetime.now().isoformat(),
-        'event_type': event_type,
-        'details': details
-    }
-    
-    # Load existing log
-    activities = []
-    if os.path.exists(WEBHOOK_LOG_FILE):
-        try:
-            with open(WEBHOOK_LOG_FILE, 'r') as f:
-                activities = json.load(f)
-        except:
-            activities = []
-    
-    # Add new activity and keep last 100 entries
-    activities.append(activity)
-    activities = activities[-100:]
-    
-    # Save log
-    with open(WEBHOOK_LOG_FILE, 'w') as f:
-        json.dump(activities, f, indent=2)
+    """Log webhook activity for monitoring (one atomic append, no rewrite)"""
+    activity_log.append(event_type, details)
 
 def verify_google_webhook(request):
     """Verify that the webhook notification is from Google"""
@@ -102,6 +88,69 @@ def run_metadata_generation():
         logging.warning(f"💥 Erro na geração de metadados: {str(e)}")
         return False, str(e)
 
+def run_update_script():
+    """
+    Run the update script in a fresh interpreter.
+    
+    This rebuilds data/manual_complete.json (read by the metadata generator),
+    so it is not sent to the resident sync worker, which only syncs ChromaDB.
+    """
+    result = subprocess.run(
+        ['python', UPDATE_SCRIPT], 
+        capture_output=True, 
+        text=True,
+        timeout=300  # 5 minute timeout
+    )
+    return result.returncode == 0, result.stdout if result.returncode == 0 else result.stderr
+
+def run_knowledge_base_update():
+    """Run the update script and the metadata generator (called by the update queue)"""
+    try:
+        logging.info("🔄 Starting knowledge base update...")
+        success, output = run_update_script()
+        
+        if success:
+            logging.info("✅ Knowledge base updated successfully!")
+            
+            # Automatically generate metadata for new printer models
+            metadata_success, metadata_output = run_metadata_generation()
+            
+            # Parse the output to get update details
+            update_details = {
+                'success': True,
+                'stdout': output,
+                'timestamp': datetime.now().isoformat(),
+                'metadata_generated': metadata_success,
+                'metadata_output': metadata_output if metadata_success else None
+            }
+            
+            log_webhook_activity('update_success', update_details)
+            return True, output
+        
+        error_msg = f"Update failed: {output}"
+        logging.error(f"❌ {error_msg}")
+        
+        log_webhook_activity('update_failed', {
+            'success': False,
+            'error': output
+        })
+        return False, error_msg
+            
+    except subprocess.TimeoutExpired:
+        error_msg = "Update script timed out"
+        logging.error(f" {error_msg}")
+        log_webhook_activity('update_timeout', {'error': error_msg})
+        return False, error_msg
+        
+    except Exception as e:
+        error_msg = f"Error running update script: {str(e)}"
+        logging.error(f"💥 {error_msg}")
+        log_webhook_activity('update_error', {'error': error_msg})
+        return False, error_msg
+
+# Update queue: at most one update running and one pending
+update_queue = DebouncedSyncQueue(run_knowledge_base_update, name="knowledge-base")
+
 @app.route('/drive-webhook', methods=['POST'])
 def handle_drive_notification():
     """Handle incoming Google Drive webhook notifications"""
@@ -142,70 +191,21 @@ def handle_drive_notification():
         elif resource_state in ['update', 'add', 'remove', 'change']:
             logging.info(f"📁 Processing {resource_state} event...")
             
-            try:
-                # Run the update script
-                logging.info("🔄 Starting knowledge base update...")
-                result = subprocess.run(
-                    ['python', UPDATE_SCRIPT], 
-                    capture_output=True, 
-                    text=True,
-                    timeout=300  # 5 minute timeout
-                )
-                
-                if result.returncode == 0:
-                    logging.info("✅ Knowledge base updated successfully!")
-                    
-                    # Automatically generate metadata for new printer models
-                    metadata_success, metadata_output = run_metadata_generation()
-                    
-                    # Parse the output to get update details
-                    update_details = {
-                        'success': True,
-                        'stdout': result.stdout,
-                        'timestamp': datetime.now().isoformat(),
-                        'metadata_generated': metadata_success,
-                        'metadata_output': metadata_output if metadata_success else None
-                    }
-                    
-                    log_webhook_activity('update_success', update_details)
-                    
-                    response_msg = "Knowledge base updated"
-                    if metadata_success:
-                        response_msg += " and printer metadata auto-generated"
-                    
-                    return jsonify({
-                        "status": "success",
-                        "message": response_msg,
-                        "details": result.stdout,
-                        "metadata_generated": metadata_success
-                    }), 200
-                
-                else:
-                    error_msg = f"Update script failed: {result.stderr}"
-                    logging.error(f"❌ {error_msg}")
-                    
-                    log_webhook_activity('update_failed', {
-                        'success': False,
-                        'error': result.stderr,
-                        'returncode': result.returncode
-                    })
-                    
-                    return jsonify({
-                        "status": "error",
-                        "message": error_msg
-                    }), 500
-                    
-            except subprocess.TimeoutExpired:
-                error_msg = "Update script timed out"
-                logging.error(f" {error_msg}")
-                log_webhook_activity('update_timeout', {'error': error_msg})
-                return jsonify({"status": "error", "message": error_msg}), 500
-                
-            except Exception as e:
-                error_msg = f"Error running update script: {str(e)}"
-                logging.error(f"💥 {error_msg}")
-                log_webhook_activity('update_error', {'error': error_msg})
-                return jsonify({"status": "error", "message": error_msg}), 500
+            # Queue the update and acknowledge right away (bursts collapse into one run)
+            queue = update_queue.notify(resource_state)
+            log_webhook_activity('update_queued', {
+                'resource_state': resource_state,
+                'coalesced': queue['coalesced'],
+                'queue_depth': queue['queue_depth']
+            })
+            
+            return jsonify({
+                "status": "queued",
+                "message": "Knowledge base update scheduled",
+                "coalesced": queue['coalesced'],
+                "queue_depth": queue['queue_depth'],
+                "next_run_in_seconds": queue['next_run_in_seconds']
+            }), 200
         
         else:
             logging.info(f"ℹ️ Ignoring resource state: {resource_state}")
@@ -223,13 +223,10 @@ def webhook_status():
     
     try:
         # Load recent activity
-        activities = []
-        if os.path.exists(WEBHOOK_LOG_FILE):
-            with open(WEBHOOK_LOG_FILE, 'r') as f:
-                activities = json.load(f)
+        activities = activity_log.recent(100)
         
         # Get recent successful updates
-        recent_updates = [a for a in activities if a['event_type'] == 'update_success'][-5:]
+        recent_updates = activity_log.recent(5, event_types=['update_success'])
         recent_notifications = [a for a in activities if a['event_type'] == 'notification_received'][-10:]
         
         return jsonify({
@@ -237,7 +234,8 @@ def webhook_status():
             "server_time": datetime.now().isoformat(),
             "recent_updates": recent_updates,
             "recent_notifications": recent_notifications,
-            "total_activities": len(activities)
+            "total_activities": len(activities),
+            "queue": update_queue.status()
         }), 200
         
     except Exception as e:
@@ -273,10 +271,7 @@ if __name__ == '__main__':
     print(f"📁 Update script: {UPDATE_SCRIPT}")
     print(f"🔐 Webhook secret configured: {'Yes' if WEBHOOK_SECRET != 'your-secret-token-change-this' else 'No (using default)'}")
     
-    # Create initial log file
-    if not os.path.exists(WEBHOOK_LOG_FILE):
-        with open(WEBHOOK_LOG_FILE, 'w') as f:
-            json.dump([], f)
+    update_queue.start()
     
     # Run the server
     app.run(